@@ -33,6 +33,7 @@ from vts.runners.host import signals
 from vts.runners.host import utils
 from vts.utils.python.controllers import adb
 from vts.utils.python.controllers import android_device
+from vts.utils.python.controllers import bug_report_service
 from vts.utils.python.controllers.adb import AdbError
 from vts.utils.python.common import cmd_utils
 from vts.utils.python.common import filter_utils
@@ -57,6 +58,7 @@ STR_TEST = "test"
 STR_GENERATE = "generate"
 TIMEOUT_SECS_LOG_UPLOADING = 60
 TIMEOUT_SECS_TEARDOWN_CLASS = 120
+TIMEOUT_SECS_BUG_REPORT = 600
 _REPORT_MESSAGE_FILE_NAME = "report_proto.msg"
 _BUG_REPORT_FILE_PREFIX = "bugreport_"
 _BUG_REPORT_FILE_EXTENSION = ".zip"
@@ -527,6 +529,12 @@ class BaseTestClass(object):
 
         event_sub.End()
 
+        event_sub = tfi.Begin('wait for bug reports',
+                              tfi.categories.TEST_CLASS_TEARDOWN)
+        bug_report_service.GetDefaultService().Wait(
+            TIMEOUT_SECS_BUG_REPORT)
+        event_sub.End()
+
         if self.web.enabled:
             if self.results.class_errors:
                 # Create a result to make the module shown as failure.
@@ -538,19 +546,17 @@ class BaseTestClass(object):
             # after generating report message to prevent failure due to timeout of log uploading.
             self.log_uploading.UploadLogs(dryrun=True)
 
-            message_b = self.web.GenerateReportMessage(self.results.requested,
-                                                       self.results.executed)
-        else:
-            message_b = ''
-
         report_proto_path = os.path.join(logging.log_path,
                                          _REPORT_MESSAGE_FILE_NAME)
 
-        if message_b:
-            logging.debug('Result proto message path: %s', report_proto_path)
-
         with open(report_proto_path, "wb") as f:
-            f.write(message_b)
+            # Writes an empty file if the web feature is disabled.
+            if self.web.WriteReportMessage(
+                    f, self.results.requested, self.results.executed,
+                    streamed_count=(self.results.streamedCount -
+                                    self.results.streamedRequestedCount)):
+                logging.debug('Result proto message path: %s',
+                              report_proto_path)
 
         if self.log_uploading.enabled:
             @timeout_utils.timeout(TIMEOUT_SECS_LOG_UPLOADING,
@@ -626,6 +632,11 @@ class BaseTestClass(object):
                          be executed.
         """
         self._current_record = test_record
+        # Index the position where the test begins in the collected logcat.
+        for device in getattr(self, _ANDROID_DEVICES, []):
+            if device.adb_logcat_collector:
+                device.adb_logcat_collector.Mark(
+                    test_record.begin_time / 1000.0)
         if self.web.enabled:
             self.web.AddTestReport(test_record.test_name)
 
@@ -1089,7 +1100,8 @@ class BaseTestClass(object):
                           args=None,
                           kwargs=None,
                           tag="",
-                          name_func=None):
+                          name_func=None,
+                          lazy=False):
         """Runs generated test cases.
 
         Generated test cases are not written down as functions, but as a list
@@ -1102,6 +1114,7 @@ class BaseTestClass(object):
                        which is a parameter set.
             settings: A list of strings representing parameter sets. These are
                       usually json strings that get loaded in the test_func.
+                      In lazy mode, any iterable, e.g., a generator.
             args: Iterable of additional position args to be passed to
                   test_func.
             kwargs: Dict of additional keyword args to be passed to test_func
@@ -1111,6 +1124,12 @@ class BaseTestClass(object):
                        proper test name. The test name should be shorter than
                        utils.MAX_FILENAME_LEN. Names over the limit will be
                        truncated.
+            lazy: bool, whether to iterate settings only once. Each setting
+                  is named and requested right before it runs, the records
+                  of filtered tests are dropped, and passed records and
+                  their requests are streamed out of memory by
+                  self.results.streamRecord.
+                  Use this for settings too many to be held in memory.
 
         Returns:
             A list of settings that did not pass.
@@ -1134,11 +1153,37 @@ class BaseTestClass(object):
 
             return test_name
 
+        if lazy:
+            for setting in settings:
+                test_name = GenerateTestName(setting)
+                # A test skipped by the retry filter is not requested, as
+                # execOneTest would return without recording it.
+                if (self._test_filter_retry and
+                        not self._test_filter_retry.Filter(test_name)):
+                    failed_settings.append(setting)
+                    continue
+                tr_record = records.TestResultRecord(test_name,
+                                                     self.test_module_name)
+                self.results.addRequest(tr_record)
+                previous_success_cnt = len(self.results.passed)
+
+                event_exec = tfi.Begin(
+                    'BaseTest execOneTest method for generated tests',
+                    enable_logging=False)
+                self.execOneTest(test_name, test_func, (setting, ) + args,
+                                 **kwargs)
+                event_exec.End()
+                if len(self.results.passed) - previous_success_cnt != 1:
+                    failed_settings.append(setting)
+                else:
+                    self.results.streamRecord(self.results.passed[-1])
+            return failed_settings
+
         for setting in settings:
             test_name = GenerateTestName(setting)
 
             tr_record = records.TestResultRecord(test_name, self.test_module_name)
-            self.results.requested.append(tr_record)
+            self.results.addRequest(tr_record)
 
         for setting in settings:
             test_name = GenerateTestName(setting)
@@ -1483,6 +1528,12 @@ class BaseTestClass(object):
     def DumpBugReport(self, prefix=''):
         """Get device bugreport through adb command.
 
+        The bug reports are taken in the background, and _tearDownClass waits
+        for them. So a report reflects the device some time after the
+        failure, and taking it loads the device while the following test
+        cases run. A request close to an earlier one of the same device is
+        merged into that report, and its file is not written.
+
         Args:
             prefix: string, file name prefix. Usually in format of
                     <test_module>-<test_case>
@@ -1508,7 +1559,7 @@ class BaseTestClass(object):
             file_path = os.path.join(parent_dir, file_name)
 
             logging.info('Dumping bugreport %s...' % file_path)
-            device.adb.bugreport(file_path)
+            bug_report_service.GetDefaultService().Request(device, file_path)
         event.End()
 
     def skipAllTestsIf(self, condition, msg):
@@ -1569,6 +1620,10 @@ class BaseTestClass(object):
     def DumpLogcat(self, prefix=''):
         """Dumps device logcat outputs to log directory.
 
+        During a test case, the logs collected since the test case began are
+        extracted from the collected logcat. Otherwise, the logcat buffers
+        on the devices are dumped.
+
         Args:
             prefix: string, file name prefix. Usually in format of
                     <test_module>-<test_case>
@@ -1587,6 +1642,14 @@ class BaseTestClass(object):
         for device in self.android_devices:
             if (not device.isAdbLogcatOn) or device.fatal_error:
                 continue
+            if self._current_record:
+                file_name = (_LOGCAT_FILE_PREFIX + prefix + device.serial +
+                             _LOGCAT_FILE_EXTENSION)
+                file_path = os.path.join(parent_dir, file_name)
+                logging.info('Writing logcat %s...', file_path)
+                device.adb_logcat_collector.WriteSlice(
+                    self._current_record.begin_time / 1000.0, None, file_path)
+                continue
             for buffer in LOGCAT_BUFFERS:
                 file_name = (_LOGCAT_FILE_PREFIX
                              + prefix
@@ -0,0 +1,134 @@
+#
+# Copyright (C) 2019 The Android Open Source Project
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+import base64
+import json
+import mock
+import unittest
+
+from vts.proto import VtsReportMessage_pb2 as ReportMsg
+from vts.runners.host import asserts
+from vts.runners.host import base_test
+from vts.runners.host import keys
+from vts.runners.host import records
+from vts.utils.python.common import filter_utils
+from vts.utils.python.web import web_utils
+
+
+class BaseTestClassTest(unittest.TestCase):
+    """Unit tests for BaseTestClass."""
+
+    def setUp(self):
+        """Creates a test class which reports to a mock dashboard client."""
+        patcher = mock.patch.object(web_utils.dashboard_rest_client,
+                                    "DashboardRestClient")
+        patcher.start().return_value.Initialize.return_value = True
+        self.addCleanup(patcher.stop)
+        self._test = base_test.BaseTestClass({
+            keys.ConfigKeys.IKEY_USER_PARAM: {
+                keys.ConfigKeys.KEY_TESTBED_NAME: "Module",
+                keys.ConfigKeys.KEY_TEST_SUITE: {
+                    keys.ConfigKeys.KEY_EXCLUDE_FILTER: ["setting_3"],
+                },
+                keys.ConfigKeys.IKEY_ENABLE_WEB: True,
+                keys.ConfigKeys.IKEY_DASHBOARD_POST_COMMAND: "post",
+                keys.ConfigKeys.IKEY_SERVICE_JSON_PATH: "service.json",
+                keys.ConfigKeys.IKEY_BUILD: {},
+                keys.ConfigKeys.IKEY_ANDROID_DEVICE: [],
+                keys.ConfigKeys.IKEY_ABI_NAME: "arm64-v8a",
+                keys.ConfigKeys.IKEY_ABI_BITNESS: "64",
+                keys.ConfigKeys.IKEY_LOGCAT_ON_FAILURE: False,
+            }
+        })
+        self._test.android_devices = []
+        self._test._is_final_run = True
+
+    def _VerifySetting(self, setting):
+        """Passes even settings and fails odd settings."""
+        asserts.assertEqual(0, setting % 2)
+
+    def testRunGeneratedTestsLazy(self):
+        """Tests that lazy mode runs a generator and streams passed records."""
+        failed_settings = self._test.runGeneratedTests(
+            test_func=self._VerifySetting,
+            settings=(setting for setting in range(6)),
+            name_func=lambda setting: "setting_%d" % setting,
+            lazy=True)
+
+        results = self._test.results
+        self.assertEqual([1, 3, 5], failed_settings)
+        self.assertEqual([], results.passed)
+        self.assertEqual(["setting_1", "setting_5"],
+                         [record.test_name for record in results.failed])
+        self.assertEqual(["setting_1", "setting_5"],
+                         [record.test_name for record in results.requested])
+        self.assertEqual(3, results.streamedRequestedCount)
+        self.assertEqual([], results.getNonExecutedRecords())
+        self.assertEqual(
+            "Error 0, Executed 5, Failed 2, Passed 3, Requested 5, Skipped 0",
+            results.summary())
+        self.assertEqual("6/5", results.progressStr)
+        test_names = [
+            d[records.TestResultEnums.RECORD_NAME]
+            for d in json.loads(results.jsonString())["Results"]
+        ]
+        self.assertEqual(["setting_0", "setting_2", "setting_4", "setting_1",
+                          "setting_5"], test_names)
+
+    def testRunGeneratedTestsLazyRetry(self):
+        """Tests that tests skipped by the retry filter are not requested."""
+        self._test._test_filter_retry = filter_utils.Filter(
+            include_filter=["setting_1"])
+        failed_settings = self._test.runGeneratedTests(
+            test_func=self._VerifySetting,
+            settings=iter(range(3)),
+            name_func=lambda setting: "setting_%d" % setting,
+            lazy=True)
+
+        results = self._test.results
+        self.assertEqual([0, 1, 2], failed_settings)
+        self.assertEqual(["setting_1"],
+                         [record.test_name for record in results.requested])
+        self.assertEqual(
+            "Error 0, Executed 1, Failed 1, Passed 0, Requested 1, Skipped 0",
+            results.summary())
+
+    def testRunGeneratedTestsLazyReport(self):
+        """Tests that streamed records are reported as executed."""
+        self._test.runGeneratedTests(
+            test_func=self._VerifySetting,
+            settings=iter(range(4)),
+            name_func=lambda setting: "setting_%d" % setting,
+            lazy=True)
+
+        results = self._test.results
+        message_b = self._test.web.GenerateReportMessage(
+            results.requested, results.executed,
+            streamed_count=(results.streamedCount -
+                            results.streamedRequestedCount))
+        post_msg = ReportMsg.DashboardPostMessage()
+        post_msg.ParseFromString(base64.b64decode(message_b))
+        test_cases = post_msg.test_report[0].test_case
+        self.assertEqual(["setting_0", "setting_1", "setting_2"],
+                         [msg.name for msg in test_cases])
+        self.assertEqual([
+            ReportMsg.TEST_CASE_RESULT_PASS, ReportMsg.TEST_CASE_RESULT_FAIL,
+            ReportMsg.TEST_CASE_RESULT_PASS
+        ], [msg.test_result for msg in test_cases])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -26,6 +26,7 @@ class ConfigKeys(object):
     # references.
     KEY_LOG_PATH = "log_path"
     KEY_LOG_SEVERITY = "log_severity"
+    KEY_EXPORT_INSTRUMENTATION_TRACE = "export_instrumentation_trace"
     KEY_TESTBED = "test_bed"
     KEY_TESTBED_NAME = "name"
     KEY_TEST_PATHS = "test_paths"
@@ -46,6 +47,7 @@ class ConfigKeys(object):
     IKEY_BINARY_TEST_ENVP = "binary_test_envp"
     IKEY_BINARY_TEST_ARGS = "binary_test_args"
     IKEY_BINARY_TEST_LD_LIBRARY_PATH = "binary_test_ld_library_path"
+    IKEY_BINARY_TEST_PARALLEL_JOBS = "binary_test_parallel_jobs"
     IKEY_NATIVE_SERVER_PROCESS_NAME = "native_server_process_name"
     IKEY_GTEST_BATCH_MODE = "gtest_batch_mode"
 
@@ -87,6 +89,7 @@ class ConfigKeys(object):
 
     # Keys for web
     IKEY_ENABLE_WEB = "enable_web"
+    IKEY_WEB_INCREMENTAL_REPORT = "web_incremental_report"
 
     # Keys for profiling
     IKEY_ENABLE_PROFILING = "enable_profiling"
@@ -95,6 +98,7 @@ class ConfigKeys(object):
     IKEY_TRACE_FILE_TOOL_NAME = "trace_file_tool_name"
     IKEY_SAVE_TRACE_FILE_REMOTE = "save_trace_file_remote"
     IKEY_PROFILING_ARG_VALUE = "profiling_arg_value"
+    IKEY_PROFILING_AGGREGATE_ONLY = "profiling_aggregate_only"
 
     # Keys for systrace (for hal tests)
     IKEY_ENABLE_SYSTRACE = "enable_systrace"
@@ -117,6 +121,8 @@ class ConfigKeys(object):
     IKEY_COVERAGE_REPORT_PATH = "coverage_report_path"
     IKEY_EXCLUDE_COVERAGE_PATH = "exclude_coverage_path"
     IKEY_FUZZING_GCS_BUCKET_NAME = "fuzzing_gcs_bucket_name"
+    IKEY_FUZZING_CORPUS_CACHE_DIR = "fuzzing_corpus_cache_dir"
+    IKEY_FUZZING_CORPUS_CACHE_SIZE_MB = "fuzzing_corpus_cache_size_mb"
 
     # Keys for the HAL HIDL GTest type (see VtsMultiDeviceTest.java).
     IKEY_PRECONDITION_HWBINDER_SERVICE = "precondition_hwbinder_service"
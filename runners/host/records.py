@@ -17,9 +17,12 @@ from __builtin__ import property
 """This module is where all the record definitions and record containers live.
 """
 
+import collections
 import json
 import logging
+import os
 import pprint
+import tempfile
 
 from vts.runners.host import signals
 from vts.runners.host import utils
@@ -63,6 +66,9 @@ class TestResultRecord(object):
         tables: A dict of 2-dimensional lists containing tabular results.
     """
 
+    __slots__ = ("test_name", "test_class", "begin_time", "end_time", "uid",
+                 "result", "extras", "details", "extra_errors", "tables")
+
     def __init__(self, t_name, t_class=None):
         self.test_name = t_name
         self.test_class = t_class
@@ -214,10 +220,190 @@ class TestResultRecord(object):
         return json.dumps(self.getDict())
 
 
+class _RecordStream(object):
+    """A temporary file of records moved out of memory.
+
+    Each record is written as one line of json.
+
+    Attributes:
+        count: int, the number of records in the file.
+        requested_count: int, the number of requests of the records, which
+                         are removed from the requested list.
+        _file: the temporary file object.
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.requested_count = 0
+        self._file = tempfile.TemporaryFile()
+
+    def write(self, record):
+        """Appends a record to the file.
+
+        Args:
+            record: A TestResultRecord object.
+        """
+        self._file.seek(0, os.SEEK_END)
+        self._file.write(json.dumps(record.getDict(), sort_keys=True))
+        self._file.write("\n")
+        self.count += 1
+
+    def iterJsonStrings(self):
+        """Yields the json string of each record in the file."""
+        self._file.seek(0)
+        for line in iter(self._file.readline, ""):
+            yield line.rstrip("\n")
+
+
+class _RecordList(list):
+    """A list of records which counts the test cases in it.
+
+    It behaves as a plain list. The count of each test case is updated by
+    the mutating methods, so whether a test case is in the list is checked
+    in constant time instead of by a linear scan.
+
+    Attributes:
+        _keys: A Counter, record key to the number of records in the list.
+    """
+
+    def __init__(self, records=()):
+        super(_RecordList, self).__init__(records)
+        self._keys = collections.Counter(_GetRecordKey(r) for r in self)
+
+    def __reduce__(self):
+        return (_RecordList, (list(self), ))
+
+    def _countKeys(self, records, delta):
+        """Adds delta to the counts of the test cases of records."""
+        for record in records:
+            key = _GetRecordKey(record)
+            self._keys[key] += delta
+            if self._keys[key] <= 0:
+                del self._keys[key]
+
+    def _reindex(self):
+        """Counts the test cases again after a complex modification."""
+        self._keys = collections.Counter(_GetRecordKey(r) for r in self)
+
+    def containsKey(self, key):
+        """Returns whether a record with the key is in the list.
+
+        Args:
+            key: The record key returned by _GetRecordKey.
+        """
+        return key in self._keys
+
+    def append(self, record):
+        super(_RecordList, self).append(record)
+        self._countKeys((record, ), 1)
+
+    def extend(self, records):
+        records = list(records)
+        super(_RecordList, self).extend(records)
+        self._countKeys(records, 1)
+
+    def __iadd__(self, records):
+        self.extend(records)
+        return self
+
+    def __imul__(self, n):
+        super(_RecordList, self).__imul__(n)
+        self._reindex()
+        return self
+
+    def insert(self, index, record):
+        super(_RecordList, self).insert(index, record)
+        self._countKeys((record, ), 1)
+
+    def remove(self, record):
+        del self[self.index(record)]
+
+    def pop(self, index=-1):
+        record = super(_RecordList, self).pop(index)
+        self._countKeys((record, ), -1)
+        return record
+
+    def __delitem__(self, index):
+        removed = self[index]
+        super(_RecordList, self).__delitem__(index)
+        self._countKeys(removed if isinstance(index, slice) else (removed, ),
+                        -1)
+
+    def __setitem__(self, index, value):
+        super(_RecordList, self).__setitem__(index, value)
+        self._reindex()
+
+    def __delslice__(self, i, j):
+        self.__delitem__(slice(i, j))
+
+    def __setslice__(self, i, j, records):
+        self.__setitem__(slice(i, j), records)
+
+    def removeKey(self, key):
+        """Removes all records of a test case.
+
+        Args:
+            key: The record key returned by _GetRecordKey.
+        """
+        if key in self._keys:
+            self[:] = [r for r in self if _GetRecordKey(r) != key]
+
+    def removeIdentical(self, record):
+        """Removes a record object, searching from the end of the list.
+
+        Args:
+            record: A TestResultRecord object.
+
+        Returns:
+            True if the record is removed; False if it is not in the list.
+        """
+        if not self.containsKey(_GetRecordKey(record)):
+            return False
+        for index in range(len(self) - 1, -1, -1):
+            if self[index] is record:
+                del self[index]
+                return True
+        return False
+
+    def findLast(self, key):
+        """Returns the last record of a test case, or None if there is none.
+
+        Args:
+            key: The record key returned by _GetRecordKey.
+        """
+        if key in self._keys:
+            for index in range(len(self) - 1, -1, -1):
+                if _GetRecordKey(self[index]) == key:
+                    return self[index]
+        return None
+
+
+class _RecordListProperty(object):
+    """A TestResult attribute which converts assigned lists to _RecordList.
+
+    Attributes:
+        _name: string, the name of the attribute.
+    """
+
+    def __init__(self, name):
+        self._name = name
+
+    def __get__(self, obj, obj_type=None):
+        if obj is None:
+            return self
+        return obj.__dict__[self._name]
+
+    def __set__(self, obj, records):
+        obj.__dict__[self._name] = _RecordList(records)
+
+
 class TestResult(object):
     """A class that contains metrics of a test run.
 
-    This class is essentially a container of TestResultRecord objects.
+    This class is essentially a container of TestResultRecord objects. The
+    record lists count the test cases in them, so adding a record and
+    checking whether a test case is in a list take constant time. Removing
+    a test case scans only the lists which contain it.
 
     Attributes:
         self.requested: A list of records for tests requested by user.
@@ -231,8 +417,19 @@ class TestResult(object):
         self._test_module_name: A string, test module's name.
         self._test_module_timestamp: An integer, test module's execution start
                                      timestamp.
+        self._record_streams: A list of _RecordStream objects holding passed
+                              records that are counted as executed and
+                              passed, but are no longer in those lists,
+                              and the count of their removed requests.
     """
 
+    requested = _RecordListProperty("requested")
+    failed = _RecordListProperty("failed")
+    executed = _RecordListProperty("executed")
+    passed = _RecordListProperty("passed")
+    skipped = _RecordListProperty("skipped")
+    error = _RecordListProperty("error")
+
     def __init__(self):
         self.requested = []
         self.failed = []
@@ -243,6 +440,14 @@ class TestResult(object):
         self._test_module_name = None
         self._test_module_timestamp = None
         self.class_errors = []
+        self._record_streams = []
+
+    def _recordLists(self):
+        """Returns all the record lists."""
+        return [
+            self.requested, self.failed, self.executed, self.passed,
+            self.skipped, self.error
+        ]
 
     def __add__(self, r):
         """Overrides '+' operator for TestResult class.
@@ -261,33 +466,30 @@ class TestResult(object):
                             (r, type(r)))
         r.reportNonExecutedRecord()
         sum_result = TestResult()
-        for name in sum_result.__dict__:
-            if name.startswith("_test_module"):
-                l_value = getattr(self, name)
-                r_value = getattr(r, name)
-                if l_value is None and r_value is None:
-                    continue
-                elif l_value is None and r_value is not None:
-                    value = r_value
-                elif l_value is not None and r_value is None:
+        for name in ("_test_module_name", "_test_module_timestamp"):
+            l_value = getattr(self, name)
+            r_value = getattr(r, name)
+            if l_value is None and r_value is None:
+                continue
+            elif l_value is None and r_value is not None:
+                value = r_value
+            elif l_value is not None and r_value is None:
+                value = l_value
+            else:
+                if name == "_test_module_name":
+                    if l_value != r_value:
+                        raise TypeError("_test_module_name is different.")
                     value = l_value
                 else:
-                    if name == "_test_module_name":
-                        if l_value != r_value:
-                            raise TypeError("_test_module_name is different.")
+                    if int(l_value) < int(r_value):
                         value = l_value
-                    elif name == "_test_module_timestamp":
-                        if int(l_value) < int(r_value):
-                            value = l_value
-                        else:
-                            value = r_value
                     else:
-                        raise TypeError("unknown _test_module* attribute.")
-                setattr(sum_result, name, value)
-            else:
-                l_value = list(getattr(self, name))
-                r_value = list(getattr(r, name))
-                setattr(sum_result, name, l_value + r_value)
+                        value = r_value
+            setattr(sum_result, name, value)
+        for name in ("requested", "failed", "executed", "passed", "skipped",
+                     "error", "class_errors", "_record_streams"):
+            setattr(sum_result, name,
+                    list(getattr(self, name)) + list(getattr(r, name)))
         return sum_result
 
     def getNonPassingRecords(self, non_executed=True, failed=True, skipped=False, error=True):
@@ -307,20 +509,25 @@ class TestResult(object):
 
     def getNonExecutedRecords(self):
         """Returns a list of records that were requested but not executed."""
-        res = []
-
-        for requested in self.requested:
-            found = False
+        return [
+            requested for requested in self.requested
+            if not self.executed.containsKey(_GetRecordKey(requested))
+        ]
 
-            for executed in self.executed:
-                if requested.isSameTestCase(executed):
-                    found = True
-                    break
+    def getRecord(self, test_name, test_class=None):
+        """Looks up the latest result record of a test case.
 
-            if not found:
-                res.append(requested)
+        Args:
+            test_name: string, the test name.
+            test_class: string, the test class name.
 
-        return res
+        Returns:
+            The TestResultRecord object, or None if the test case has no
+            result.
+        """
+        key = '%s.%s' % (test_class, test_name)
+        record = self.executed.findLast(key)
+        return record if record is not None else self.error.findLast(key)
 
     def reportNonExecutedRecord(self):
         """Check and report any requested tests that did not finish.
@@ -346,19 +553,28 @@ class TestResult(object):
             remove_requested: bool, whether to remove the test case from requested
                               list as well.
         """
-        lists = [
-            self.requested, self.failed, self.executed, self.passed,
-            self.skipped, self.error
-        ]
+        key = _GetRecordKey(record)
+        for l in self._recordLists():
+            if l is self.requested and not remove_requested:
+                continue
+            l.removeKey(key)
 
-        for l in lists:
-            indexToRemove = []
-            for idx in range(len(l)):
-                if l[idx].isSameTestCase(record):
-                    indexToRemove.append(idx)
+    def addRequest(self, record):
+        """Adds a request unless the test case has been requested.
 
-            for idx in reversed(indexToRemove):
-                del l[idx]
+        Requests are kept after the test cases are executed, so a retried
+        test case is requested only once.
+
+        Args:
+            record: A test record object to add.
+
+        Returns:
+            True if the request is added; False if it is a duplicate.
+        """
+        if self.requested.containsKey(_GetRecordKey(record)):
+            return False
+        self.requested.append(record)
+        return True
 
     def addRecord(self, record):
         """Adds a test record to test results.
@@ -380,6 +596,49 @@ class TestResult(object):
         else:
             self.error.append(record)
 
+    def streamRecord(self, record):
+        """Moves a passed record out of memory to a temporary file.
+
+        The record still counts in the summary and is written by jsonString
+        and writeJson. Non-passing records are kept in memory because
+        retries and the non-executed check look them up. The last request
+        of the test case is removed too, and counted as requested.
+
+        Args:
+            record: A test record object in self.passed.
+
+        Returns:
+            True if the record is streamed; False if it is not passed.
+        """
+        if not self.passed.removeIdentical(record):
+            return False
+        self.executed.removeIdentical(record)
+        if not self._record_streams:
+            self._record_streams.append(_RecordStream())
+        stream = self._record_streams[-1]
+        stream.write(record)
+        request = self.requested.findLast(_GetRecordKey(record))
+        if request is not None:
+            self.requested.removeIdentical(request)
+            stream.requested_count += 1
+        return True
+
+    @property
+    def streamedCount(self):
+        """The number of records moved out of memory by streamRecord."""
+        return sum(stream.count for stream in self._record_streams)
+
+    @property
+    def streamedRequestedCount(self):
+        """The number of requests removed by streamRecord."""
+        return sum(stream.requested_count for stream in self._record_streams)
+
+    def _iterStreamedJsonStrings(self):
+        """Yields the json strings of the records moved by streamRecord."""
+        for stream in self._record_streams:
+            for json_string in stream.iterJsonStrings():
+                yield json_string
+
     def setTestModuleKeys(self, name, start_timestamp):
         """Sets the test module's name and start_timestamp."""
         self._test_module_name = name
@@ -440,7 +699,9 @@ class TestResult(object):
         """
         records = list_utils.MergeUniqueKeepOrder(
             self.executed, self.failed, self.passed, self.skipped, self.error)
-        executed = [record.getDict() for record in records]
+        executed = [json.loads(json_string)
+                    for json_string in self._iterStreamedJsonStrings()]
+        executed.extend(record.getDict() for record in records)
 
         d = {}
         d["Results"] = executed
@@ -451,6 +712,34 @@ class TestResult(object):
         jsonString = json.dumps(d, indent=4, sort_keys=True)
         return jsonString
 
+    def writeJson(self, f):
+        """Writes this test result to a file in json format.
+
+        The content is the same as jsonString, but the records are serialized
+        and written one at a time without indentation, so that the whole
+        document is never held in memory.
+
+        Args:
+            f: file object to write to.
+        """
+        records = list_utils.MergeUniqueKeepOrder(
+            self.executed, self.failed, self.passed, self.skipped, self.error)
+        class_errors = ("\n".join(self.class_errors)
+                        if self.class_errors else None)
+        f.write('{"Class Errors": %s, "Results": [' % json.dumps(class_errors))
+        separator = ""
+        for json_string in self._iterStreamedJsonStrings():
+            f.write(separator)
+            f.write(json_string)
+            separator = ", "
+        for record in records:
+            f.write(separator)
+            f.write(json.dumps(record.getDict(), sort_keys=True))
+            separator = ", "
+        f.write('], "Summary": %s, "TestModule": %s}' % (json.dumps(
+            self.summaryDict(), sort_keys=True), json.dumps(
+                self.testModuleDict(), sort_keys=True)))
+
     def summary(self):
         """Gets a string that summarizes the stats of this test result.
 
@@ -476,8 +765,9 @@ class TestResult(object):
           x/n, where x is number of executed + skipped + 1,
           and n is number of requested tests.
         """
-        return '%s/%s' % (len(self.executed) + len(self.skipped) + 1,
-                          len(self.requested))
+        return '%s/%s' % (
+            len(self.executed) + len(self.skipped) + self.streamedCount + 1,
+            len(self.requested) + self.streamedRequestedCount)
 
     def summaryDict(self):
         """Gets a dictionary that summarizes the stats of this test result.
@@ -488,10 +778,11 @@ class TestResult(object):
         Returns:
             A dictionary with the stats of this test result.
         """
+        streamed_count = self.streamedCount
         d = {}
-        d["Requested"] = len(self.requested)
-        d["Executed"] = len(self.executed)
-        d["Passed"] = len(self.passed)
+        d["Requested"] = len(self.requested) + self.streamedRequestedCount
+        d["Executed"] = len(self.executed) + streamed_count
+        d["Passed"] = len(self.passed) + streamed_count
         d["Failed"] = len(self.failed)
         d["Skipped"] = len(self.skipped)
         d["Error"] = len(self.error)
@@ -503,3 +794,8 @@ class TestResult(object):
         d["Name"] = self._test_module_name
         d["Timestamp"] = self._test_module_timestamp
         return d
+
+
+def _GetRecordKey(record):
+    """Returns the key which identifies the test case of a record."""
+    return record.fullname
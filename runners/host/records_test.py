@@ -0,0 +1,191 @@
+#
+# Copyright (C) 2019 The Android Open Source Project
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+import io
+import json
+import pickle
+import unittest
+
+from vts.runners.host import records
+from vts.runners.host import signals
+
+_PASS = records.TestResultEnums.TEST_RESULT_PASS
+_FAIL = records.TestResultEnums.TEST_RESULT_FAIL
+_SKIP = records.TestResultEnums.TEST_RESULT_SKIP
+_ERROR = records.TestResultEnums.TEST_RESULT_ERROR
+
+
+def _CreateRecord(name, result, test_class="TestClass"):
+    """Creates a finished test record.
+
+    Args:
+        name: string, the test name.
+        result: string, one of the TEST_RESULT tokens.
+        test_class: string, the test class name.
+    """
+    record = records.TestResultRecord(name, test_class)
+    record.testBegin()
+    if result == _PASS:
+        record.testPass()
+    elif result == _FAIL:
+        record.testFail(signals.TestFailure("failed"))
+    elif result == _SKIP:
+        record.testSkip(signals.TestSkip("skipped"))
+    else:
+        record.testError("error")
+    return record
+
+
+class RecordsTest(unittest.TestCase):
+    """Unit tests for records module."""
+
+    def setUp(self):
+        """Creates a result with one record of each status."""
+        self._result = records.TestResult()
+        self._passed = _CreateRecord("a", _PASS)
+        self._failed = _CreateRecord("b", _FAIL)
+        self._skipped = _CreateRecord("c", _SKIP)
+        self._error = _CreateRecord("d", _ERROR)
+        for record in (self._passed, self._failed, self._skipped,
+                       self._error):
+            self._result.requested.append(
+                records.TestResultRecord(record.test_name, record.test_class))
+            self._result.addRecord(record)
+
+    def testAddRecord(self):
+        """Tests that addRecord puts a record in the lists of its status."""
+        self.assertEqual(
+            [self._passed, self._failed, self._skipped, self._error],
+            self._result.executed)
+        self.assertEqual([self._passed], self._result.passed)
+        self.assertEqual([self._failed], self._result.failed)
+        self.assertEqual([self._skipped], self._result.skipped)
+        self.assertEqual([self._error], self._result.error)
+        self.assertEqual(4, len(self._result.requested))
+        self.assertEqual([], self._result.getNonExecutedRecords())
+
+    def testAddRecordReplaces(self):
+        """Tests that addRecord replaces the result of a retried test case."""
+        retried = _CreateRecord("b", _PASS)
+        self._result.addRecord(retried)
+        self.assertEqual(
+            [self._passed, self._skipped, self._error, retried],
+            self._result.executed)
+        self.assertEqual([self._passed, retried], self._result.passed)
+        self.assertEqual([], self._result.failed)
+        self.assertIs(retried, self._result.getRecord("b", "TestClass"))
+
+    def testRemoveRecord(self):
+        """Tests that removeRecord removes a test case from all lists."""
+        self._result.requested.append(
+            records.TestResultRecord("b", "TestClass"))
+        self._result.removeRecord(self._failed)
+        self.assertEqual([self._passed, self._skipped, self._error],
+                         self._result.executed)
+        self.assertEqual([], self._result.failed)
+        self.assertEqual(["a", "c", "d"], [
+            record.test_name for record in self._result.requested])
+        self.assertIsNone(self._result.getRecord("b", "TestClass"))
+
+    def testAddRequest(self):
+        """Tests that a test case is requested once."""
+        self.assertFalse(self._result.addRequest(
+            records.TestResultRecord("b", "TestClass")))
+        self.assertTrue(self._result.addRequest(
+            records.TestResultRecord("e", "TestClass")))
+        self.assertEqual(5, len(self._result.requested))
+
+    def testListMutation(self):
+        """Tests that the lists are mutable and stay consistent."""
+        self._result.failed.remove(self._failed)
+        self._result.executed.append(self._failed)
+        self.assertEqual([], self._result.failed)
+        self.assertEqual(5, len(self._result.executed))
+        self.assertIs(self._failed, self._result.executed[-1])
+        del self._result.executed[1:]
+        self._result.requested = [records.TestResultRecord("b", "TestClass")]
+        self.assertEqual(1, len(self._result.getNonExecutedRecords()))
+        self._result.requested.pop()
+        self.assertEqual([], self._result.getNonExecutedRecords())
+
+    def testAdd(self):
+        """Tests that the add operator concatenates the lists."""
+        other = records.TestResult()
+        other.addRecord(_CreateRecord("a", _PASS))
+        other.failClass("OtherClass", "exception")
+        sum_result = self._result + other
+        self.assertEqual(5, len(sum_result.executed))
+        self.assertEqual(2, len(sum_result.passed))
+        self.assertEqual(self._result.executed + other.executed,
+                         sum_result.executed)
+        self.assertEqual(["OtherClass: exception"], sum_result.class_errors)
+        self.assertEqual(4, len(self._result.executed))
+
+    def testAddNonExecuted(self):
+        """Tests that the add operator reports non-executed test cases."""
+        other = records.TestResult()
+        other.requested.append(records.TestResultRecord("e", "TestClass"))
+        sum_result = self._result + other
+        self.assertEqual(2, len(sum_result.error))
+        self.assertEqual("e", sum_result.error[-1].test_name)
+        self.assertEqual(4, len(sum_result.executed))
+
+    def testSummary(self):
+        """Tests the counts in the summary."""
+        self._result.requested.append(
+            records.TestResultRecord("e", "TestClass"))
+        self.assertEqual(
+            "Error 1, Executed 4, Failed 1, Passed 1, Requested 5, Skipped 1",
+            self._result.summary())
+
+    def testStreamRecord(self):
+        """Tests that streamed records are counted and written."""
+        self.assertFalse(self._result.streamRecord(self._failed))
+        self.assertTrue(self._result.streamRecord(self._passed))
+        self.assertEqual([], self._result.passed)
+        self.assertEqual(3, len(self._result.executed))
+        summary = self._result.summaryDict()
+        self.assertEqual(4, summary["Executed"])
+        self.assertEqual(1, summary["Passed"])
+        self.assertEqual(4, summary["Requested"])
+        self.assertEqual(3, len(self._result.requested))
+        self.assertEqual(1, self._result.streamedRequestedCount)
+        test_names = [
+            d[records.TestResultEnums.RECORD_NAME]
+            for d in json.loads(self._result.jsonString())["Results"]
+        ]
+        self.assertEqual(["a", "b", "c", "d"], test_names)
+
+    def testWriteJson(self):
+        """Tests that writeJson writes the same document as jsonString."""
+        self._result.streamRecord(self._passed)
+        self._result.failClass("TestClass", "exception")
+        self._result.setTestModuleKeys("module", 1)
+        output = io.BytesIO()
+        self._result.writeJson(output)
+        self.assertEqual(
+            json.loads(self._result.jsonString()),
+            json.loads(output.getvalue()))
+
+    def testPickle(self):
+        """Tests that the lists keep their counts after pickling."""
+        result = pickle.loads(pickle.dumps(self._result, 2))
+        self.assertEqual(4, len(result.executed))
+        self.assertEqual([], result.getNonExecutedRecords())
+
+
+if __name__ == "__main__":
+    unittest.main()
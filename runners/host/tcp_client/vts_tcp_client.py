@@ -25,6 +25,7 @@ from vts.proto import ComponentSpecificationMessage_pb2 as CompSpecMsg_pb2
 from vts.proto import VtsResourceControllerMessage_pb2 as ResControlMsg_pb2
 from vts.runners.host import const
 from vts.runners.host import errors
+from vts.utils.python.instrumentation import test_framework_instrumentation as tfi
 from vts.utils.python.mirror import mirror_object
 
 from google.protobuf import text_format
@@ -62,6 +63,8 @@ class VtsTcpClient(object):
         channel: a file to write and read data.
         error: string, ongoing tcp connection error. None means no error.
         _mode: the connection mode (adb_forwarding or ssh_tunnel)
+        _rpc_event: LowOverheadEvent, the span of the command that is sent
+                    and waits for response. None if no command is pending.
         timeout: tcp connection timeout.
     """
 
@@ -74,6 +77,7 @@ class VtsTcpClient(object):
         self.connection = None
         self.channel = None
         self._mode = mode
+        self._rpc_event = None
         self.timeout = timeout
         self.error = None
 
@@ -660,6 +664,12 @@ class VtsTcpClient(object):
             raise errors.VtsTcpCommunicationError(
                 "channel is None, unable to send command.")
 
+        if self._rpc_event:
+            # The previous command did not receive a response.
+            self._rpc_event.Remove()
+        self._rpc_event = tfi.BeginLowOverhead(
+            "RPC %s" % COMMAND_TYPE_NAME[command_type],
+            tfi.categories.WAITING_FOR_DEVICE_RESPOND)
         command_msg = SysMsg_pb2.AndroidSystemControlCommandMessage()
         command_msg.command_type = command_type
         logging.debug("sending a command (type %s)",
@@ -762,7 +772,13 @@ class VtsTcpClient(object):
                     "Response %s", "success"
                     if response_msg.response_code == SysMsg_pb2.SUCCESS else
                     "fail")
+                if self._rpc_event:
+                    self._rpc_event.End()
+                    self._rpc_event = None
                 return response_msg
             except socket.timeout as e:
                 logging.exception(e)
+        if self._rpc_event:
+            self._rpc_event.Remove()
+            self._rpc_event = None
         return None
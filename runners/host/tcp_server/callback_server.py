@@ -17,8 +17,11 @@
 import logging
 import socket
 import socketserver
+import struct
 import threading
 
+import concurrent.futures
+
 from vts.runners.host import errors
 from vts.proto import AndroidSystemControlMessage_pb2 as SysMsg
 from vts.proto import ComponentSpecificationMessage_pb2 as CompSpecMsg
@@ -26,6 +29,18 @@ from vts.utils.python.mirror import pb2py
 
 _functions = dict()  # Dictionary to hold function pointers
 
+# The first line a client sends to open a persistent callback channel instead
+# of the one-shot "<length>\n<message>" exchange.
+CHANNEL_HEADER = b"VTS_CALLBACK_CHANNEL"
+# Frame header on a persistent channel: request ID and payload length, both
+# as unsigned 32-bit integers in network byte order.
+_FRAME_HEADER = struct.Struct("!II")
+# Maximum number of callbacks handled concurrently on one channel.
+_CHANNEL_MAX_WORKERS = 8
+# Maximum payload length of one frame. A longer length means the stream is
+# corrupted, so the channel is closed.
+_MAX_FRAME_SIZE = 64 * 1024 * 1024
+
 
 class CallbackServerError(errors.VtsError):
     """Raised when an error occurs in VTS TCP server."""
@@ -40,8 +55,14 @@ class CallbackRequestHandler(socketserver.StreamRequestHandler):
         When a callback happens on the target side, a request message is posted
         to the host side and is handled here. The message is parsed and the
         appropriate callback function on the host side is called.
+
+        If the first line is CHANNEL_HEADER, the connection is kept open and
+        handled as a persistent channel (see _HandleChannel).
         """
         header = self.rfile.readline().strip()
+        if header == CHANNEL_HEADER:
+            self._HandleChannel()
+            return
         try:
             len = int(header)
         except ValueError:
@@ -55,6 +76,21 @@ class CallbackRequestHandler(socketserver.StreamRequestHandler):
                 return
         # Read the request message.
         received_data = self.rfile.read(len)
+        message = self._HandleCallbackRequest(received_data)
+        # send the response back to client
+        # self.request is the TCP socket connected to the client
+        self.request.sendall(message)
+
+    def _HandleCallbackRequest(self, received_data):
+        """Calls the callback function requested by a serialized message.
+
+        Args:
+            received_data: bytes, a serialized
+                           AndroidSystemCallbackRequestMessage.
+
+        Returns:
+            bytes, the serialized AndroidSystemCallbackResponseMessage.
+        """
         logging.debug("Received callback message: %s", received_data)
         request_message = SysMsg.AndroidSystemCallbackRequestMessage()
         request_message.ParseFromString(received_data)
@@ -73,11 +109,189 @@ class CallbackRequestHandler(socketserver.StreamRequestHandler):
             logging.error("Callback function ID %s is not registered!",
                           request_message.id)
             response_message.response_code = SysMsg.FAIL
+        return response_message.SerializeToString()
 
-        # send the response back to client
-        message = response_message.SerializeToString()
-        # self.request is the TCP socket connected to the client
-        self.request.sendall(message)
+    def _HandleChannel(self):
+        """Handles many callback requests over one persistent connection.
+
+        Each request and response is framed by _FRAME_HEADER, which carries
+        a client-chosen request ID and the payload length. Requests are
+        dispatched to a thread pool, so a slow callback does not block the
+        ones behind it and responses may be sent back out of order. The
+        channel is closed when the client closes its end of the connection.
+        """
+        write_lock = threading.Lock()
+        executor = concurrent.futures.ThreadPoolExecutor(
+            max_workers=_CHANNEL_MAX_WORKERS)
+        try:
+            while True:
+                frame_header = self.rfile.read(_FRAME_HEADER.size)
+                if len(frame_header) < _FRAME_HEADER.size:
+                    break
+                request_id, length = _FRAME_HEADER.unpack(frame_header)
+                if length > _MAX_FRAME_SIZE:
+                    logging.error("Callback request %s of %d bytes exceeds "
+                                  "the frame size limit.", request_id, length)
+                    break
+                received_data = self.rfile.read(length)
+                if len(received_data) < length:
+                    logging.error("Callback channel closed while reading "
+                                  "request %s.", request_id)
+                    break
+                executor.submit(self._ReplyOnChannel, write_lock, request_id,
+                                received_data)
+        finally:
+            executor.shutdown(wait=True)
+        logging.debug("Callback channel from %s closed.", self.client_address)
+
+    def _ReplyOnChannel(self, write_lock, request_id, received_data):
+        """Handles one request on a persistent channel and sends its response.
+
+        Args:
+            write_lock: threading.Lock, serializes writes to the socket.
+            request_id: int, the request ID to echo back in the response.
+            received_data: bytes, a serialized
+                           AndroidSystemCallbackRequestMessage.
+        """
+        try:
+            message = self._HandleCallbackRequest(received_data)
+        except Exception as e:
+            logging.exception("Callback request %s failed: %s", request_id, e)
+            response_message = SysMsg.AndroidSystemCallbackResponseMessage()
+            response_message.response_code = SysMsg.FAIL
+            message = response_message.SerializeToString()
+        try:
+            with write_lock:
+                self.request.sendall(
+                    _FRAME_HEADER.pack(request_id, len(message)) + message)
+        except socket.error as e:
+            logging.error("Unable to send response for callback request %s: "
+                          "%s", request_id, e)
+
+
+class _ThreadingTCPServer(socketserver.ThreadingMixIn, socketserver.TCPServer):
+    """TCPServer that handles each connection in a daemon thread.
+
+    A persistent callback channel holds its connection open, so connections
+    must not be served one after another.
+    """
+    daemon_threads = True
+
+
+class CallbackChannelClient(object):
+    """Client of a persistent callback channel opened on a CallbackServer.
+
+    Requests are tagged with increasing request IDs and may be in flight
+    concurrently; a reader thread matches responses to requests by ID.
+
+    Attributes:
+        _sock: the socket connected to the CallbackServer.
+        _next_request_id: int, the ID of the next request.
+        _pending: dict, request ID to concurrent.futures.Future of the
+                  requests awaiting responses.
+        _lock: threading.Lock, guards _next_request_id, _pending and writes
+               to _sock.
+        _reader_thread: threading.Thread, receives the responses.
+    """
+
+    def __init__(self, ip, port):
+        self._sock = socket.create_connection((ip, port))
+        self._sock.sendall(CHANNEL_HEADER + b"\n")
+        self._next_request_id = 0
+        self._pending = {}
+        self._lock = threading.Lock()
+        self._reader_thread = threading.Thread(target=self._ReadResponses)
+        self._reader_thread.daemon = True
+        self._reader_thread.start()
+
+    def _RecvAll(self, size):
+        """Receives exactly size bytes, or fewer if the connection closed."""
+        chunks = []
+        received = 0
+        while received < size:
+            chunk = self._sock.recv(size - received)
+            if not chunk:
+                break
+            chunks.append(chunk)
+            received += len(chunk)
+        return b"".join(chunks)
+
+    def _ReadResponses(self):
+        """Reads responses and resolves the corresponding futures."""
+        try:
+            while True:
+                frame_header = self._RecvAll(_FRAME_HEADER.size)
+                if len(frame_header) < _FRAME_HEADER.size:
+                    break
+                request_id, length = _FRAME_HEADER.unpack(frame_header)
+                if length > _MAX_FRAME_SIZE:
+                    logging.error("Callback response %s of %d bytes exceeds "
+                                  "the frame size limit.", request_id, length)
+                    break
+                received_data = self._RecvAll(length)
+                if len(received_data) < length:
+                    logging.error("Callback channel closed while reading "
+                                  "response %s.", request_id)
+                    break
+                response_message = SysMsg.AndroidSystemCallbackResponseMessage()
+                response_message.ParseFromString(received_data)
+                with self._lock:
+                    future = self._pending.pop(request_id, None)
+                if future:
+                    future.set_result(response_message)
+                else:
+                    logging.error("Received response for unknown callback "
+                                  "request %s.", request_id)
+        except socket.error as e:
+            logging.debug("Callback channel reader stopped: %s", e)
+        finally:
+            with self._lock:
+                pending = list(self._pending.values())
+                self._pending.clear()
+            for future in pending:
+                future.set_exception(
+                    CallbackServerError("Callback channel closed."))
+
+    def Send(self, request_message):
+        """Sends a request without waiting for the response.
+
+        Args:
+            request_message: AndroidSystemCallbackRequestMessage.
+
+        Returns:
+            concurrent.futures.Future, resolved with the
+            AndroidSystemCallbackResponseMessage.
+        """
+        message = request_message.SerializeToString()
+        future = concurrent.futures.Future()
+        with self._lock:
+            request_id = self._next_request_id
+            self._next_request_id = (request_id + 1) & 0xffffffff
+            self._pending[request_id] = future
+            self._sock.sendall(
+                _FRAME_HEADER.pack(request_id, len(message)) + message)
+        return future
+
+    def Call(self, request_message, timeout=None):
+        """Sends a request and waits for its response.
+
+        Args:
+            request_message: AndroidSystemCallbackRequestMessage.
+            timeout: float, seconds to wait. None means no limit.
+
+        Returns:
+            AndroidSystemCallbackResponseMessage.
+        """
+        return self.Send(request_message).result(timeout)
+
+    def Close(self):
+        """Closes the channel; pending requests fail with an error."""
+        try:
+            self._sock.shutdown(socket.SHUT_RDWR)
+        except socket.error:
+            pass
+        self._sock.close()
+        self._reader_thread.join()
 
 
 class CallbackServer(object):
@@ -161,7 +375,7 @@ class CallbackServer(object):
             CallbackServerError is raised if the server fails to start.
         """
         try:
-            self._server = socketserver.TCPServer(
+            self._server = _ThreadingTCPServer(
                 (self._hostname, port), CallbackRequestHandler)
             self._ip, self._port = self._server.server_address
 
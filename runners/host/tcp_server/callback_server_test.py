@@ -15,6 +15,7 @@
 #
 
 import socket
+import threading
 import unittest
 import logging
 import errno
@@ -222,5 +223,59 @@ class TestMethods(unittest.TestCase):
         # also confirm the error message
         self.assertEqual(response_message.response_code, SysMsg_pb2.FAIL)
 
+    def testPersistentChannel(self):
+        """Tests many callbacks over one channel with out-of-order responses.
+
+        The first callback blocks until the second one has run, so the
+        second response must arrive before the first one.
+        """
+        second_called = threading.Event()
+
+        def first_func():
+            second_called.wait(5)
+
+        def second_func():
+            second_called.set()
+
+        first_id = self._callback_server.RegisterCallback(first_func)
+        second_id = self._callback_server.RegisterCallback(second_func)
+
+        client = callback_server.CallbackChannelClient(
+            self._callback_server.ip, self._callback_server.port)
+        try:
+            first_request = SysMsg_pb2.AndroidSystemCallbackRequestMessage()
+            first_request.id = first_id
+            second_request = SysMsg_pb2.AndroidSystemCallbackRequestMessage()
+            second_request.id = second_id
+            unknown_request = SysMsg_pb2.AndroidSystemCallbackRequestMessage()
+            unknown_request.id = "unknown"
+
+            first_future = client.Send(first_request)
+            second_response = client.Call(second_request, timeout=5)
+            self.assertTrue(second_called.is_set())
+            self.assertEqual(second_response.response_code,
+                             SysMsg_pb2.SUCCESS)
+            self.assertEqual(first_future.result(5).response_code,
+                             SysMsg_pb2.SUCCESS)
+            self.assertEqual(client.Call(unknown_request, timeout=5).response_code,
+                             SysMsg_pb2.FAIL)
+        finally:
+            client.Close()
+            self._callback_server.UnregisterCallback(first_id)
+            self._callback_server.UnregisterCallback(second_id)
+
+    def testOversizedFrame(self):
+        """Tests that a frame over the size limit closes the channel."""
+        sock = socket.create_connection(
+            (self._callback_server.ip, self._callback_server.port))
+        try:
+            sock.settimeout(5)
+            sock.sendall(callback_server.CHANNEL_HEADER + b"\n" +
+                         callback_server._FRAME_HEADER.pack(
+                             1, callback_server._MAX_FRAME_SIZE + 1))
+            self.assertEqual(sock.recv(1), b"")
+        finally:
+            sock.close()
+
 if __name__ == '__main__':
     unittest.main()
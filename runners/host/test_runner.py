@@ -183,6 +183,9 @@ class TestRunner(object):
             self.testbed_name,
             filename="test_run_details.txt",
             log_severity=self.log_severity)
+        if self.test_configs.get(
+                keys.ConfigKeys.KEY_EXPORT_INSTRUMENTATION_TRACE, False):
+            tfi.StartTraceExport(self.log_path)
         self.controller_registry = {}
         self.controller_destructors = {}
         self.run_list = run_list
@@ -464,7 +467,8 @@ class TestRunner(object):
         """Releases resources from test run. Should always be called after
         TestRunner.run finishes.
 
-        This function concludes a test run and writes out a test report.
+        This function concludes a test run, writes out a test report and
+        stops the instrumentation trace export.
         """
         if self.running:
 
@@ -477,10 +481,11 @@ class TestRunner(object):
             logging.info(msg.strip())
             logger.killTestLogger(logging.getLogger())
             self.running = False
+        tfi.StopTraceExport()
 
     def _writeResultsJsonString(self):
         """Writes out a json file with the test result info for easy parsing.
         """
         path = os.path.join(self.log_path, "test_run_summary.json")
         with open(path, 'w') as f:
-            f.write(self.results.jsonString())
+            self.results.writeJson(f)
@@ -15,7 +15,6 @@
 #
 
 import base64
-import concurrent.futures
 import datetime
 import functools
 import json
@@ -27,7 +26,8 @@ import signal
 import string
 import subprocess
 import time
-import traceback
+
+from vts.utils.python.common import executor_service
 
 try:
     # TODO: remove when we stop supporting Python 2
@@ -290,36 +290,35 @@ def rand_ascii_str(length):
 
 
 # Thead/Process related functions.
-def concurrent_exec(func, param_list):
+def concurrent_exec(func, param_list, ordered=True, timeout=None,
+                    use_processes=False):
     """Executes a function with different parameters pseudo-concurrently.
 
     This is basically a map function. Each element (should be an iterable) in
-    the param_list is unpacked and passed into the function. Due to Python's
-    GIL, there's no true concurrency. This is suited for IO-bound tasks.
+    the param_list is unpacked and passed into the function. The calls share
+    one pool of threads in the process, which is suited for IO-bound tasks,
+    or one pool of processes for CPU-bound tasks. If the function itself
+    calls this function on the thread pool, the nested calls run one by one
+    in its thread.
 
     Args:
         func: The function that parforms a task.
         param_list: A list of iterables, each being a set of params to be
             passed into the function.
+        ordered: bool, whether the return values are in the order of
+            param_list. If False, they are in the order of completion.
+        timeout: float, seconds to wait for each execution after it
+            starts. None to wait until it finishes.
+        use_processes: bool, whether to run in the process pool. func and
+            the params must be picklable.
 
     Returns:
         A list of return values from each function execution. If an execution
-        caused an exception, the exception object will be the corresponding
-        result.
-    """
-    with concurrent.futures.ThreadPoolExecutor(max_workers=30) as executor:
-        # Start the load operations and mark each future with its params
-        future_to_params = {executor.submit(func, *p): p for p in param_list}
-        return_vals = []
-        for future in concurrent.futures.as_completed(future_to_params):
-            params = future_to_params[future]
-            try:
-                return_vals.append(future.result())
-            except Exception as exc:
-                print("{} generated an exception: {}".format(
-                    params, traceback.format_exc()))
-                return_vals.append(exc)
-        return return_vals
+        caused an exception or timed out, the exception object will be the
+        corresponding result.
+    """
+    service = executor_service.GetSharedService(use_processes)
+    return service.Map(func, param_list, ordered=ordered, timeout=timeout)
 
 
 def exe_cmd(*cmds):
@@ -14,19 +14,25 @@
 # limitations under the License.
 #
 
+import contextlib
 import logging
 import os.path
 import posixpath as targetpath
+import queue
 import time
 
+import concurrent.futures
+
 from vts.runners.host import asserts
 from vts.runners.host import base_test
 from vts.runners.host import const
 from vts.runners.host import errors
 from vts.runners.host import keys
+from vts.runners.host import signals
 from vts.runners.host import test_runner
 from vts.utils.python.common import list_utils
 from vts.utils.python.coverage import coverage_utils
+from vts.utils.python.file import deploy_utils
 from vts.utils.python.os import path_utils
 from vts.utils.python.precondition import precondition_utils
 from vts.utils.python.web import feature_utils
@@ -36,6 +42,9 @@ from vts.testcases.template.binary_test import binary_test_case
 DATA_NATIVETEST = 'data/nativetest'
 DATA_NATIVETEST64 = '%s64' % DATA_NATIVETEST
 
+# Name prefix of the shell terminals that run test cases in parallel.
+_PARALLEL_TERMINAL_PREFIX = 'binary_test_parallel'
+
 
 class BinaryTest(base_test.BaseTestClass):
     '''Base class to run binary tests on target.
@@ -43,8 +52,14 @@ class BinaryTest(base_test.BaseTestClass):
     Attributes:
         _dut: AndroidDevice, the device under test as config
         shell: ShellMirrorObject, shell mirror
+        deploy_manager: DeployManager, pushes the files that are not up to
+                        date on the device
         testcases: list of BinaryTestCase objects, list of test cases to run
         tags: all the tags that appeared in binary list
+        parallel_jobs: int, the number of test cases to run concurrently on
+                       the device. 0 means one per online CPU.
+        _parallel_results: dict, BinaryTestCase object to the
+                           concurrent.futures.Future of its command results
         DEVICE_TMP_DIR: string, temp location for storing binary
         TAG_DELIMITER: string, separator used to separate tag and path
     '''
@@ -70,6 +85,7 @@ class BinaryTest(base_test.BaseTestClass):
             keys.ConfigKeys.IKEY_BINARY_TEST_ARGS,
             keys.ConfigKeys.IKEY_BINARY_TEST_LD_LIBRARY_PATH,
             keys.ConfigKeys.IKEY_BINARY_TEST_PROFILING_LIBRARY_PATH,
+            keys.ConfigKeys.IKEY_BINARY_TEST_PARALLEL_JOBS,
             keys.ConfigKeys.IKEY_NATIVE_SERVER_PROCESS_NAME,
             keys.ConfigKeys.IKEY_PRECONDITION_FILE_PATH_PREFIX,
             keys.ConfigKeys.IKEY_PRECONDITION_SYSPROP,
@@ -86,6 +102,11 @@ class BinaryTest(base_test.BaseTestClass):
 
         self.binary_test_source = self.getUserParam(
             keys.ConfigKeys.IKEY_BINARY_TEST_SOURCE, default_value=[])
+        self.parallel_jobs = int(
+            self.getUserParam(
+                keys.ConfigKeys.IKEY_BINARY_TEST_PARALLEL_JOBS,
+                default_value=1))
+        self._parallel_results = {}
 
         self.working_directory = {}
         if hasattr(self, keys.ConfigKeys.IKEY_BINARY_TEST_WORKING_DIRECTORY):
@@ -185,6 +206,7 @@ class BinaryTest(base_test.BaseTestClass):
 
         self._dut = self.android_devices[0]
         self.shell = self._dut.shell
+        self.deploy_manager = deploy_utils.DeployManager(self._dut.adb)
 
         if self.coverage.enabled and self.coverage.global_coverage:
             self.coverage.InitializeDeviceCoverage(self._dut)
@@ -204,13 +226,9 @@ class BinaryTest(base_test.BaseTestClass):
 
         self.tags = set()
         self.CreateTestCases()
-        cmd = list(
-            set('chmod 755 %s' % test_case.path
-                for test_case in self.testcases))
-        cmd_results = self.shell.Execute(cmd)
-        if any(cmd_results[const.EXIT_CODE]):
-            logging.error('Failed to set permission to some of the binaries:\n'
-                          '%s\n%s', cmd, cmd_results)
+        paths = [test_case.path for test_case in self.testcases]
+        if paths and not self.deploy_manager.Chmod(paths):
+            logging.error('Failed to set permission to some of the binaries.')
 
     def CreateTestCases(self):
         '''Push files to device and create test case objects.'''
@@ -251,13 +269,8 @@ class BinaryTest(base_test.BaseTestClass):
         logging.debug('Parsed test sources: %s', source_list)
 
         # Push source files first
-        for src, dst, tag in source_list:
-            if src:
-                if os.path.isdir(src):
-                    src = os.path.join(src, '.')
-                logging.debug('Pushing from %s to %s.', src, dst)
-                self._dut.adb.push('{src} {dst}'.format(src=src, dst=dst))
-                self.shell.Execute('ls %s' % dst)
+        self.deploy_manager.Push(
+            [(src, dst) for src, dst, tag in source_list if src])
 
         if not hasattr(self, 'testcases'):
             self.testcases = []
@@ -482,19 +495,186 @@ class BinaryTest(base_test.BaseTestClass):
                                               test_case.profiling_library_path)
 
         cmd = test_case.GetRunCommand()
-        logging.debug("Executing binary test command: %s", cmd)
-        command_results = self.shell.Execute(cmd)
+        future = self._parallel_results.pop(test_case, None)
+        if future:
+            logging.debug("Waiting for binary test command: %s", cmd)
+            command_results = future.result()
+        else:
+            logging.debug("Executing binary test command: %s", cmd)
+            command_results = self.shell.Execute(cmd)
 
         self.VerifyTestResult(test_case, command_results)
 
         if self.profiling.enabled:
-            self.profiling.ProcessTraceDataForTestCase(self._dut)
+            self.profiling.CollectTraceDataForTestCase([self._dut])
             self.profiling.DisableVTSProfiling(self.shell)
 
+    def _GetDeviceCpuCount(self):
+        '''Returns the number of online CPUs on the device, or 1 if unknown.'''
+        cmd_results = self.shell.Execute('cat /sys/devices/system/cpu/online')
+        if any(cmd_results[const.EXIT_CODE]):
+            logging.warning('Failed to read online CPUs: %s', cmd_results)
+            return 1
+        count = 0
+        # The format is a list of ranges, e.g., "0-3,6-7".
+        for cpu_range in cmd_results[const.STDOUT][0].strip().split(','):
+            bounds = cpu_range.split('-')
+            try:
+                count += int(bounds[-1]) - int(bounds[0]) + 1
+            except ValueError:
+                logging.warning('Unexpected online CPUs: %s', cpu_range)
+                return 1
+        return max(count, 1)
+
+    def _GetParallelJobs(self):
+        '''Returns the number of test cases to run concurrently.
+
+        The configured number is capped by the online CPUs of the device.
+        Test cases run one by one if profiling or per-test-case coverage is
+        enabled, or if the test class overrides setUp or tearDown, since
+        those act on device state around each test case.
+
+        Returns:
+            int, the number of concurrent test cases.
+        '''
+        if self.parallel_jobs == 1 or self.collect_tests_only:
+            return 1
+        if self.profiling.enabled or (self.coverage.enabled and
+                                      not self.coverage.global_coverage):
+            logging.info('Running test cases serially because profiling or '
+                         'per-test-case coverage is enabled.')
+            return 1
+        if self._HasTestCaseHooks():
+            logging.info('Running test cases serially because setUp or '
+                         'tearDown is overridden.')
+            return 1
+        cpu_count = self._GetDeviceCpuCount()
+        if self.parallel_jobs <= 0:
+            return cpu_count
+        return min(self.parallel_jobs, cpu_count)
+
+    def _HasTestCaseHooks(self):
+        '''Returns whether the test class overrides setUp or tearDown.
+
+        In parallel mode, the commands start before the hooks of their test
+        cases run, so the hooks could not act before or after the commands.
+        '''
+        for name in ('setUp', 'tearDown'):
+            method = getattr(type(self), name)
+            base_method = getattr(base_test.BaseTestClass, name)
+            if (getattr(method, '__func__', method) is not
+                    getattr(base_method, '__func__', base_method)):
+                return True
+        return False
+
+    def _IsTestCaseFiltered(self, test_case):
+        '''Returns whether a test case will be skipped by the filters.'''
+        try:
+            self.filterOneTest(str(test_case))
+        except (signals.TestSilent, signals.TestSkip):
+            return True
+        return False
+
+    @contextlib.contextmanager
+    def ParallelShell(self, jobs):
+        '''Provides a function that runs shell commands on parallel terminals.
+
+        The function takes a command, or a list of commands, and returns a
+        concurrent.futures.Future of the command results. If jobs is not
+        greater than 1, the commands are executed on the default shell before
+        the function returns. When the context exits, pending commands are
+        cancelled and the terminals are removed.
+
+        Args:
+            jobs: int, the number of terminals.
+
+        Yields:
+            The function that submits commands.
+        '''
+        if jobs <= 1:
+
+            def _ExecuteNow(cmd):
+                '''Executes commands and returns a completed future.'''
+                future = concurrent.futures.Future()
+                try:
+                    future.set_result(self.shell.Execute(cmd))
+                except Exception as e:
+                    future.set_exception(e)
+                return future
+
+            yield _ExecuteNow
+            return
+
+        terminal_names = [
+            '%s_%d' % (_PARALLEL_TERMINAL_PREFIX, index)
+            for index in range(jobs)
+        ]
+        terminals = queue.Queue()
+        for name in terminal_names:
+            self.shell.InvokeTerminal(name)
+            terminals.put(getattr(self.shell, name))
+
+        def _Execute(cmd):
+            '''Executes commands on an idle terminal.'''
+            terminal = terminals.get()
+            try:
+                return terminal.Execute(cmd)
+            finally:
+                terminals.put(terminal)
+
+        executor = concurrent.futures.ThreadPoolExecutor(max_workers=jobs)
+        futures = []
+
+        def _Submit(cmd):
+            '''Submits commands to the executor.'''
+            future = executor.submit(_Execute, cmd)
+            futures.append(future)
+            return future
+
+        try:
+            yield _Submit
+        finally:
+            for future in futures:
+                future.cancel()
+            executor.shutdown(wait=True)
+            for name in terminal_names:
+                self.shell.RemoveMirror(name)
+
+    def RunTestCases(self, test_cases):
+        '''Runs test cases and records the results in the order of the list.
+
+        If more than one parallel job is allowed, the commands of all test
+        cases are started on that many shell terminals before the records
+        are generated. RunTestCase then waits for the results of each test
+        case in turn.
+
+        Args:
+            test_cases: list of BinaryTestCase objects.
+        '''
+        jobs = self._GetParallelJobs()
+        if jobs <= 1 or len(test_cases) <= 1:
+            self.runGeneratedTests(
+                test_func=self.RunTestCase, settings=test_cases, name_func=str)
+            return
+
+        logging.info('Running %d test cases with %d parallel jobs.',
+                     len(test_cases), jobs)
+        try:
+            with self.ParallelShell(jobs) as submit:
+                for test_case in test_cases:
+                    if not self._IsTestCaseFiltered(test_case):
+                        self._parallel_results[test_case] = submit(
+                            test_case.GetRunCommand())
+                self.runGeneratedTests(
+                    test_func=self.RunTestCase,
+                    settings=test_cases,
+                    name_func=str)
+        finally:
+            self._parallel_results = {}
+
     def generateAllTests(self):
         '''Runs all binary tests.'''
-        self.runGeneratedTests(
-            test_func=self.RunTestCase, settings=self.testcases, name_func=str)
+        self.RunTestCases(self.testcases)
 
 
 if __name__ == "__main__":
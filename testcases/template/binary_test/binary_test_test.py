@@ -0,0 +1,127 @@
+#
+# Copyright (C) 2019 The Android Open Source Project
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+import mock
+import threading
+import unittest
+
+from vts.runners.host import const
+from vts.runners.host import keys
+from vts.testcases.template.binary_test import binary_test
+from vts.testcases.template.binary_test import binary_test_case
+
+
+def _CommandResults(stdout="", exit_code=0):
+    """Returns the results of a shell command."""
+    return {
+        const.STDOUT: [stdout],
+        const.STDERR: [""],
+        const.EXIT_CODE: [exit_code]
+    }
+
+
+class _HookedBinaryTest(binary_test.BinaryTest):
+    """A binary test class which overrides setUp."""
+
+    def setUp(self):
+        pass
+
+
+class BinaryTestTest(unittest.TestCase):
+    """Unit tests for the parallel jobs of BinaryTest."""
+
+    def setUp(self):
+        """Creates a test class on a device with 4 online CPUs."""
+        self._test = self._CreateTest(binary_test.BinaryTest)
+
+    def _CreateTest(self, test_class):
+        """Creates a test class whose shell is a mock."""
+        test = test_class({
+            keys.ConfigKeys.IKEY_USER_PARAM: {
+                keys.ConfigKeys.KEY_TESTBED_NAME: "Module",
+                keys.ConfigKeys.IKEY_ANDROID_DEVICE: [],
+                keys.ConfigKeys.IKEY_LOGCAT_ON_FAILURE: False,
+            }
+        })
+        test.android_devices = []
+        test._is_final_run = True
+        test.parallel_jobs = 8
+        test._parallel_results = {}
+        test._dut = mock.Mock()
+        test.shell = mock.Mock()
+        test.shell.Execute.return_value = _CommandResults("0-3\n")
+        return test
+
+    def testGetParallelJobsCpuCap(self):
+        """Tests that the parallel jobs are capped by the online CPUs."""
+        self.assertEqual(4, self._test._GetParallelJobs())
+        self._test.parallel_jobs = 0
+        self.assertEqual(4, self._test._GetParallelJobs())
+        self._test.parallel_jobs = 2
+        self.assertEqual(2, self._test._GetParallelJobs())
+        self._test.shell.Execute.return_value = _CommandResults("0,2-3\n")
+        self._test.parallel_jobs = 0
+        self.assertEqual(3, self._test._GetParallelJobs())
+        self._test.shell.Execute.return_value = _CommandResults("", 1)
+        self.assertEqual(1, self._test._GetParallelJobs())
+
+    def testGetParallelJobsSerial(self):
+        """Tests that the test cases run serially if they need hooks."""
+        self._test.profiling = mock.Mock(enabled=True)
+        self.assertEqual(1, self._test._GetParallelJobs())
+
+        self._test.profiling = mock.Mock(enabled=False)
+        self._test.coverage = mock.Mock(enabled=True, global_coverage=False)
+        self.assertEqual(1, self._test._GetParallelJobs())
+        self._test.coverage.global_coverage = True
+        self.assertEqual(4, self._test._GetParallelJobs())
+
+        self.assertEqual(
+            1, self._CreateTest(_HookedBinaryTest)._GetParallelJobs())
+
+    def testRunTestCasesOrder(self):
+        """Tests that results are recorded in the order of the test cases."""
+        b_done = threading.Event()
+
+        def _Execute(cmd):
+            if cmd == "a":
+                self.assertTrue(b_done.wait(5))
+                return _CommandResults(exit_code=1)
+            b_done.set()
+            return _CommandResults()
+
+        def _InvokeTerminal(name):
+            setattr(self._test.shell, name,
+                    mock.Mock(Execute=mock.Mock(side_effect=_Execute)))
+
+        self._test.shell.InvokeTerminal.side_effect = _InvokeTerminal
+        self._test.parallel_jobs = 2
+        self._test.RunTestCases([
+            binary_test_case.BinaryTestCase("", name, "/data/" + name,
+                                            cmd=name) for name in "ab"
+        ])
+
+        results = self._test.results
+        self.assertEqual(["a", "b"],
+                         [record.test_name for record in results.executed])
+        self.assertEqual(["a"],
+                         [record.test_name for record in results.failed])
+        self.assertEqual({}, self._test._parallel_results)
+        self.assertEqual(2, self._test.shell.RemoveMirror.call_count)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -14,21 +14,33 @@
 # limitations under the License.
 #
 
+import collections
 import logging
 import os
+import tempfile
+import uuid
 import xml.etree.ElementTree
 
+import concurrent.futures
+
 from vts.runners.host import asserts
 from vts.runners.host import const
 from vts.runners.host import keys
+from vts.runners.host import signals
 from vts.runners.host import test_runner
 
 from vts.testcases.template.binary_test import binary_test
 from vts.testcases.template.binary_test import binary_test_case
 from vts.testcases.template.gtest_binary_test import gtest_test_case
+from vts.utils.python.controllers import adb
+from vts.utils.python.os import path_utils
 
 _GTEST_RESULT_ATTRIBUTE_WHITE_LIST = ('properties',)
 
+# Maximum length of a --gtest_filter value. Longer positive filters are split
+# into several runs of the binary.
+_MAX_GTEST_FILTER_LENGTH = 8192
+
 
 class GtestBinaryTest(binary_test.BinaryTest):
     '''Base class to run gtests binary on target.
@@ -40,8 +52,6 @@ class GtestBinaryTest(binary_test.BinaryTest):
         tags: all the tags that appeared in binary list
         testcases: list of GtestTestCase objects, list of test cases to run
         _dut: AndroidDevice, the device under test as config
-        _gtest_results: list of GtestResult objects, used during batch mode
-                        for result storage and parsing
     '''
 
     # @Override
@@ -52,12 +62,9 @@ class GtestBinaryTest(binary_test.BinaryTest):
         self.batch_mode = self.getUserParam(
             keys.ConfigKeys.IKEY_GTEST_BATCH_MODE, default_value=False)
 
-        if self.batch_mode:
-            if self.collect_tests_only:
-                self.batch_mode = False
-                logging.debug("Disable batch mode when collecting tests.")
-            else:
-                self._gtest_results = []
+        if self.batch_mode and self.collect_tests_only:
+            self.batch_mode = False
+            logging.debug("Disable batch mode when collecting tests.")
 
         super(GtestBinaryTest, self).setUpClass()
 
@@ -71,15 +78,9 @@ class GtestBinaryTest(binary_test.BinaryTest):
 
         Returns:
             A list of GtestTestCase objects on success; an empty list otherwise.
-            In non-batch mode, each object respresents a test case in the
-            gtest binary located at the provided path. Usually there are more
-            than one object returned.
-            In batch mode, each object represents a gtest binary located at
-            the provided path; the returned list will always be a one object
-            list in batch mode. Test case names are stored in full_name
-            property in the object, delimited by ':' according to gtest
-            documentation, after being filtered and processed according to
-            host configuration.
+            Each object respresents a test case in the gtest binary located at
+            the provided path. Usually there are more than one object
+            returned.
         '''
         working_directory = self.working_directory[
             tag] if tag in self.working_directory else None
@@ -127,20 +128,10 @@ class GtestBinaryTest(binary_test.BinaryTest):
                 if test_suite.endswith('.'):
                     test_suite = test_suite[:-1]
 
-        #if not self.batch_mode:
-        # Avoid batch mode as it creates overly large filters
+        # In batch mode, the test cases are grouped into shards by
+        # _RunBatchShards after the filters are known.
         return test_cases
 
-        # Gtest batch mode
-        # test_names = map(lambda test: test.full_name, test_cases)
-        #test_names = {}
-
-        #gtest_batch = gtest_test_case.GtestTestCase(
-        #    path, '', path, tag, self.PutTag, working_directory,
-        #    ld_library_path, profiling_library_path, envp=envp)
-        #gtest_batch.full_name = ':'.join(test_names)
-        #return [gtest_batch]
-
     # @Override
     def VerifyTestResult(self, test_case, command_results):
         '''Parse Gtest xml result output.
@@ -179,10 +170,6 @@ class GtestBinaryTest(binary_test.BinaryTest):
 
         xml_str = command_results[const.STDOUT][1]
 
-        if self.batch_mode:
-            self._ParseBatchResults(test_case, xml_str)
-            return
-
         asserts.assertFalse(
             command_results[const.EXIT_CODE][1],
             'Failed to show Gtest XML output: %s' % command_results)
@@ -228,40 +215,36 @@ class GtestBinaryTest(binary_test.BinaryTest):
         except:
             asserts.fail('Result xml content is corrupted.')
 
-    def _ParseBatchResults(self, test_case_original, xml_str):
-        '''Parse batch mode gtest results
-
-        Args:
-            test_case_original: GtestTestCase object, original batch test case object
-            xml_str: string, result xml output content
-        '''
-        root = self._ParseResultXmlString(xml_str)
-
-        for test_suite in root:
-            logging.debug('Test tag: %s, attribute: %s',
-                          test_suite.tag,
-                          test_suite.attrib)
-            for test_case in test_suite:
-                result = gtest_test_case.GtestTestCase(
-                    test_suite.get('name'),
-                    test_case.get('name'), '', test_case_original.tag,
-                    self.PutTag, name_appendix=test_case_original.name_appendix)
+    def _PullBatchResults(self, shard):
+        '''Pulls the XML output of a batch shard and parses it incrementally.
 
-                failure_message = None
-                for sub in test_case:
-                    if sub.tag == 'failure':
-                        failure_message = sub.get('message')
+        The output is deleted from the device and the host once it is parsed
+        or the generator is closed.
 
-                test_case_filtered = filter(
-                    lambda sub: sub.tag not in _GTEST_RESULT_ATTRIBUTE_WHITE_LIST, test_case)
-                if len(test_case_filtered) and not failure_message:
-                    failure_message = 'Error: %s\n' % test_case.attrib
-                    for sub in test_case_filtered:
-                        failure_message += '%s: %s\n' % (sub.tag, sub.attrib)
-
-                result.failure_message = failure_message
+        Args:
+            shard: GtestTestCase object, the batch shard that has run.
 
-                self._gtest_results.append(result)
+        Yields:
+            (name, failure_message) tuples, where name is the display name of
+            a test case in the output and failure_message is None if the
+            test case passed.
+        '''
+        fd, local_path = tempfile.mkstemp(suffix='.xml')
+        os.close(fd)
+        try:
+            self._dut.adb.pull(shard.output_file_path, local_path)
+            with open(local_path, 'rb') as xml_file:
+                for test_suite, test_name, failure_message in (
+                        _IterBatchResults(xml_file)):
+                    full_name = ('%s.%s' % (test_suite, test_name)
+                                 if test_suite else test_name)
+                    yield (self.PutTag(full_name + shard.name_appendix,
+                                       shard.tag), failure_message)
+        except (adb.AdbError, xml.etree.ElementTree.ParseError) as e:
+            logging.error('Failed to read the results of %s: %s', shard, e)
+        finally:
+            os.remove(local_path)
+            self.shell.Execute('rm -f %s' % shard.output_file_path)
 
     def _VerifyBatchResult(self, gtest_result):
         '''Check a gtest test case result in batch mode
@@ -272,34 +255,302 @@ class GtestBinaryTest(binary_test.BinaryTest):
         asserts.assertFalse(gtest_result.failure_message,
                             gtest_result.failure_message)
 
+    def _CreateBatchShards(self, test_cases, shard_count):
+        '''Creates the batch test cases that run a list of gtest cases.
+
+        The base_test filters are converted to a --gtest_filter, using the
+        shorter of the included and the excluded test names. If the filter
+        fits in _MAX_GTEST_FILTER_LENGTH, the binary is split into
+        shard_count shards with GTEST_TOTAL_SHARDS and GTEST_SHARD_INDEX.
+        Otherwise, the included test names are split into filters short
+        enough to pass to the binary.
+
+        Args:
+            test_cases: list of GtestTestCase objects of the same binary and
+                        arguments.
+            shard_count: int, the number of shards to create.
+
+        Returns:
+            list of GtestTestCase objects, each of which runs a subset of the
+            included test cases.
+        '''
+        included = []
+        excluded = []
+        for test_case in test_cases:
+            if self._IsTestCaseFiltered(test_case):
+                excluded.append(test_case.full_name)
+            else:
+                included.append(test_case.full_name)
+        if not included:
+            return []
+
+        if not excluded:
+            gtest_filter = '*'
+        else:
+            gtest_filter = min(':'.join(included), '-' + ':'.join(excluded),
+                               key=len)
+
+        if len(gtest_filter) <= _MAX_GTEST_FILTER_LENGTH:
+            shard_count = max(min(shard_count, len(included)), 1)
+            filters = [gtest_filter] * shard_count
+        else:
+            shard_count = 1
+            filters = []
+            chunk = []
+            chunk_length = 0
+            for name in included:
+                if chunk and chunk_length + len(name) >= _MAX_GTEST_FILTER_LENGTH:
+                    filters.append(':'.join(chunk))
+                    chunk = []
+                    chunk_length = 0
+                chunk.append(name)
+                chunk_length += len(name) + 1
+            filters.append(':'.join(chunk))
+
+        template = test_cases[0]
+        shards = []
+        for index, shard_filter in enumerate(filters):
+            envp = template.envp
+            if shard_count > 1:
+                envp = '%s GTEST_TOTAL_SHARDS=%d GTEST_SHARD_INDEX=%d' % (
+                    envp, shard_count, index)
+            shard = gtest_test_case.GtestTestCase(
+                path_utils.TargetBaseName(template.path),
+                '',
+                template.path,
+                template.tag,
+                self.PutTag,
+                template.working_directory,
+                template.ld_library_path,
+                template.profiling_library_path,
+                envp=envp.strip(),
+                args=template.args,
+                name_appendix=template.name_appendix)
+            shard.full_name = shard_filter
+            shard.output_file_path = path_utils.JoinTargetPath(
+                path_utils.TargetDirName(template.path),
+                'gtest_output_batch_%s.xml' % uuid.uuid4())
+            shards.append(shard)
+        return shards
+
+    def _RunBatchShards(self, test_cases):
+        '''Runs gtest cases in batch and yields the results as shards finish.
+
+        Test cases of the same binary, arguments and name appendix are run
+        together. Their shards run concurrently on up to the number of
+        parallel jobs. The XML output of a shard is parsed as soon as the
+        shard finishes, so the results are yielded in the order in which the
+        shards finish, and at most one output is held at a time.
+
+        Args:
+            test_cases: list of GtestTestCase objects.
+
+        Yields:
+            GtestTestCase objects representing the results. These are the
+            objects in test_cases with failure_message set. Test cases that
+            were filtered out have no failure message, and will be filtered
+            again when recorded. Results that were not listed by
+            --gtest_list_tests are yielded as new objects.
+        '''
+        # Each group maps the names of its test cases to the test cases
+        # whose results have not been yielded.
+        groups = collections.OrderedDict()
+        for test_case in test_cases:
+            key = (test_case.path, test_case.tag, test_case.name_appendix,
+                   test_case.args, test_case.envp)
+            groups.setdefault(key, collections.OrderedDict())[str(
+                test_case)] = test_case
+
+        jobs = self._GetParallelJobs()
+        shards = collections.deque()
+        remaining_shard_counts = {}
+        for key, group in groups.items():
+            group_shards = self._CreateBatchShards(list(group.values()), jobs)
+            shards.extend((shard, key) for shard in group_shards)
+            remaining_shard_counts[key] = len(group_shards)
+        logging.info('Running %s test cases in %s batch shards.',
+                     len(test_cases), len(shards))
+
+        for key, count in remaining_shard_counts.items():
+            if not count:
+                for test_case in self._IterMissingBatchResults(
+                        groups.pop(key)):
+                    yield test_case
+
+        with self.ParallelShell(jobs) as submit:
+            running = {}
+            while shards or running:
+                # Only run the binaries; the XML outputs are pulled to the
+                # host instead of being returned through the shell.
+                while shards and len(running) < max(jobs, 1):
+                    shard, key = shards.popleft()
+                    running[self._SubmitBatchShard(submit, shard)] = (shard,
+                                                                      key)
+                done, _ = concurrent.futures.wait(
+                    running, return_when=concurrent.futures.FIRST_COMPLETED)
+                for future in done:
+                    shard, key = running.pop(future)
+                    for test_case in self._IterBatchShardResults(
+                            shard, future, groups[key]):
+                        yield test_case
+                    remaining_shard_counts[key] -= 1
+                    if not remaining_shard_counts[key]:
+                        for test_case in self._IterMissingBatchResults(
+                                groups.pop(key)):
+                            yield test_case
+
+    def _SubmitBatchShard(self, submit, shard):
+        '''Submits the command of a batch shard.
+
+        If profiling is enabled, _GetParallelJobs returns 1 and the command
+        runs before submit returns, so profiling is enabled before and the
+        trace data is collected after each shard as RunTestCase does for
+        each test case.
+
+        Args:
+            submit: function provided by ParallelShell.
+            shard: GtestTestCase object, the batch shard.
+
+        Returns:
+            concurrent.futures.Future of the shell command results.
+        '''
+        if self.profiling.enabled:
+            self.profiling.EnableVTSProfiling(self.shell,
+                                              shard.profiling_library_path)
+
+        future = submit(shard.GetGtestCommand())
+
+        if self.profiling.enabled:
+            self.profiling.CollectTraceDataForTestCase([self._dut])
+            self.profiling.DisableVTSProfiling(self.shell)
+        return future
+
+    def _IterBatchShardResults(self, shard, future, group):
+        '''Yields the results of a finished batch shard.
+
+        Args:
+            shard: GtestTestCase object, the batch shard.
+            future: concurrent.futures.Future of the shell command results.
+            group: OrderedDict, the names of the test cases in the shard's
+                   group to the test cases. The yielded ones are removed.
+
+        Yields:
+            GtestTestCase objects with failure_message set.
+        '''
+        try:
+            command_results = future.result()
+        except signals.TestAbortAll:
+            raise
+        except Exception as e:
+            logging.exception('Batch shard %s failed: %s', shard, e)
+            return
+        for stderr in command_results[const.STDERR]:
+            if stderr and stderr.strip():
+                logging.error(stderr)
+        for name, failure_message in self._PullBatchResults(shard):
+            test_case = group.pop(name, None)
+            if test_case is None:
+                # A result that was not listed by --gtest_list_tests.
+                test_case = gtest_test_case.GtestTestCase('', name, '')
+            test_case.failure_message = failure_message
+            yield test_case
+
+    def _IterMissingBatchResults(self, group):
+        '''Yields the test cases of a group which have no result.
+
+        Args:
+            group: OrderedDict, the names of the test cases to the test cases
+                   whose results were not in the outputs of any shard.
+
+        Yields:
+            GtestTestCase objects with failure_message set.
+        '''
+        for test_case in group.values():
+            if self._IsTestCaseFiltered(test_case):
+                test_case.failure_message = None
+            else:
+                test_case.failure_message = (
+                    'No result for %s in gtest XML output.' % test_case)
+            yield test_case
+
     # @Override
     def generateAllTests(self):
         '''Runs all binary tests.
 
-        If the test cases should run in batch mode, this method executes the
-        gtest commands without adding test records, and then parses the XML
-        reports to records.
+        If the test cases should run in batch mode, this method converts the
+        filters in base_test to --gtest_filter, runs the binaries in shards,
+        and parses the XML report of each shard to records as soon as the
+        shard finishes.
         If the test cases should run in batch mode but be skipped (e.g., HAL is
         not implemented), this method applies the filters in base_test, skips
         the batch test cases, and adds one record for each of them.
         '''
         if self.batch_mode and not self.isSkipAllTests():
-            # TODO(b/126412742): Convert filters to --gtest_filter.
-            for test_case in self.testcases:
-                logging.info('Running %s test cases in batch.',
-                             len(test_case.full_name.split(':')))
-                self.RunTestCase(test_case)
-
-                self.runGeneratedTests(
-                    test_func=self._VerifyBatchResult,
-                    settings=self._gtest_results,
-                    name_func=str)
-
-                self._gtest_results = []
+            self.runGeneratedTests(
+                test_func=self._VerifyBatchResult,
+                settings=self._RunBatchShards(self.testcases),
+                name_func=str,
+                lazy=True)
             return
 
-        self.runGeneratedTests(
-            test_func=self.RunTestCase, settings=self.testcases, name_func=str)
+        self.RunTestCases(self.testcases)
+
+
+def _GetBatchFailureMessage(test_case):
+    """Returns the failure message of a testcase element, or None if passed.
+
+    Args:
+        test_case: xml.etree.ElementTree.Element, a testcase element.
+    """
+    failure_message = None
+    for sub in test_case:
+        if sub.tag == 'failure':
+            failure_message = sub.get('message')
+
+    test_case_filtered = [
+        sub for sub in test_case
+        if sub.tag not in _GTEST_RESULT_ATTRIBUTE_WHITE_LIST
+    ]
+    if test_case_filtered and not failure_message:
+        failure_message = 'Error: %s\n' % test_case.attrib
+        for sub in test_case_filtered:
+            failure_message += '%s: %s\n' % (sub.tag, sub.attrib)
+    return failure_message
+
+
+def _IterBatchResults(xml_file):
+    """Parses gtest XML output incrementally.
+
+    Each testcase element is discarded after it is parsed, and each
+    testsuite element after it ends, so that memory usage does not grow with
+    the number of test cases.
+
+    Args:
+        xml_file: file object of the XML output.
+
+    Yields:
+        (test suite name, test case name, failure message) tuples. The
+        failure message is None if the test case passed.
+
+    Raises:
+        xml.etree.ElementTree.ParseError if the XML content is corrupted.
+    """
+    root = None
+    test_suite = None
+    for event, elem in xml.etree.ElementTree.iterparse(
+            xml_file, events=('start', 'end')):
+        if event == 'start':
+            if root is None:
+                root = elem
+            elif elem.tag == 'testsuite':
+                test_suite = elem.get('name')
+                logging.debug('Test tag: %s, attribute: %s', elem.tag,
+                              elem.attrib)
+        elif elem.tag == 'testcase':
+            yield test_suite, elem.get('name'), _GetBatchFailureMessage(elem)
+            elem.clear()
+        elif elem.tag == 'testsuite':
+            root.clear()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,222 @@
+#
+# Copyright (C) 2019 The Android Open Source Project
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+import io
+import mock
+import unittest
+import xml.etree.ElementTree
+
+from vts.runners.host import const
+from vts.runners.host import keys
+from vts.testcases.template.gtest_binary_test import gtest_binary_test
+from vts.testcases.template.gtest_binary_test import gtest_test_case
+
+_BINARY_PATH = "/data/local/tmp/64/binary"
+
+_BATCH_XML = b"""<?xml version="1.0" encoding="UTF-8"?>
+<testsuites tests="3" failures="1" disabled="0" errors="0" name="AllTests">
+  <testsuite name="SuiteA" tests="2" failures="1" disabled="0" errors="0">
+    <testcase name="a" status="run" classname="SuiteA">
+      <properties><property name="key" value="value"/></properties>
+    </testcase>
+    <testcase name="b" status="run" classname="SuiteA">
+      <failure message="b failed" type=""><![CDATA[b failed]]></failure>
+    </testcase>
+  </testsuite>
+  <testsuite name="SuiteB" tests="1" failures="0" disabled="0" errors="0">
+    <testcase name="c" status="run" classname="SuiteB">
+      <skipped/>
+    </testcase>
+  </testsuite>
+</testsuites>
+"""
+
+
+class GtestBinaryTestTest(unittest.TestCase):
+    """Unit tests for the batch mode of GtestBinaryTest."""
+
+    def setUp(self):
+        """Creates a test class whose shell is a mock."""
+        self._test = gtest_binary_test.GtestBinaryTest({
+            keys.ConfigKeys.IKEY_USER_PARAM: {
+                keys.ConfigKeys.KEY_TESTBED_NAME: "Module",
+                keys.ConfigKeys.IKEY_ANDROID_DEVICE: [],
+            }
+        })
+        self._test.parallel_jobs = 1
+        self._test._dut = mock.Mock()
+        self._test.shell = mock.Mock()
+        self._test.shell.Execute.return_value = {
+            const.STDOUT: [""],
+            const.STDERR: [""],
+            const.EXIT_CODE: [0]
+        }
+        self._excluded = set()
+        patcher = mock.patch.object(
+            self._test, "_IsTestCaseFiltered",
+            side_effect=lambda test_case: (
+                test_case.test_name in self._excluded))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def _CreateTestCases(self, names):
+        """Creates a GtestTestCase of the binary for each test name."""
+        return [
+            gtest_test_case.GtestTestCase("Suite", name, _BINARY_PATH, "",
+                                          self._test.PutTag)
+            for name in names
+        ]
+
+    def testCreateBatchShardsExcludeFilter(self):
+        """Tests that the excluded names are used if they are shorter."""
+        self._excluded.add("e")
+        shards = self._test._CreateBatchShards(
+            self._CreateTestCases("abcde"), 2)
+        self.assertEqual(["-Suite.e", "-Suite.e"],
+                         [shard.full_name for shard in shards])
+        self.assertEqual(
+            ["GTEST_TOTAL_SHARDS=2 GTEST_SHARD_INDEX=0",
+             "GTEST_TOTAL_SHARDS=2 GTEST_SHARD_INDEX=1"],
+            [shard.envp for shard in shards])
+        self.assertNotEqual(shards[0].output_file_path,
+                            shards[1].output_file_path)
+
+    def testCreateBatchShardsIncludeFilter(self):
+        """Tests that the included names are used if they are shorter."""
+        self._excluded.update("bc")
+        shards = self._test._CreateBatchShards(
+            self._CreateTestCases("abc"), 4)
+        self.assertEqual(["Suite.a"], [shard.full_name for shard in shards])
+        self.assertEqual([""], [shard.envp for shard in shards])
+
+    def testCreateBatchShardsNoFilter(self):
+        """Tests the filters if no test case is excluded or included."""
+        shards = self._test._CreateBatchShards(self._CreateTestCases("ab"), 4)
+        self.assertEqual(["*", "*"], [shard.full_name for shard in shards])
+
+        self._excluded.update("ab")
+        self.assertEqual(
+            [], self._test._CreateBatchShards(self._CreateTestCases("ab"), 4))
+
+    @mock.patch.object(gtest_binary_test, "_MAX_GTEST_FILTER_LENGTH", 20)
+    def testCreateBatchShardsLongFilter(self):
+        """Tests that a long filter is split instead of sharded."""
+        self._excluded.update("def")
+        shards = self._test._CreateBatchShards(
+            self._CreateTestCases("abcdef"), 4)
+        self.assertEqual(["Suite.a:Suite.b", "Suite.c"],
+                         [shard.full_name for shard in shards])
+        self.assertEqual(["", ""], [shard.envp for shard in shards])
+
+    def testRunBatchShardsMissingResults(self):
+        """Tests the test cases which are missing from the XML output."""
+        self._excluded.add("c")
+        test_cases = self._CreateTestCases("abc")
+        with mock.patch.object(
+                self._test, "_PullBatchResults",
+                return_value=iter([("Suite.a", None), ("Suite.x", None)])):
+            results = list(self._test._RunBatchShards(test_cases))
+
+        self.assertEqual(["Suite.a", "Suite.x", "Suite.b", "Suite.c"],
+                         [str(result) for result in results])
+        self.assertEqual(
+            [None, None, "No result for Suite.b in gtest XML output.", None],
+            [result.failure_message for result in results])
+        self.assertIs(test_cases[0], results[0])
+
+    def testRunBatchShardsProfiling(self):
+        """Tests that profiling is enabled around each shard."""
+        self._test.profiling = mock.Mock(enabled=True)
+        self._test.parallel_jobs = 4
+        calls = mock.Mock()
+        calls.attach_mock(self._test.profiling, "profiling")
+        calls.attach_mock(self._test.shell.Execute, "Execute")
+        with mock.patch.object(
+                self._test, "_PullBatchResults",
+                return_value=iter([("Suite.a", None), ("Suite.b", "failed")])):
+            results = list(
+                self._test._RunBatchShards(self._CreateTestCases("ab")))
+
+        self.assertEqual([None, "failed"],
+                         [result.failure_message for result in results])
+        self.assertEqual([
+            "profiling.EnableVTSProfiling", "Execute",
+            "profiling.CollectTraceDataForTestCase",
+            "profiling.DisableVTSProfiling"
+        ], [call[0] for call in calls.mock_calls])
+
+
+class BatchResultsTest(unittest.TestCase):
+    """Unit tests for parsing the XML output of batch mode."""
+
+    def testGetBatchFailureMessage(self):
+        """Tests the failure messages of testcase elements."""
+        root = xml.etree.ElementTree.fromstring(_BATCH_XML)
+        test_cases = root.findall(".//testcase")
+        self.assertIsNone(
+            gtest_binary_test._GetBatchFailureMessage(test_cases[0]))
+        self.assertEqual(
+            "b failed",
+            gtest_binary_test._GetBatchFailureMessage(test_cases[1]))
+        message = gtest_binary_test._GetBatchFailureMessage(test_cases[2])
+        self.assertTrue(message.startswith("Error: "))
+        self.assertTrue(message.endswith("\nskipped: {}\n"))
+
+    def testIterBatchResults(self):
+        """Tests that the test cases of all test suites are parsed."""
+        results = list(
+            gtest_binary_test._IterBatchResults(io.BytesIO(_BATCH_XML)))
+        self.assertEqual([("SuiteA", "a", None), ("SuiteA", "b", "b failed")],
+                         results[:2])
+        self.assertEqual(("SuiteB", "c"), results[2][:2])
+        self.assertTrue(results[2][2])
+
+    def testIterBatchResultsIncremental(self):
+        """Tests that parsed elements are discarded as the output is read."""
+        elements = []
+        iterparse = xml.etree.ElementTree.iterparse
+
+        def _IterParse(*args, **kwargs):
+            for event, elem in iterparse(*args, **kwargs):
+                elements.append(elem)
+                yield event, elem
+
+        with mock.patch.object(xml.etree.ElementTree, "iterparse",
+                               _IterParse):
+            results = gtest_binary_test._IterBatchResults(
+                io.BytesIO(_BATCH_XML))
+            self.assertEqual(("SuiteA", "a", None), next(results))
+            for _ in results:
+                pass
+
+        root = elements[0]
+        self.assertEqual(0, len(root))
+        for elem in elements:
+            if elem.tag == "testcase":
+                self.assertEqual(0, len(elem))
+                self.assertEqual({}, elem.attrib)
+
+    def testIterBatchResultsCorrupted(self):
+        """Tests that a truncated output raises ParseError."""
+        results = gtest_binary_test._IterBatchResults(
+            io.BytesIO(_BATCH_XML[:_BATCH_XML.index(b"<testcase name=\"b\"")]))
+        self.assertEqual(("SuiteA", "a", None), next(results))
+        with self.assertRaises(xml.etree.ElementTree.ParseError):
+            next(results)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -54,17 +54,31 @@ class GtestTestCase(binary_test_case.BinaryTestCase):
         if raw_command:
             return super(GtestTestCase, self).GetRunCommand()
 
+        return [self.GetGtestCommand(output_file_path, test_name),
+                'cat {output} && rm -rf {output}'.format(
+                    output=self.output_file_path)]
+
+    def GetGtestCommand(self, output_file_path=None, test_name=None):
+        '''Get the command which runs the binary and writes the xml output.
+
+        Unlike GetRunCommand, the command does not print the output.
+
+        Args:
+            output_file_path: file to store the gtest results.
+            test_name: name of the gtest test case.
+
+        Returns:
+            String, a command to run the test.
+        '''
         if output_file_path:
             self.output_file_path = output_file_path
         if not test_name:
             test_name = self.full_name
-        return [('{cmd} --gtest_filter={test} '
-                 '--gtest_output=xml:{output_file_path}').format(
-                     cmd=super(GtestTestCase, self).GetRunCommand(),
-                     test = test_name,
-                     output_file_path=self.output_file_path),
-                'cat {output} && rm -rf {output}'.format(
-                    output=self.output_file_path)]
+        return ('{cmd} --gtest_filter={test} '
+                '--gtest_output=xml:{output_file_path}').format(
+                    cmd=super(GtestTestCase, self).GetRunCommand(),
+                    test=test_name,
+                    output_file_path=self.output_file_path)
 
     @property
     def output_file_path(self):
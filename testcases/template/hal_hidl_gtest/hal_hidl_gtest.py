@@ -161,10 +161,11 @@ class HidlHalGTest(gtest_binary_test.GtestBinaryTest):
         # find the correponding service name(s) for each registered service and
         # store the mapping in dict service_instances.
         service_instances = {}
+        testabilities = hal_service_name_utils.GetHalServiceNames(
+            self.shell, registered_services, self.abi_bitness,
+            self.run_as_compliance_test)
         for service in registered_services:
-            testable, service_names = hal_service_name_utils.GetHalServiceName(
-                self.shell, service, self.abi_bitness,
-                self.run_as_compliance_test)
+            testable, service_names = testabilities[service]
             if not testable:
                 self.skipAllTests("Hal: %s is not testable, "
                                   "skip all tests." % service)
@@ -93,7 +93,7 @@ class HalHidlHostTest(param_test.ParamTestClass):
     def tearDown(self):
         """Cleanup process for each test case."""
         if self.profiling.enabled:
-            self.profiling.ProcessTraceDataForTestCase(self.dut)
+            self.profiling.CollectTraceDataForTestCase([self.dut])
             self.profiling.DisableVTSProfiling(self.shell)
 
     # @Override
@@ -142,10 +142,11 @@ class HalHidlHostTest(param_test.ParamTestClass):
         registered_services = copy.copy(self.TEST_HAL_SERVICES)
         service_instances = {}
 
+        testabilities = hal_service_name_utils.GetHalServiceNames(
+            self.shell, registered_services, self.abi_bitness,
+            self.run_as_compliance_test)
         for service in registered_services:
-            testable, service_names = hal_service_name_utils.GetHalServiceName(
-                self.shell, service, self.abi_bitness,
-                self.run_as_compliance_test)
+            testable, service_names = testabilities[service]
             if not testable:
                 self.skipAllTests("Hal: %s is not testable, "
                                   "skip all tests." % service)
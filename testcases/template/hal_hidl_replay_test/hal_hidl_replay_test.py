@@ -77,14 +77,19 @@ class HalHidlReplayTest(binary_test.BinaryTest):
         self.custom_ld_library_path = path_utils.JoinTargetPath(
             self.DEVICE_TMP_DIR, self.abi_bitness)
 
+        trace_pairs = []
         for trace_path in self.trace_paths:
             trace_file_name = str(os.path.basename(trace_path))
             target_trace_path = path_utils.JoinTargetPath(
                 self.DEVICE_VTS_TRACE_FILE_PATH, trace_file_name)
-            self._dut.adb.push(
-                path_utils.JoinTargetPath(self.data_file_path,
-                                          "hal-hidl-trace", trace_path),
-                target_trace_path)
+            host_trace_path = path_utils.JoinTargetPath(
+                self.data_file_path, "hal-hidl-trace", trace_path)
+            trace_pairs.append((host_trace_path, target_trace_path))
+        self.deploy_manager.Push(trace_pairs)
+        self.shell.Execute("chmod 755 %s" % self.replayer_binary_path)
+
+        for _, target_trace_path in trace_pairs:
+            trace_file_name = str(os.path.basename(target_trace_path))
             service_instance_combinations = self._GetServiceInstanceCombinations(
                 target_trace_path)
 
@@ -191,7 +196,6 @@ class HalHidlReplayTest(binary_test.BinaryTest):
         """
         registered_services = []
         service_instances = {}
-        self.shell.Execute("chmod 755 %s" % self.replayer_binary_path)
         results = self.shell.Execute(
             "LD_LIBRARY_PATH=%s:$LD_LIBRARY_PATH %s --list_service %s" %
             (self.custom_ld_library_path, self.replayer_binary_path,
@@ -210,10 +214,11 @@ class HalHidlReplayTest(binary_test.BinaryTest):
                 service = line[len('hal_service: '):]
                 registered_services.append(service)
 
+        testabilities = hal_service_name_utils.GetHalServiceNames(
+            self.shell, registered_services, self.abi_bitness,
+            self.run_as_compliance_test)
         for service in registered_services:
-            testable, service_names = hal_service_name_utils.GetHalServiceName(
-                self.shell, service, self.abi_bitness,
-                self.run_as_compliance_test)
+            testable, service_names = testabilities[service]
             if not testable:
                 self.skipAllTests("Hal: %s is not testable, "
                                   "skip all tests." % service)
@@ -25,6 +25,7 @@ from vts.runners.host import test_runner
 from vts.utils.python.controllers import adb
 
 from vts.utils.python.common import list_utils
+from vts.utils.python.file import deploy_utils
 from vts.utils.python.os import path_utils
 
 from vts.testcases.template.llvmfuzzer_test import llvmfuzzer_test_config as config
@@ -36,6 +37,8 @@ class LLVMFuzzerTest(base_test.BaseTestClass):
     Attributes:
         _dut: AndroidDevice, the device under test as config
         _testcases: string list, list of testcases to run
+        _deploy_manager: DeployManager, pushes the fuzzers that are not up to
+                         date on the device
         start_vts_agents: whether to start vts agents when registering new
                           android devices.
     """
@@ -59,21 +62,36 @@ class LLVMFuzzerTest(base_test.BaseTestClass):
 
         self._dut = self.android_devices[0]
         self._dut.adb.shell("mkdir %s -p" % config.FUZZER_TEST_DIR)
+        self._deploy_manager = deploy_utils.DeployManager(self._dut.adb)
+        # Push all fuzzers in one transfer so that RunTestcase finds them up
+        # to date. Missing fuzzers fail in their own test cases.
+        self.PushFiles(*[
+            testcase for testcase in self._testcases if os.path.exists(
+                os.path.join(self.data_file_path, config.FUZZER_SRC_DIR,
+                             testcase))
+        ])
 
     def tearDownClass(self):
         """Deletes all copied data."""
         self._dut.adb.shell("rm -rf %s" % config.FUZZER_TEST_DIR)
 
-    def PushFiles(self, testcase):
-        """adb pushes testcase file to target.
+    def PushFiles(self, *testcases):
+        """adb pushes testcase files that are not up to date to target.
 
         Args:
-            testcase: string, path to executable fuzzer.
+            *testcases: strings, paths to executable fuzzers.
         """
-        push_src = os.path.join(self.data_file_path, config.FUZZER_SRC_DIR,
-                                testcase)
-        self._dut.adb.push("%s %s" % (push_src, config.FUZZER_TEST_DIR))
-        logging.debug("Adb pushed: %s", testcase)
+        file_pairs = []
+        for testcase in testcases:
+            push_src = os.path.join(self.data_file_path,
+                                    config.FUZZER_SRC_DIR, testcase)
+            push_dst = path_utils.JoinTargetPath(config.FUZZER_TEST_DIR,
+                                                 os.path.basename(testcase))
+            file_pairs.append((push_src, push_dst))
+        pushed = self._deploy_manager.Push(file_pairs)
+        if pushed:
+            logging.debug("Adb pushed: %s", pushed)
+            self._deploy_manager.Chmod(pushed)
 
     def CreateFuzzerFlags(self, fuzzer_config):
         """Creates flags for the fuzzer executable.
@@ -169,10 +187,6 @@ class LLVMFuzzerTest(base_test.BaseTestClass):
         test_flags = self.CreateFuzzerFlags(fuzzer_config)
         corpus_dir = self.CreateCorpus(fuzzer, fuzzer_config)
 
-        chmod_cmd = "chmod -R 755 %s" % path_utils.JoinTargetPath(
-            config.FUZZER_TEST_DIR, fuzzer)
-        self._dut.adb.shell(chmod_cmd)
-
         cd_cmd = "cd %s" % config.FUZZER_TEST_DIR
         ld_path = "LD_LIBRARY_PATH=/data/local/tmp/64:/data/local/tmp/32:$LD_LIBRARY_PATH"
         test_cmd = "./%s" % fuzzer
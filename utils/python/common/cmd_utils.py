@@ -14,8 +14,13 @@
 # limitations under the License.
 
 import logging
+import math
+import os
+import select
+import signal
 import subprocess
 import threading
+import time
 
 from vts.runners.host import utils
 
@@ -29,6 +34,21 @@ EXIT_CODE_TIMEOUT_ON_LINUX = -15
 # Same as EXIT_CODE_TIMEOUT_ON_LINUX but on Windows systems.
 EXIT_CODE_TIMEOUT_ON_WINDOWS = -1073741510
 
+# Maximum number of commands that ExecuteShellCommands runs at a time.
+DEFAULT_MAX_CONCURRENCY = 16
+# Seconds between terminating a timed out process group and killing it, and
+# between a process exiting and closing the pipes still held by its
+# descendants.
+_KILL_GRACE_PERIOD_SECS = 5
+# Maximum seconds between two checks of the running processes.
+_POLL_INTERVAL_SECS = 0.5
+# Seconds between two checks of a process which has closed its pipes. The
+# interval starts from the minimum and doubles up to the maximum.
+_MIN_EXIT_POLL_INTERVAL_SECS = 0.0005
+_MAX_EXIT_POLL_INTERVAL_SECS = 0.05
+# Bytes read from a pipe at a time.
+_READ_SIZE = 64 * 1024
+
 
 def _ExecuteOneShellCommandWithTimeout(cmd,
                                        timeout,
@@ -100,6 +120,286 @@ def RunCommand(command):
     return proc.returncode
 
 
+class _RunningCommand(object):
+    """A command started by ExecuteShellCommands.
+
+    Attributes:
+        cmd: string, the shell command.
+        proc: Popen object, the shell process.
+        new_process_group: bool, whether proc leads a new process group.
+        start_time: float, time when the command was started.
+        stdout_fd: int, the file descriptor of stdout.
+        stderr_fd: int, the file descriptor of stderr.
+        outputs: dict, file descriptor to list of strings, the captured
+                 output of each pipe.
+        sizes: dict, file descriptor to the number of bytes captured.
+        dropped: int, the number of bytes which exceeded the size cap.
+        line_fd: int, the file descriptor of stdout if its lines are passed
+                 to a callback. None otherwise.
+        partial_line: string, the stdout which does not end with new line
+                      yet.
+        open_fds: set of ints, the file descriptors not at end of file.
+        kill_time: float, time when the process group was terminated. None
+                   if it has not timed out.
+        exit_time: float, time when the process was found to exit.
+        exit_poll_interval: float, seconds to the next check of the process
+                            after it closes the pipes.
+    """
+
+    def __init__(self, cmd, stream_stdout, new_process_group):
+        self.cmd = cmd
+        self.new_process_group = new_process_group
+        if new_process_group:
+            self.proc = utils.start_standing_subprocess(cmd)
+        else:
+            # The process stays in the group of this process, so that the
+            # signals from the terminal, e.g., Ctrl-C, reach it.
+            self.proc = subprocess.Popen(
+                cmd, shell=True, stdout=subprocess.PIPE,
+                stderr=subprocess.PIPE)
+        self.start_time = time.time()
+        self.stdout_fd = self.proc.stdout.fileno()
+        self.stderr_fd = self.proc.stderr.fileno()
+        self.outputs = {self.stdout_fd: [], self.stderr_fd: []}
+        self.sizes = {self.stdout_fd: 0, self.stderr_fd: 0}
+        self.dropped = 0
+        self.line_fd = self.stdout_fd if stream_stdout else None
+        self.partial_line = b""
+        self.open_fds = set([self.stdout_fd, self.stderr_fd])
+        self.kill_time = None
+        self.exit_time = None
+        self.exit_poll_interval = _MIN_EXIT_POLL_INTERVAL_SECS
+
+    def OnReadable(self, fd, max_output_size, stdout_line_callback):
+        """Reads from a pipe which is ready."""
+        data = os.read(fd, _READ_SIZE)
+        if not data:
+            self.CloseFd(fd, stdout_line_callback)
+            return
+        if fd == self.line_fd:
+            lines = (self.partial_line + data).split(b"\n")
+            self.partial_line = lines.pop()
+            for line in lines:
+                stdout_line_callback(line + b"\n")
+            return
+        if max_output_size is not None:
+            kept = max(0, min(len(data), max_output_size - self.sizes[fd]))
+            self.dropped += len(data) - kept
+            data = data[:kept]
+        if data:
+            self.outputs[fd].append(data)
+            self.sizes[fd] += len(data)
+
+    def CloseFd(self, fd, stdout_line_callback):
+        """Stops reading from a pipe."""
+        if fd == self.line_fd and self.partial_line:
+            stdout_line_callback(self.partial_line)
+            self.partial_line = b""
+        self.open_fds.discard(fd)
+
+    def Check(self, now, timeout, stdout_line_callback):
+        """Handles the timeout and the exit of the process.
+
+        Returns:
+            bool, whether the command has finished.
+        """
+        if self.exit_time is None and self.proc.poll() is not None:
+            self.exit_time = now
+        if not self.open_fds and self.exit_time is None:
+            self.exit_poll_interval = min(self.exit_poll_interval * 2,
+                                          _MAX_EXIT_POLL_INTERVAL_SECS)
+        if self.kill_time is None:
+            if (self.exit_time is None and timeout is not None and
+                    now - self.start_time >= timeout):
+                logging.error("Command timed out after %ss: %s", timeout,
+                              self.cmd)
+                self.kill_time = now
+                utils.kill_process_group(self.proc)
+        elif (self.exit_time is None and
+              now - self.kill_time >= _KILL_GRACE_PERIOD_SECS):
+            utils.kill_process_group(self.proc, signal.SIGKILL)
+        if (self.exit_time is not None and
+                now - self.exit_time >= _KILL_GRACE_PERIOD_SECS):
+            # The descendants of the process hold the pipes.
+            for fd in list(self.open_fds):
+                self.CloseFd(fd, stdout_line_callback)
+        return not self.open_fds and self.exit_time is not None
+
+    def GetNextCheckTime(self, timeout):
+        """Returns the time when Check may change the state."""
+        if not self.open_fds and self.exit_time is None:
+            return time.time() + self.exit_poll_interval
+        if self.exit_time is not None:
+            return self.exit_time + _KILL_GRACE_PERIOD_SECS
+        if self.kill_time is not None:
+            return self.kill_time + _KILL_GRACE_PERIOD_SECS
+        if timeout is not None:
+            return self.start_time + timeout
+        return None
+
+    def Kill(self):
+        """Kills the process, and its group if it leads one."""
+        if self.proc.poll() is not None:
+            return
+        if self.new_process_group:
+            utils.kill_process_group(self.proc, signal.SIGKILL)
+        else:
+            self.proc.kill()
+
+    def GetResult(self):
+        """Closes the pipes and returns (stdout, stderr, exit_code)."""
+        self.proc.wait()
+        self.proc.stdout.close()
+        self.proc.stderr.close()
+        if self.dropped:
+            logging.warning("Dropped %d bytes of output over the size cap: %s",
+                            self.dropped, self.cmd)
+        return (b"".join(self.outputs[self.stdout_fd]),
+                b"".join(self.outputs[self.stderr_fd]), self.proc.returncode)
+
+    @property
+    def timed_out(self):
+        """Whether the command was terminated for timeout."""
+        return self.kill_time is not None
+
+
+def _ExecuteShellCommandsOnWindows(cmds, timeout, stdout_line_callback):
+    """Executes shell commands one after another without select.
+
+    select does not support pipes on Windows.
+
+    Returns:
+        A list of (stdout, stderr, exit_code, timed_out) tuples.
+    """
+    results = []
+    for cmd in cmds:
+        if stdout_line_callback is not None:
+            stderr, exit_code = _ExecuteOneShellCommandStreamingWithThread(
+                cmd, stdout_line_callback)
+            results.append((b"", stderr, exit_code, False))
+            continue
+        if timeout is None:
+            p = subprocess.Popen(
+                cmd, shell=True, stdout=subprocess.PIPE,
+                stderr=subprocess.PIPE)
+            stdout, stderr = p.communicate()
+            results.append((stdout, stderr, p.returncode, False))
+            continue
+        stdout, stderr, exit_code = _ExecuteOneShellCommandWithTimeout(
+            cmd, timeout)
+        results.append((stdout, stderr, exit_code,
+                        exit_code == EXIT_CODE_TIMEOUT_ON_WINDOWS))
+    return results
+
+
+def _WaitForReadableFds(fds, wait_secs):
+    """Waits until some file descriptors are readable or at end of file.
+
+    poll is used where it is available, since select fails on the file
+    descriptors which are not less than FD_SETSIZE.
+
+    Args:
+        fds: list of ints, the file descriptors.
+        wait_secs: float, the maximum seconds to wait.
+
+    Returns:
+        A list of the file descriptors which are ready.
+    """
+    if not hasattr(select, "poll"):
+        readable, _, _ = select.select(fds, [], [], wait_secs)
+        return readable
+    poller = select.poll()
+    for fd in fds:
+        poller.register(fd, select.POLLIN | select.POLLPRI)
+    # Round up so that a short wait does not become a busy loop.
+    return [fd for fd, _ in poller.poll(int(math.ceil(wait_secs * 1000)))]
+
+
+def _ExecuteShellCommands(cmds, timeout=None, max_output_size=None,
+                          max_concurrency=DEFAULT_MAX_CONCURRENCY,
+                          stdout_line_callback=None):
+    """Executes shell commands concurrently in one polling loop.
+
+    Returns:
+        A list of (stdout, stderr, exit_code, timed_out) tuples in the order
+        of cmds.
+    """
+    cmds = [str(cmd) for cmd in cmds]
+    if utils.is_on_windows():
+        return _ExecuteShellCommandsOnWindows(cmds, timeout,
+                                              stdout_line_callback)
+    results = [None] * len(cmds)
+    running = {}
+    next_index = 0
+    try:
+        while next_index < len(cmds) or running:
+            while next_index < len(cmds) and len(running) < max_concurrency:
+                running[next_index] = _RunningCommand(
+                    cmds[next_index], stdout_line_callback is not None,
+                    timeout is not None)
+                next_index += 1
+
+            fd_to_command = {}
+            for command in running.values():
+                for fd in command.open_fds:
+                    fd_to_command[fd] = command
+            now = time.time()
+            wait_secs = _POLL_INTERVAL_SECS
+            for command in running.values():
+                next_check_time = command.GetNextCheckTime(timeout)
+                if next_check_time is not None:
+                    wait_secs = min(wait_secs, max(0, next_check_time - now))
+            if fd_to_command:
+                for fd in _WaitForReadableFds(list(fd_to_command), wait_secs):
+                    fd_to_command[fd].OnReadable(fd, max_output_size,
+                                                 stdout_line_callback)
+            else:
+                time.sleep(wait_secs)
+
+            now = time.time()
+            for index, command in list(running.items()):
+                if command.Check(now, timeout, stdout_line_callback):
+                    del running[index]
+                    results[index] = (command.GetResult() +
+                                      (command.timed_out, ))
+    finally:
+        for command in running.values():
+            command.Kill()
+            command.proc.wait()
+            command.proc.stdout.close()
+            command.proc.stderr.close()
+    return results
+
+
+def ExecuteShellCommands(cmds, timeout=None, max_output_size=None,
+                         max_concurrency=DEFAULT_MAX_CONCURRENCY):
+    """Executes shell commands concurrently.
+
+    The outputs of all commands are read by one polling loop in the calling
+    thread. If timeout is set, each command runs in its own process group,
+    which is terminated when the command times out and killed if it does not
+    exit in 5 seconds. Otherwise, the commands stay in the process group of
+    the caller.
+
+    Args:
+        cmds: a list of strings, shell commands.
+        timeout: float, timeout in seconds for each command. None to wait
+                 until it exits.
+        max_output_size: int, maximum bytes captured from stdout and from
+                         stderr of each command. The rest is dropped. None to
+                         capture all output.
+        max_concurrency: int, maximum number of commands running at a time.
+                         1 to run the commands one after another.
+
+    Returns:
+        A list of tuple(string, string, int), containing stdout, stderr,
+        exit_code of each shell command in the order of cmds.
+        If timeout, exit_code is -15 on Unix; -1073741510 on Windows.
+    """
+    return [result[:3] for result in _ExecuteShellCommands(
+        cmds, timeout, max_output_size, max_concurrency)]
+
+
 def ExecuteOneShellCommand(cmd, timeout=None, callback_on_timeout=None, *args):
     """Executes one shell command and returns (stdout, stderr, exit_code).
 
@@ -115,24 +415,67 @@ def ExecuteOneShellCommand(cmd, timeout=None, callback_on_timeout=None, *args):
         the shell command.
         If timeout, exit_code is -15 on Unix; -1073741510 on Windows.
     """
-    if timeout is None:
-        p = subprocess.Popen(
-            str(cmd),
-            shell=True,
-            stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE)
-        stdout, stderr = p.communicate()
-        return (stdout, stderr, p.returncode)
-    else:
-        return _ExecuteOneShellCommandWithTimeout(
-            str(cmd), timeout, callback_on_timeout, *args)
-
-
-def ExecuteShellCommand(cmd):
+    stdout, stderr, exit_code, timed_out = _ExecuteShellCommands(
+        [cmd], timeout)[0]
+    if timed_out and callback_on_timeout is not None:
+        callback_on_timeout(*args)
+    return (stdout, stderr, exit_code)
+
+
+def ExecuteOneShellCommandStreaming(cmd, stdout_line_callback):
+    """Executes one shell command and passes its stdout to a callback by line.
+
+    Unlike ExecuteOneShellCommand, the stdout is not buffered, so the memory
+    usage does not grow with the size of the output.
+
+    Args:
+        cmd: string, a shell command.
+        stdout_line_callback: callable, called with each line of stdout,
+                              including the trailing newline.
+
+    Returns:
+        tuple(string, int), containing stderr and exit_code of the shell
+        command.
+    """
+    _, stderr, exit_code, _ = _ExecuteShellCommands(
+        [cmd], stdout_line_callback=stdout_line_callback)[0]
+    return stderr, exit_code
+
+
+def _ExecuteOneShellCommandStreamingWithThread(cmd, stdout_line_callback):
+    """Implements ExecuteOneShellCommandStreaming on Windows."""
+    p = subprocess.Popen(
+        str(cmd), shell=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    stderr = []
+    # Drain stderr concurrently so that the command never blocks on a full
+    # stderr pipe while stdout is being read.
+    stderr_thread = threading.Thread(
+        target=lambda: stderr.append(p.stderr.read()))
+    stderr_thread.daemon = True
+    stderr_thread.start()
+    try:
+        for line in iter(p.stdout.readline, b""):
+            stdout_line_callback(line)
+    finally:
+        p.stdout.close()
+        p.wait()
+        stderr_thread.join()
+        p.stderr.close()
+    return (stderr[0] if stderr else b""), p.returncode
+
+
+def ExecuteShellCommand(cmd, timeout=None, max_output_size=None,
+                        max_concurrency=1):
     """Execute one shell cmd or a list of shell commands.
 
     Args:
         cmd: string or a list of strings, shell command(s)
+        timeout: float, timeout in seconds for each command.
+        max_output_size: int, maximum bytes captured from stdout and from
+                         stderr of each command. None to capture all output.
+        max_concurrency: int, maximum number of commands running at a time.
+                         Default is 1, which runs the commands one after
+                         another.
 
     Returns:
         dict{int->string}, containing stdout, stderr, exit_code of the shell command(s)
@@ -140,6 +483,7 @@ def ExecuteShellCommand(cmd):
     if not isinstance(cmd, list):
         cmd = [cmd]
 
-    results = [ExecuteOneShellCommand(command) for command in cmd]
+    results = ExecuteShellCommands(cmd, timeout, max_output_size,
+                                   max_concurrency)
     stdout, stderr, exit_code = zip(*results)
     return {STDOUT: stdout, STDERR: stderr, EXIT_CODE: exit_code}
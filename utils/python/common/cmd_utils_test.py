@@ -0,0 +1,95 @@
+#!/usr/bin/env python
+#
+# Copyright (C) 2019 The Android Open Source Project
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+import os
+import resource
+import time
+import unittest
+
+from vts.utils.python.common import cmd_utils
+
+
+class CmdUtilsTest(unittest.TestCase):
+    """Unit tests for cmd_utils module."""
+
+    def testExecuteOneShellCommand(self):
+        """Tests capturing stdout, stderr and exit code."""
+        self.assertEqual(
+            cmd_utils.ExecuteOneShellCommand("echo out; echo err >&2; exit 3"),
+            ("out\n", "err\n", 3))
+
+    def testExecuteShellCommandsConcurrently(self):
+        """Tests that commands run concurrently and results are in order."""
+        start = time.time()
+        results = cmd_utils.ExecuteShellCommands(
+            ["sleep 0.5; echo a", "sleep 0.3; echo b", "echo c"])
+        self.assertLess(time.time() - start, 1)
+        self.assertEqual([result[0] for result in results],
+                         ["a\n", "b\n", "c\n"])
+
+    def testTimeout(self):
+        """Tests that the process group is terminated on timeout."""
+        timed_out = []
+        start = time.time()
+        result = cmd_utils.ExecuteOneShellCommand(
+            "sleep 10 | cat; echo done", 0.2, timed_out.append, True)
+        self.assertLess(time.time() - start, 2)
+        self.assertEqual(result,
+                         ("", "", cmd_utils.EXIT_CODE_TIMEOUT_ON_LINUX))
+        self.assertEqual(timed_out, [True])
+
+    def testProcessGroup(self):
+        """Tests that only commands with timeout get new process groups."""
+        cmd = "ps -o pgid= -p $$"
+        stdout, _, _ = cmd_utils.ExecuteOneShellCommand(cmd)
+        self.assertEqual(os.getpgrp(), int(stdout))
+        stdout, _, _ = cmd_utils.ExecuteOneShellCommand(cmd, 10)
+        self.assertNotEqual(os.getpgrp(), int(stdout))
+
+    def testHighFileDescriptors(self):
+        """Tests reading pipes whose file descriptors exceed FD_SETSIZE."""
+        max_fd = 1100
+        if resource.getrlimit(resource.RLIMIT_NOFILE)[0] <= max_fd:
+            self.skipTest("The file descriptor limit is too low.")
+        fds = []
+        try:
+            while not fds or fds[-1] < max_fd:
+                fds.append(os.open(os.devnull, os.O_RDONLY))
+            self.assertEqual(cmd_utils.ExecuteOneShellCommand("echo a"),
+                             ("a\n", "", 0))
+        finally:
+            for fd in fds:
+                os.close(fd)
+
+    def testMaxOutputSize(self):
+        """Tests that the captured output is capped."""
+        results = cmd_utils.ExecuteShellCommands(
+            ["head -c 100000 /dev/zero"], max_output_size=10)
+        self.assertEqual(results, [("\0" * 10, "", 0)])
+
+    def testExecuteOneShellCommandStreaming(self):
+        """Tests passing stdout to a callback by line."""
+        lines = []
+        self.assertEqual(
+            cmd_utils.ExecuteOneShellCommandStreaming(
+                "printf 'a\\nb\\nc'; echo err >&2", lines.append),
+            ("err\n", 0))
+        self.assertEqual(lines, ["a\n", "b\n", "c"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,250 @@
+#
+# Copyright (C) 2019 The Android Open Source Project
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+import logging
+import multiprocessing
+import threading
+import time
+import traceback
+
+import concurrent.futures
+
+# Number of threads in the shared thread pool, for IO-bound tasks.
+DEFAULT_THREAD_WORKERS = 30
+# Maximum seconds between two checks of the cancel event and the timeouts.
+_POLL_INTERVAL_SECS = 0.5
+# Maximum seconds between two checks of whether the calls have started.
+_START_POLL_INTERVAL_SECS = 0.05
+
+_shared_services = {}
+_shared_services_lock = threading.Lock()
+# The ExecutorService whose thread pool runs the current thread.
+_worker_state = threading.local()
+
+
+def _RunOnWorker(service, func, *args, **kwargs):
+    """Calls a function on a thread of an ExecutorService.
+
+    The service is recorded in the thread while the function runs, so that
+    the nested calls of Map run inline instead of waiting for the same pool.
+    """
+    _worker_state.service = service
+    try:
+        return func(*args, **kwargs)
+    finally:
+        _worker_state.service = None
+
+
+class ExecutorService(object):
+    """A lazily created executor which is reused by many calls.
+
+    Attributes:
+        max_workers: int, the number of workers.
+        use_processes: bool, whether the workers are processes, for CPU-bound
+                       tasks, or threads, for IO-bound tasks. The functions
+                       and the parameters of a process pool must be
+                       picklable.
+        _executor: the Executor object. None if it is not created yet.
+        _lock: threading.Lock, guards _executor.
+    """
+
+    def __init__(self, max_workers=None, use_processes=False):
+        if max_workers is None:
+            max_workers = (multiprocessing.cpu_count()
+                           if use_processes else DEFAULT_THREAD_WORKERS)
+        self.max_workers = max_workers
+        self.use_processes = use_processes
+        self._executor = None
+        self._lock = threading.Lock()
+
+    def _GetExecutor(self):
+        """Returns the executor, creating it on first use."""
+        with self._lock:
+            if self._executor is None:
+                if self.use_processes:
+                    self._executor = concurrent.futures.ProcessPoolExecutor(
+                        max_workers=self.max_workers)
+                else:
+                    self._executor = concurrent.futures.ThreadPoolExecutor(
+                        max_workers=self.max_workers)
+            return self._executor
+
+    def Submit(self, func, *args, **kwargs):
+        """Schedules a function call.
+
+        Returns:
+            Future object.
+        """
+        if self.use_processes:
+            return self._GetExecutor().submit(func, *args, **kwargs)
+        return self._GetExecutor().submit(_RunOnWorker, self, func, *args,
+                                          **kwargs)
+
+    def _IsWorkerThread(self):
+        """Returns whether the current thread is a worker of this service."""
+        return getattr(_worker_state, "service", None) is self
+
+    def _MapInline(self, func, params, cancel, stop_on_error):
+        """Calls a function with each set of parameters in this thread.
+
+        Returns:
+            A list of return values in the order of params. The exception
+            object if a call raised one, or CancelledError if it was not
+            made.
+        """
+        results = []
+        cancelled = False
+        for param in params:
+            if cancelled or (cancel is not None and cancel.is_set()):
+                cancelled = True
+                results.append(concurrent.futures.CancelledError())
+                continue
+            try:
+                results.append(func(*param))
+            except Exception as e:
+                logging.error("%s generated an exception: %s", param,
+                              traceback.format_exc())
+                results.append(e)
+                cancelled = stop_on_error
+        return results
+
+    def Map(self, func, param_list, ordered=True, timeout=None, cancel=None,
+            stop_on_error=False):
+        """Calls a function with each set of parameters concurrently.
+
+        At most max_workers calls are submitted at a time. The timeout of a
+        call is measured from when it starts running, as observed every
+        _START_POLL_INTERVAL_SECS, so the time in the queue of a shared pool
+        does not count. A call which times out is not interrupted.
+
+        If this is called by a function running on this thread pool, the
+        calls are made one by one in the current thread without timeout, as
+        waiting for the other workers of the pool may deadlock.
+
+        Args:
+            func: The function that performs a task.
+            param_list: A list of iterables, each being a set of params to be
+                        passed into the function.
+            ordered: bool, whether the results are in the order of
+                     param_list. If False, they are in the order of
+                     completion.
+            timeout: float, seconds to wait for each call after it starts.
+                     None to wait until it finishes.
+            cancel: threading.Event, set to stop submitting calls. The calls
+                    which are not submitted result in CancelledError.
+            stop_on_error: bool, whether to cancel the remaining calls after
+                           a call raises an exception or times out.
+
+        Returns:
+            A list of return values from each function execution. If an
+            execution raised an exception or timed out, the exception object
+            is the corresponding result.
+        """
+        params = [tuple(p) for p in param_list]
+        if self._IsWorkerThread():
+            return self._MapInline(func, params, cancel, stop_on_error)
+        results = [None] * len(params)
+        completion_order = []
+        running = {}
+        next_index = 0
+        cancelled = False
+        while next_index < len(params) or running:
+            if cancel is not None and cancel.is_set():
+                cancelled = True
+            while (not cancelled and next_index < len(params) and
+                   len(running) < self.max_workers):
+                future = self.Submit(func, *params[next_index])
+                running[future] = (next_index, None)
+                next_index += 1
+            if cancelled:
+                for index in range(next_index, len(params)):
+                    results[index] = concurrent.futures.CancelledError()
+                    completion_order.append(index)
+                next_index = len(params)
+                if not running:
+                    break
+
+            wait_secs = _POLL_INTERVAL_SECS if cancel is not None else None
+            if timeout is not None:
+                now = time.time()
+                for future, (index, start) in list(running.items()):
+                    if start is None and (future.running() or future.done()):
+                        running[future] = (index, now)
+                starts = [start for _, start in running.values()
+                          if start is not None]
+                if len(starts) < len(running):
+                    wait_secs = _START_POLL_INTERVAL_SECS
+                if starts:
+                    remaining = max(0, min(starts) + timeout - time.time())
+                    wait_secs = (remaining if wait_secs is None else
+                                 min(wait_secs, remaining))
+            done, _ = concurrent.futures.wait(
+                running, timeout=wait_secs,
+                return_when=concurrent.futures.FIRST_COMPLETED)
+
+            now = time.time()
+            for future in list(running):
+                index, start = running[future]
+                if future in done:
+                    try:
+                        results[index] = future.result()
+                    except Exception as e:
+                        logging.error("%s generated an exception: %s",
+                                      params[index], traceback.format_exc())
+                        results[index] = e
+                        cancelled = cancelled or stop_on_error
+                elif (timeout is not None and start is not None and
+                      now - start >= timeout):
+                    future.cancel()
+                    logging.error("%s timed out after %ss.", params[index],
+                                  timeout)
+                    results[index] = concurrent.futures.TimeoutError(
+                        "Timed out after %ss." % timeout)
+                    cancelled = cancelled or stop_on_error
+                else:
+                    continue
+                del running[future]
+                completion_order.append(index)
+        if ordered:
+            return results
+        return [results[index] for index in completion_order]
+
+    def Shutdown(self, wait=True):
+        """Shuts down the executor. It is created again on next use.
+
+        Args:
+            wait: bool, whether to wait for the submitted calls.
+        """
+        with self._lock:
+            executor = self._executor
+            self._executor = None
+        if executor:
+            executor.shutdown(wait=wait)
+
+
+def GetSharedService(use_processes=False):
+    """Returns the ExecutorService shared in this process.
+
+    Args:
+        use_processes: bool, whether to return the process pool for
+                       CPU-bound tasks or the thread pool for IO-bound tasks.
+    """
+    with _shared_services_lock:
+        service = _shared_services.get(use_processes)
+        if service is None:
+            service = ExecutorService(use_processes=use_processes)
+            _shared_services[use_processes] = service
+        return service
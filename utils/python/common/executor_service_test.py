@@ -0,0 +1,123 @@
+#!/usr/bin/env python
+#
+# Copyright (C) 2019 The Android Open Source Project
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+import threading
+import time
+import unittest
+
+import concurrent.futures
+
+from vts.utils.python.common import executor_service
+
+
+def _Sleep(value, secs):
+    """Returns a value after sleeping."""
+    time.sleep(secs)
+    return value
+
+
+def _Square(value):
+    """Returns the square of a value. Raises ValueError if negative."""
+    if value < 0:
+        raise ValueError("negative")
+    return value * value
+
+
+class ExecutorServiceTest(unittest.TestCase):
+    """Unit tests for executor_service module."""
+
+    def setUp(self):
+        """Creates a thread pool."""
+        self._service = executor_service.ExecutorService(max_workers=4)
+
+    def tearDown(self):
+        """Shuts down the thread pool."""
+        self._service.Shutdown()
+
+    def testOrdered(self):
+        """Tests that results are in the order of the params by default."""
+        params = [("a", 0.2), ("b", 0), ("c", 0.1)]
+        self.assertEqual(self._service.Map(_Sleep, params), ["a", "b", "c"])
+        self.assertEqual(self._service.Map(_Sleep, params, ordered=False),
+                         ["b", "c", "a"])
+
+    def testException(self):
+        """Tests that exceptions are returned as results."""
+        results = self._service.Map(_Square, [(2, ), (-1, ), (3, )])
+        self.assertEqual(results[0], 4)
+        self.assertIsInstance(results[1], ValueError)
+        self.assertEqual(results[2], 9)
+
+    def testTimeout(self):
+        """Tests that a call which takes too long times out."""
+        start = time.time()
+        results = self._service.Map(_Sleep, [("a", 1), ("b", 0)], timeout=0.2)
+        self.assertLess(time.time() - start, 0.8)
+        self.assertIsInstance(results[0], concurrent.futures.TimeoutError)
+        self.assertEqual(results[1], "b")
+
+    def testCancel(self):
+        """Tests that calls are not submitted after cancellation."""
+        service = executor_service.ExecutorService(max_workers=1)
+        cancel = threading.Event()
+        timer = threading.Timer(0.1, cancel.set)
+        timer.start()
+        results = service.Map(_Sleep, [("a", 0.3), ("b", 0), ("c", 0)],
+                              cancel=cancel)
+        timer.join()
+        service.Shutdown()
+        self.assertEqual(results[0], "a")
+        self.assertIsInstance(results[1], concurrent.futures.CancelledError)
+        self.assertIsInstance(results[2], concurrent.futures.CancelledError)
+
+    def testStopOnError(self):
+        """Tests that remaining calls are cancelled after an exception."""
+        service = executor_service.ExecutorService(max_workers=1)
+        results = service.Map(_Square, [(-1, ), (2, )], stop_on_error=True)
+        service.Shutdown()
+        self.assertIsInstance(results[0], ValueError)
+        self.assertIsInstance(results[1], concurrent.futures.CancelledError)
+
+    def testNested(self):
+        """Tests that nested calls on a full pool run inline."""
+        service = executor_service.ExecutorService(max_workers=1)
+        results = service.Map(
+            lambda value: service.Map(_Square, [(value, ), (-1, )]),
+            [(2, ), (3, )], timeout=5)
+        service.Shutdown()
+        self.assertEqual([4, 9], [result[0] for result in results])
+        self.assertIsInstance(results[0][1], ValueError)
+
+    def testTimeoutAfterStart(self):
+        """Tests that the time in the queue does not count as timeout."""
+        service = executor_service.ExecutorService(max_workers=1)
+        service.Submit(_Sleep, "a", 0.5)
+        results = service.Map(_Sleep, [("b", 0.1)], timeout=0.3)
+        service.Shutdown()
+        self.assertEqual(["b"], results)
+
+    def testProcesses(self):
+        """Tests running in a process pool."""
+        service = executor_service.ExecutorService(max_workers=2,
+                                                   use_processes=True)
+        self.assertEqual(service.Map(_Square, [(i, ) for i in range(5)]),
+                         [0, 1, 4, 9, 16])
+        service.Shutdown()
+
+
+if __name__ == "__main__":
+    unittest.main()
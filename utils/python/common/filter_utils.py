@@ -14,6 +14,7 @@
 # limitations under the License.
 #
 
+import collections
 import copy
 import logging
 import re
@@ -31,6 +32,12 @@ _INCLUDE_FILTER = '_include_filter'
 _EXCLUDE_FILTER = '_exclude_filter'
 DEFAULT_EXCLUDE_OVER_INCLUDE = False
 _MODULE_NAME_PATTERN = '{module}.{test}'
+# Regexes that cannot be merged with others into one pattern: numbered or
+# named back references, whose groups move when merged, and inline flags,
+# which apply to the whole pattern.
+_UNCOMBINABLE_REGEX = re.compile(r'\\[1-9]|\(\?P=|\(\?[aiLmsux]+\)')
+# The maximum number of regex match results cached by each filter list.
+_MAX_CACHED_VERDICTS = 1024
 
 
 def ExpandBitness(input_list):
@@ -186,6 +193,122 @@ def InRegexList(item, regex_list):
     return False
 
 
+def CompileRegexList(regex_list):
+    '''Compiles a regex list into few patterns which match whole strings.
+
+    The regexes are merged into one alternation so that a string is matched
+    in one pass instead of once per regex. If the merged pattern cannot be
+    compiled, e.g., it has too many groups, the list is split in halves.
+    Regexes that change meaning when merged are compiled separately.
+
+    As in InRegexList, a regex matches a string if its first match from the
+    beginning of the string ends at the end. For example, "a|ab" does not
+    match "ab", because its first match is "a".
+
+    Args:
+        regex_list: list of string, the regexes.
+
+    Returns:
+        list of compiled patterns, or objects with the same match method. A
+        string matches an item in regex_list if and only if one of the
+        patterns matches it.
+    '''
+    combinable = []
+    patterns = []
+    for regex in regex_list:
+        if _UNCOMBINABLE_REGEX.search(regex):
+            patterns.append(_WholeMatchPattern(regex))
+        else:
+            combinable.append(regex)
+    if combinable:
+        patterns.extend(_CompileCombinedRegex(combinable))
+    return patterns
+
+
+def _CompileCombinedRegex(regex_list):
+    '''Compiles regexes into one pattern, splitting the list on failure.
+
+    Args:
+        regex_list: non-empty list of string, the regexes.
+
+    Returns:
+        list of compiled patterns.
+    '''
+    # The lookahead does not backtrack once it matches, so each alternative
+    # accepts only the first match of its regex, which the back reference
+    # then consumes.
+    try:
+        return [
+            re.compile('|'.join(
+                '(?=(?P<_r%d>%s))(?P=_r%d)\\Z' % (index, regex, index)
+                for index, regex in enumerate(regex_list)))
+        ]
+    except (regex_error, AssertionError, OverflowError, RuntimeError):
+        if len(regex_list) == 1:
+            raise
+    half = len(regex_list) // 2
+    return (_CompileCombinedRegex(regex_list[:half]) +
+            _CompileCombinedRegex(regex_list[half:]))
+
+
+class _WholeMatchPattern(object):
+    '''A regex which matches a string if its first match spans the string.
+
+    Attributes:
+        _pattern: the compiled regex.
+    '''
+
+    def __init__(self, regex):
+        self._pattern = re.compile(regex)
+
+    def match(self, item):
+        '''Returns the match object if the first match spans the item.
+
+        Args:
+            item: string, given string
+        '''
+        m = self._pattern.match(item)
+        return m if m and m.end() == len(item) else None
+
+
+class _CompiledFilterList(object):
+    '''Exact and regex items of a filter list prepared for matching.
+
+    Attributes:
+        _exact: frozenset of string, the exact items.
+        _patterns: list of compiled patterns from CompileRegexList.
+        _verdicts: OrderedDict, string to the cached result of the regex
+                   match, from the least to the most recently used. The size
+                   is limited to _MAX_CACHED_VERDICTS.
+    '''
+
+    def __init__(self, exact_list, regex_list):
+        self._exact = frozenset(exact_list)
+        self._patterns = CompileRegexList(regex_list)
+        self._verdicts = collections.OrderedDict()
+
+    def Match(self, item):
+        '''Checks whether a string is an exact item or matches a regex.
+
+        Args:
+            item: string, given string
+
+        Returns:
+            bool, True if there is a match; False otherwise.
+        '''
+        if item in self._exact:
+            return True
+        if not self._patterns:
+            return False
+        verdict = self._verdicts.pop(item, None)
+        if verdict is None:
+            verdict = any(pattern.match(item) for pattern in self._patterns)
+            if len(self._verdicts) >= _MAX_CACHED_VERDICTS:
+                self._verdicts.popitem(last=False)
+        self._verdicts[item] = verdict
+        return verdict
+
+
 def IsRegexFilter(item):
     '''Checks whether the given item is a regex filter.
 
@@ -275,6 +398,7 @@ class Filter(object):
         self.include_filter_exact = ExpandBitness(self.include_filter_exact)
         self.exclude_filter_exact = ExpandBitness(self.exclude_filter_exact)
         self.expand_bitness = True
+        self._CompileFilters()
 
     def IsIncludeFilterEmpty(self):
         '''Check whether actual include filter is specified.
@@ -401,8 +525,7 @@ class Filter(object):
         Returns:
             bool, True if in include filter.
         '''
-        return item in self.include_filter_exact or InRegexList(
-            item, self.include_filter_regex)
+        return self._include_matcher.Match(item)
 
     def _IsInExcludeFilter(self, item):
         '''Internal function to check if item is in exclude filter.
@@ -413,8 +536,7 @@ class Filter(object):
         Returns:
             bool, True if in exclude filter.
         '''
-        return item in self.exclude_filter_exact or InRegexList(
-            item, self.exclude_filter_regex)
+        return self._exclude_matcher.Match(item)
 
     @property
     def include_filter(self):
@@ -543,6 +665,19 @@ class Filter(object):
             self.exclude_filter_exact = ExpandBitness(
                 self.exclude_filter_exact)
 
+        self._CompileFilters()
+
+    def _CompileFilters(self):
+        '''Compiles the exact and regex filters for matching.
+
+        Must be called whenever the exact or regex lists change. This also
+        clears the results cached for the previous filters.
+        '''
+        self._include_matcher = _CompiledFilterList(
+            self.include_filter_exact, self.include_filter_regex)
+        self._exclude_matcher = _CompiledFilterList(
+            self.exclude_filter_exact, self.exclude_filter_regex)
+
     def __str__(self):
         return ('Filter:\nenable_regex: {enable_regex}\n'
                 'enable_negative_pattern: {enable_negative_pattern}\n'
@@ -0,0 +1,98 @@
+#!/usr/bin/env python
+#
+# Copyright (C) 2019 The Android Open Source Project
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+import mock
+import unittest
+
+from vts.utils.python.common import filter_utils
+
+
+class FilterUtilsTest(unittest.TestCase):
+    """Unit tests for filter_utils module."""
+
+    def testCompileRegexList(self):
+        """Tests that merged regexes match whole strings."""
+        regex_list = ["a", "ab", "(x)\\1", "(?i)c", "d(e|f)"]
+        patterns = filter_utils.CompileRegexList(regex_list)
+        self.assertEqual(len(patterns), 3)
+
+        def _Match(item):
+            return any(pattern.match(item) for pattern in patterns)
+
+        for item in ["a", "ab", "xx", "C", "de", "df"]:
+            self.assertTrue(_Match(item), item)
+        for item in ["abc", "xy", "D", "d", ""]:
+            self.assertFalse(_Match(item), item)
+
+    def testCompileRegexListFirstMatch(self):
+        """Tests that only the first match of a regex is checked."""
+        for regex_list in (["a|ab"], ["a|ab", "x"], ["(?i)a|ab"]):
+            patterns = filter_utils.CompileRegexList(regex_list)
+
+            def _Match(item):
+                return any(pattern.match(item) for pattern in patterns)
+
+            self.assertTrue(_Match("a"), regex_list)
+            self.assertFalse(_Match("ab"), regex_list)
+            self.assertEqual(
+                filter_utils.InRegexList("ab", regex_list), _Match("ab"))
+
+    def testCompileRegexListManyGroups(self):
+        """Tests that a list with many groups is compiled in parts."""
+        regex_list = ["(t%d)" % i for i in range(300)]
+        patterns = filter_utils.CompileRegexList(regex_list)
+        self.assertTrue(any(pattern.match("t299") for pattern in patterns))
+        self.assertFalse(any(pattern.match("t300") for pattern in patterns))
+
+    @mock.patch.object(filter_utils, "_MAX_CACHED_VERDICTS", 2)
+    def testCompiledFilterListCache(self):
+        """Tests that only a few regex match results are cached."""
+        filter_list = filter_utils._CompiledFilterList(["a"], ["b.*"])
+        for item in ["a", "b1", "c", "b1", "b2"]:
+            filter_list.Match(item)
+        self.assertEqual(["b1", "b2"], list(filter_list._verdicts))
+        self.assertTrue(filter_list.Match("b1"))
+        self.assertFalse(filter_list.Match("d"))
+        self.assertEqual(["b1", "d"], list(filter_list._verdicts))
+
+        filter_list = filter_utils._CompiledFilterList(["a"], [])
+        self.assertTrue(filter_list.Match("a"))
+        self.assertFalse(filter_list.Match("b"))
+        self.assertEqual({}, filter_list._verdicts)
+
+    def testFilter(self):
+        """Tests include, exclude and module name prefix matching."""
+        test_filter = filter_utils.Filter(
+            include_filter=["testA", "r(testB.*)", "-testB2"],
+            exclude_filter=[],
+            exclude_over_include=True,
+            enable_module_name_prefix_matching=True,
+            module_name="Module",
+            expand_bitness=True)
+        self.assertTrue(test_filter.Filter("testA_32bit"))
+        self.assertTrue(test_filter.Filter("testB1"))
+        self.assertFalse(test_filter.Filter("testB2"))
+        self.assertFalse(test_filter.Filter("testC"))
+
+        test_filter.add_to_include_filter("r(Module\\.testC)")
+        self.assertTrue(test_filter.Filter("testC"))
+        test_filter.add_to_exclude_filter("Module.testA_32bit")
+        self.assertFalse(test_filter.Filter("testA_32bit"))
+
+
+if __name__ == "__main__":
+    unittest.main()
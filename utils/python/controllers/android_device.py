@@ -16,6 +16,7 @@
 from builtins import str
 from builtins import open
 
+import collections
 import gzip
 import logging
 import os
@@ -27,6 +28,8 @@ import threading
 import time
 import traceback
 
+import concurrent.futures
+
 from vts.runners.host import asserts
 from vts.runners.host import const
 from vts.runners.host import errors
@@ -36,7 +39,10 @@ from vts.runners.host import signals
 from vts.runners.host import utils
 from vts.runners.host.tcp_client import vts_tcp_client
 from vts.utils.python.controllers import adb
+from vts.utils.python.controllers import bug_report_service
+from vts.utils.python.controllers import device_waiter
 from vts.utils.python.controllers import fastboot
+from vts.utils.python.controllers import logcat_collector
 from vts.utils.python.instrumentation import test_framework_instrumentation as tfi
 from vts.utils.python.mirror import mirror_tracker
 
@@ -46,6 +52,10 @@ VTS_CONTROLLER_REFERENCE_NAME = "android_devices"
 ANDROID_DEVICE_PICK_ALL_TOKEN = "*"
 # Key name for adb logcat extra params in config file.
 ANDROID_DEVICE_ADB_LOGCAT_PARAM_KEY = "adb_logcat_param"
+# Key name for the uncompressed bytes in one adb logcat segment in config file.
+ANDROID_DEVICE_ADB_LOGCAT_SEGMENT_SIZE_KEY = "adb_logcat_segment_size"
+# Key name for the number of adb logcat segments to keep in config file.
+ANDROID_DEVICE_ADB_LOGCAT_MAX_SEGMENTS_KEY = "adb_logcat_max_segments"
 ANDROID_DEVICE_EMPTY_CONFIG_MSG = "Configuration is empty, abort!"
 ANDROID_DEVICE_NOT_LIST_CONFIG_MSG = "Configuration should be a list, abort!"
 PORT_RETRY_COUNT = 3
@@ -62,6 +72,16 @@ LLKD = 'llkd-1'
 THREAD_SLEEP_TIME = 1
 # Max number of attempts that the client can make to connect to the agent
 MAX_AGENT_CONNECT_RETRIES = 10
+# The file which the agent writes its TCP server port to when it is ready.
+VTS_AGENT_PORT_FILE = "/data/local/tmp/vts_tcp_server_port"
+# Max seconds to wait for the agent to be ready.
+VTS_AGENT_START_TIMEOUT_SECS = 10
+# The binaries started by the agent, without bitness suffix.
+_VTS_AGENT_FILE_NAMES = ['vts_hal_agent', 'vts_hal_driver', 'vts_shell_driver']
+# The log of the agent which is kept running, with bitness.
+_VTS_AGENT_DEVICE_LOG_PATH = DEFAULT_AGENT_BASE_DIR + '/vts_agent_%s.log'
+# The output of the cleanup command if chmod succeeds.
+_VTS_AGENT_CHMOD_DONE = 'vts_agent_chmod_done'
 # System property for product sku.
 PROPERTY_PRODUCT_SKU = "ro.boot.product.hardware.sku"
 
@@ -77,6 +97,11 @@ SYSPROP_SYS_BOOT_COMPLETED = "sys.boot_completed"
 SYSPROP_VTS_NATIVE_SERVER = "vts.native_server.on"
 # Maximum time in seconds to wait for process/system status change.
 WAIT_TIMEOUT_SEC = 120
+# Maximum time in seconds to start the services of one device.
+SERVICE_START_TIMEOUT_SEC = 600
+
+# Serializes picking and forwarding available host ports.
+_host_port_lock = threading.Lock()
 
 class AndroidDeviceError(signals.ControllerError):
     pass
@@ -129,24 +154,81 @@ def destroy(ads):
             ad.log.exception("Failed to clean up properly.")
 
 
-def _startServicesOnAds(ads):
+def _startServicesOnAds(ads, timeout=SERVICE_START_TIMEOUT_SEC):
     """Starts long running services on multiple AndroidDevice objects.
 
-    If any one AndroidDevice object fails to start services, cleans up all
-    existing AndroidDevice objects and their services.
+    The services of all devices are started concurrently. A failure on one
+    device does not interrupt the others. If any one AndroidDevice object
+    fails to start services or times out, cleans up all AndroidDevice
+    objects and their services. The thread of a device which times out is
+    not interrupted. It is cancelled before the next phase, and the device
+    is cleaned up when the thread finishes.
 
     Args:
         ads: A list of AndroidDevice objects whose services to start.
+        timeout: int, seconds to wait for the services of the devices.
+
+    Raises:
+        AndroidDeviceError if any device fails to start services.
+    """
+    if not ads:
+        return
+    cancel = threading.Event()
+    executor = concurrent.futures.ThreadPoolExecutor(max_workers=len(ads))
+    future_to_ad = collections.OrderedDict(
+        (executor.submit(ad.startServices, cancel), ad) for ad in ads)
+    _, not_done = concurrent.futures.wait(future_to_ad, timeout=timeout)
+    executor.shutdown(wait=False)
+
+    failures = []
+    for future, ad in future_to_ad.items():
+        if future in not_done:
+            ad.log.error("Timed out starting services after %ss.", timeout)
+            failures.append("%s (timed out)" % ad.serial)
+            continue
+        if future.exception():
+            ad.log.error("Failed to start some services: %s",
+                         future.exception())
+            failures.append("%s (%s)" % (ad.serial, future.exception()))
+        ad.log.info("Service start timings: %s", ", ".join(
+            "%s %.2fs" % (phase, secs)
+            for phase, secs in ad.service_start_timings.items()))
+    if failures:
+        logging.error("Failed to start services on %s, abort!",
+                      ", ".join(failures))
+        cancel.set()
+        destroy([ad for future, ad in future_to_ad.items()
+                 if future not in not_done])
+        for future in not_done:
+            ad = future_to_ad[future]
+            future.add_done_callback(lambda _, ad=ad: destroy([ad]))
+        raise AndroidDeviceError(
+            "Failed to start services on %s." % ", ".join(failures))
+
+
+def _constructInstances(args_list):
+    """Constructs AndroidDevice objects concurrently.
+
+    The constructor roots adb and sets up port forwarding, which wait for
+    adb most of the time, so the objects are constructed on the shared
+    thread pool.
+
+    Args:
+        args_list: A list of tuples, the arguments of each constructor.
+
+    Returns:
+        A list of AndroidDevice objects in the order of args_list.
+
+    Raises:
+        The first exception raised by the constructors.
     """
-    running_ads = []
+    if len(args_list) <= 1:
+        return [AndroidDevice(*args) for args in args_list]
+    ads = utils.concurrent_exec(AndroidDevice, args_list)
     for ad in ads:
-        running_ads.append(ad)
-        try:
-            ad.startServices()
-        except:
-            ad.log.exception("Failed to start some services, abort!")
-            destroy(running_ads)
-            raise
+        if isinstance(ad, Exception):
+            raise ad
+    return ads
 
 
 def _parse_device_list(device_list_str, key):
@@ -199,10 +281,7 @@ def get_instances(serials):
     Returns:
         A list of AndroidDevice objects.
     """
-    results = []
-    for s in serials:
-        results.append(AndroidDevice(s))
-    return results
+    return _constructInstances([(s,) for s in serials])
 
 
 def get_instances_with_configs(configs):
@@ -217,7 +296,7 @@ def get_instances_with_configs(configs):
     Returns:
         A list of AndroidDevice objects.
     """
-    results = []
+    args_list = []
     for c in configs:
         try:
             serial = c.pop(keys.ConfigKeys.IKEY_SERIAL)
@@ -232,10 +311,11 @@ def get_instances_with_configs(configs):
                           'AndroidDevice config %s.',
                           keys.ConfigKeys.IKEY_PRODUCT_TYPE, c)
             product_type = ANDROID_PRODUCT_TYPE_UNKNOWN
+        args_list.append((serial, product_type))
 
-        ad = AndroidDevice(serial, product_type)
+    results = _constructInstances(args_list)
+    for ad, c in zip(results, configs):
         ad.loadConfig(c)
-        results.append(ad)
     return results
 
 
@@ -317,22 +397,47 @@ def takeBugReports(ads, test_name, begin_time):
     """Takes bug reports on a list of android devices.
 
     If you want to take a bug report, call this function with a list of
-    android_device objects in on_fail. But reports will be taken on all the
-    devices in the list concurrently. Bug report takes a relative long
-    time to take, so use this cautiously.
+    android_device objects in on_fail. The reports are taken on all the
+    devices in the list concurrently in the background, so this function
+    returns immediately. The requests for a device which come close together
+    are merged into one report.
 
     Args:
         ads: A list of AndroidDevice instances.
         test_name: Name of the test case that triggered this bug report.
         begin_time: Logline format timestamp taken when the test started.
+
+    Returns:
+        A list of Future objects whose results are the paths to the reports,
+        or None if the reports failed.
     """
     begin_time = vts_logger.normalizeLogLineTimestamp(begin_time)
+    service = bug_report_service.GetDefaultService()
+    return [service.Request(ad, ad.getBugReportPath(test_name, begin_time))
+            for ad in ads]
+
 
-    def take_br(test_name, begin_time, ad):
-        ad.takeBugReport(test_name, begin_time)
+def waitForBootCompletion(ads, timeout=900):
+    """Waits for a list of android devices to complete booting.
 
-    args = [(test_name, begin_time, ad) for ad in ads]
-    utils.concurrent_exec(take_br, args)
+    The devices are watched concurrently in one select loop, e.g., after
+    rebooting all of them.
+
+    Args:
+        ads: A list of AndroidDevice instances.
+        timeout: int, seconds to wait for boot completion. Default is
+                 15 minutes.
+
+    Returns:
+        list of AndroidDevice instances which did not complete booting in
+        time.
+    """
+    event = tfi.Begin("wait for boot completion of devices",
+                      tfi.categories.DEVICE_SETUP)
+    results = device_waiter.WaitForBootCompletion(
+        [ad.serial for ad in ads], timeout)
+    event.End()
+    return [ad for ad in ads if not results[ad.serial]]
 
 
 class AndroidDevice(object):
@@ -353,10 +458,19 @@ class AndroidDevice(object):
              [AndroidDevice|<serial>]
         log_path: A string that is the path where all logs collected on this
                   android device should be stored.
-        adb_logcat_process: A process that collects the adb logcat.
-        adb_logcat_file_path: A string that's the full path to the adb logcat
-                              file collected, if any.
+        adb_logcat_collector: A LogcatCollector that collects the adb logcat.
+        adb_logcat_file_path: A string that's the full path to the adb
+                              logcat segment being written, if any.
+        adb_logcat_index_path: A string that's the full path to the index of
+                               the adb logcat segments collected, if any.
         vts_agent_process: A process that runs the HAL agent.
+        _warm_vts_agent: string, the bitness of the HAL agent which runs in
+                         the background on the device and is kept running
+                         across modules. None if there is no such agent.
+        _agent_bitness_list: list of strings, the bitnesses of the HAL agent
+                             to try. None if not yet read from the device.
+        _agent_chmod_bits: set of strings, the bitnesses of the HAL agent
+                           binaries which have been made executable.
         adb: An AdbProxy object used for interacting with the device via adb.
         fastboot: A FastbootProxy object used for interacting with the device
                   via fastboot.
@@ -372,6 +486,8 @@ class AndroidDevice(object):
              native libs.
         shell: ShellMirror, in charge of all communications with shell.
         shell_default_nohup: bool, whether to use nohup by default in shell commands.
+        service_start_timings: OrderedDict, name of each step of
+                               startServices to its duration in seconds.
         _product_type: A string, the device product type (e.g., bullhead) if
                        known, ANDROID_PRODUCT_TYPE_UNKNOWN otherwise.
     """
@@ -389,23 +505,28 @@ class AndroidDevice(object):
                                               {"serial": self.serial})
         base_log_path = getattr(logging, "log_path", "/tmp/logs/")
         self.log_path = os.path.join(base_log_path, "AndroidDevice%s" % serial)
-        self.adb_logcat_process = None
-        self.adb_logcat_file_path = None
+        self.adb_logcat_collector = None
+        self.adb_logcat_index_path = None
         self.vts_agent_process = None
+        self._warm_vts_agent = None
+        self._agent_bitness_list = None
+        self._agent_chmod_bits = set()
         self.adb = adb.AdbProxy(serial)
         self.fastboot = fastboot.FastbootProxy(serial)
         if not self.isBootloaderMode:
             self.rootAdb()
         self.host_command_port = None
-        self.host_callback_port = adb.get_available_host_port()
-        if self.device_callback_port >= 0:
-            self.adb.reverse_tcp_forward(self.device_callback_port,
-                                         self.host_callback_port)
+        with _host_port_lock:
+            self.host_callback_port = adb.get_available_host_port()
+            if self.device_callback_port >= 0:
+                self.adb.reverse_tcp_forward(self.device_callback_port,
+                                             self.host_callback_port)
         self.hal = None
         self.lib = None
         self.shell = None
         self.shell_default_nohup = shell_default_nohup
         self.fatal_error = False
+        self.service_start_timings = collections.OrderedDict()
 
     def __del__(self):
         self.cleanUp()
@@ -658,11 +779,20 @@ class AndroidDevice(object):
             return paths_64
         return paths_32
 
+    @property
+    def adb_logcat_file_path(self):
+        """The path to the adb logcat segment being written. None if adb
+        logcat is not being collected.
+        """
+        if not self.adb_logcat_collector:
+            return None
+        return self.adb_logcat_collector.segment_paths[-1]
+
     @property
     def isAdbLogcatOn(self):
         """Whether there is an ongoing adb logcat collection.
         """
-        if self.adb_logcat_process:
+        if self.adb_logcat_collector:
             return True
         return False
 
@@ -764,28 +894,34 @@ class AndroidDevice(object):
                 logging.exception(e)
 
     def startAdbLogcat(self):
-        """Starts a standing adb logcat collection in separate subprocesses and
-        save the logcat in a file.
+        """Starts a standing adb logcat collection which saves the logcat in
+        rotated gzip segments with a timestamp index.
         """
         if self.isAdbLogcatOn:
             raise AndroidDeviceError(("Android device %s already has an adb "
                                       "logcat thread going on. Cannot start "
                                       "another one.") % self.serial)
         event = tfi.Begin("start adb logcat from android_device",
-                          tfi.categories.FRAMEWORK_SETUP)
+                          tfi.categories.FRAMEWORK_SETUP,
+                          track=self.serial)
 
-        f_name = "adblog_%s_%s.txt" % (self.model, self.serial)
+        prefix = "adblog_%s_%s" % (self.model, self.serial)
         utils.create_dir(self.log_path)
-        logcat_file_path = os.path.join(self.log_path, f_name)
         try:
             extra_params = self.adb_logcat_param
         except AttributeError:
             extra_params = "-b all"
-        cmd = "adb -s %s logcat -v threadtime %s >> %s" % (self.serial,
-                                                           extra_params,
-                                                           logcat_file_path)
-        self.adb_logcat_process = utils.start_standing_subprocess(cmd)
-        self.adb_logcat_file_path = logcat_file_path
+        collector = logcat_collector.LogcatCollector(
+            self.serial, self.log_path, prefix, extra_params,
+            segment_size=getattr(self,
+                                 ANDROID_DEVICE_ADB_LOGCAT_SEGMENT_SIZE_KEY,
+                                 logcat_collector.DEFAULT_SEGMENT_SIZE),
+            max_segments=getattr(self,
+                                 ANDROID_DEVICE_ADB_LOGCAT_MAX_SEGMENTS_KEY,
+                                 None))
+        collector.Start()
+        self.adb_logcat_collector = collector
+        self.adb_logcat_index_path = collector.index_path
         event.End()
 
     def stopAdbLogcat(self):
@@ -797,17 +933,18 @@ class AndroidDevice(object):
                 % self.serial)
 
         event = tfi.Begin("stop adb logcat from android_device",
-                          tfi.categories.FRAMEWORK_TEARDOWN)
+                          tfi.categories.FRAMEWORK_TEARDOWN,
+                          track=self.serial)
         try:
-            utils.stop_standing_subprocess(self.adb_logcat_process)
-        except utils.VTSUtilsError as e:
+            self.adb_logcat_collector.Stop()
+        except (IOError, OSError) as e:
             event.Remove("Cannot stop adb logcat. %s" % e)
             logging.error("Cannot stop adb logcat. %s", e)
-        self.adb_logcat_process = None
+        self.adb_logcat_collector = None
         event.End()
 
-    def takeBugReport(self, test_name, begin_time):
-        """Takes a bug report on the device and stores it in a file.
+    def getBugReportPath(self, test_name, begin_time):
+        """Returns the path to the bug report of a test case.
 
         Args:
             test_name: Name of the test case that triggered this bug report.
@@ -815,17 +952,30 @@ class AndroidDevice(object):
         """
         br_path = os.path.join(self.log_path, "BugReports")
         utils.create_dir(br_path)
-        base_name = ",%s,%s.txt" % (begin_time, self.serial)
+        base_name = ",%s,%s.zip" % (begin_time, self.serial)
         test_name_len = utils.MAX_FILENAME_LEN - len(base_name)
         out_name = test_name[:test_name_len] + base_name
-        full_out_path = os.path.join(br_path, out_name.replace(' ', '\ '))
+        return os.path.join(br_path, out_name.replace(' ', '_'))
+
+    def takeBugReport(self, test_name, begin_time):
+        """Takes a zipped bug report on the device and stores it in a file.
+
+        Args:
+            test_name: Name of the test case that triggered this bug report.
+            begin_time: Logline format timestamp taken when the test started.
+        """
+        full_out_path = self.getBugReportPath(test_name, begin_time)
         self.log.info("Taking bugreport for %s on %s", test_name, self.serial)
-        self.adb.bugreport(" > %s" % full_out_path)
+        self.adb.bugreport(full_out_path)
         self.log.info("Bugreport for %s taken at %s", test_name, full_out_path)
 
     def waitForBootCompletion(self, timeout=900):
         """Waits for Android framework to broadcast ACTION_BOOT_COMPLETED.
 
+        The boot completion properties are watched by one device-side shell
+        loop instead of polling with adb. Use waitForBootCompletion of this
+        module to wait for many devices at once.
+
         Args:
             timeout: int, seconds to wait for boot completion. Default is
                      15 minutes.
@@ -833,20 +983,16 @@ class AndroidDevice(object):
         Returns:
             bool, True if boot completed. False if any error or timeout
         """
-        start = time.time()
-        try:
-            self.adb.wait_for_device(timeout=timeout)
-        except adb.AdbError as e:
-            # adb wait-for-device is not always possible in the lab
-            logging.exception(e)
+        event = tfi.Begin("wait for boot completion",
+                          tfi.categories.DEVICE_SETUP,
+                          track=self.serial)
+        if not device_waiter.WaitForBootCompletion([self.serial],
+                                                   timeout)[self.serial]:
+            logging.error("Timeout while waiting for boot completion.")
+            event.Remove("Timeout while waiting for boot completion.")
             return False
 
-        while not self.isBootCompleted():
-            if time.time() - start >= timeout:
-                logging.error("Timeout while waiting for boot completion.")
-                return False
-            time.sleep(1)
-
+        event.End()
         return True
 
     # Deprecated. Use isBootCompleted instead
@@ -982,17 +1128,10 @@ class AndroidDevice(object):
         Returns:
             bool, True if framework is started. False otherwise or timeout
         """
-        start = time.time()
-
-        # First, wait for boot completion and checks
-        if not self.waitForBootCompletion(timeout_secs):
+        if not device_waiter.WaitForFrameworkStart([self.serial],
+                                                   timeout_secs)[self.serial]:
+            logging.error("Timeout while waiting for framework to start.")
             return False
-
-        while not self.isFrameworkRunning(check_boot_completion=False):
-            if time.time() - start >= timeout_secs:
-                logging.error("Timeout while waiting for framework to start.")
-                return False
-            time.sleep(1)
         return True
 
     def startNativeServer(self):
@@ -1035,17 +1174,11 @@ class AndroidDevice(object):
         Returns:
             bool, True if the process stopped within timeout.
         """
-        if process_names:
-            for process_name in process_names:
-                start = time.time()
-                while self.isProcessRunning(process_name):
-                    if time.time() - start >= timeout_secs:
-                        logging.error(
-                            "Timeout while waiting for process %s stop.",
-                            process_name)
-                        return False
-                    time.sleep(1)
-
+        if not device_waiter.WaitForProcessStop(
+                [self.serial], process_names, timeout_secs)[self.serial]:
+            logging.error("Timeout while waiting for processes %s stop.",
+                          process_names)
+            return False
         return True
 
     def setProp(self, name, value):
@@ -1112,7 +1245,8 @@ class AndroidDevice(object):
 
         if restart_services:
             has_adb_log = self.isAdbLogcatOn
-            has_vts_agent = True if self.vts_agent_process else False
+            has_vts_agent = bool(self.vts_agent_process or
+                                 self._warm_vts_agent)
             if has_adb_log:
                 self.stopAdbLogcat()
             if has_vts_agent:
@@ -1128,18 +1262,70 @@ class AndroidDevice(object):
             if has_vts_agent:
                 self.startVtsAgent()
 
-    def startServices(self):
+    def _timeServicePhase(self, phase, func, cancel=None):
+        """Runs one phase of startServices and records its duration.
+
+        Args:
+            phase: string, name of the phase in service_start_timings.
+            func: function that takes no argument.
+            cancel: threading.Event, set to stop before the phase runs.
+
+        Raises:
+            AndroidDeviceError if cancel is set.
+        """
+        if cancel is not None and cancel.is_set():
+            raise AndroidDeviceError(
+                "Starting services on %s is cancelled before %s." %
+                (self.serial, phase))
+        start = time.time()
+        try:
+            func()
+        finally:
+            self.service_start_timings[phase] = time.time() - start
+
+    def _forwardCommandPort(self):
+        """Forwards a host port to the command port of the VTS agent."""
+        # Devices are started concurrently. Hold the lock so that they do not
+        # pick the same available host port.
+        with _host_port_lock:
+            if not self.host_command_port:
+                self.host_command_port = adb.get_available_host_port()
+            self.adb.tcp_forward(self.host_command_port,
+                                 self.device_command_port)
+
+    def _createMirrors(self):
+        """Creates the mirrors which communicate with the VTS agent."""
+        self.hal = mirror_tracker.MirrorTracker(
+            self.host_command_port, self.host_callback_port, True)
+        self.lib = mirror_tracker.MirrorTracker(self.host_command_port)
+        self.shell = mirror_tracker.MirrorTracker(
+            host_command_port=self.host_command_port, adb=self.adb)
+        self.shell.shell_default_nohup = self.shell_default_nohup
+        self.resource = mirror_tracker.MirrorTracker(self.host_command_port)
+
+    def startServices(self, cancel=None):
         """Starts long running services on the android device.
 
         1. Start adb logcat capture.
         2. Start VtsAgent and create HalMirror unless disabled in config.
+
+        The duration of each step is recorded in service_start_timings.
+
+        Args:
+            cancel: threading.Event, set by another thread to stop before
+                    the next step.
+
+        Raises:
+            AndroidDeviceError if cancel is set.
         """
         event = tfi.Begin("start vts services",
-                          tfi.categories.FRAMEWORK_SETUP)
+                          tfi.categories.FRAMEWORK_SETUP,
+                          track=self.serial)
+        self.service_start_timings = collections.OrderedDict()
 
         self.enable_vts_agent = getattr(self, "enable_vts_agent", True)
         try:
-            self.startAdbLogcat()
+            self._timeServicePhase("adb logcat", self.startAdbLogcat, cancel)
         except Exception as e:
             msg = "Failed to start adb logcat!"
             event.Remove(msg)
@@ -1147,21 +1333,11 @@ class AndroidDevice(object):
             self.log.exception(e)
             raise
         if self.enable_vts_agent:
-            self.startVtsAgent()
-            self.device_command_port = int(
-                self.adb.shell("cat /data/local/tmp/vts_tcp_server_port"))
+            self._timeServicePhase("vts agent", self.startVtsAgent, cancel)
             logging.debug("device_command_port: %s", self.device_command_port)
-            if not self.host_command_port:
-                self.host_command_port = adb.get_available_host_port()
-            self.adb.tcp_forward(self.host_command_port,
-                                 self.device_command_port)
-            self.hal = mirror_tracker.MirrorTracker(
-                self.host_command_port, self.host_callback_port, True)
-            self.lib = mirror_tracker.MirrorTracker(self.host_command_port)
-            self.shell = mirror_tracker.MirrorTracker(
-                host_command_port=self.host_command_port, adb=self.adb)
-            self.shell.shell_default_nohup = self.shell_default_nohup
-            self.resource = mirror_tracker.MirrorTracker(self.host_command_port)
+            self._timeServicePhase("port forwarding", self._forwardCommandPort,
+                                   cancel)
+            self._timeServicePhase("mirrors", self._createMirrors, cancel)
         event.End()
 
     def Heal(self):
@@ -1199,7 +1375,7 @@ class AndroidDevice(object):
 
     def stopServices(self):
         """Stops long running services on the android device."""
-        if self.adb_logcat_process:
+        if self.adb_logcat_collector:
             self.stopAdbLogcat()
         if getattr(self, "enable_vts_agent", True):
             self.stopVtsAgent()
@@ -1226,68 +1402,228 @@ class AndroidDevice(object):
         except adb.AdbError as e:
             logging.error('Failed to stop llkd')
 
-    def startVtsAgent(self):
-        """Start HAL agent on the AndroidDevice.
+    def _GetAgentBitnessList(self):
+        """Gets the bitnesses of the VTS agent to try in order.
 
-        This function starts the target side native agent and is persisted
-        throughout the test run.
+        The list is derived from the ABI list of the device once.
+
+        Returns:
+            list of strings, ['64', '32'] or ['32'].
         """
-        self.log.info("Starting VTS agent")
-        if self.vts_agent_process:
-            raise AndroidDeviceError(
-                "HAL agent is already running on %s." % self.serial)
+        if self._agent_bitness_list is None:
+            self._agent_bitness_list = (['64', '32'] if self.getCpuAbiList(64)
+                                        else ['32'])
+        return self._agent_bitness_list
 
-        event = tfi.Begin("start vts agent", tfi.categories.FRAMEWORK_SETUP)
+    def _GetAgentChmodCommand(self, bits):
+        """Gets the command to make the VTS agent binaries executable.
 
-        self._StopLLKD()
+        The binaries of each bitness are changed once per AndroidDevice.
+
+        Args:
+            bits: list of strings, the bitnesses of the binaries.
+
+        Returns:
+            string, the chmod command. None if all binaries are executable.
+        """
+        file_paths = [
+            '{path}/{bit}/{file_name}{bit}'.format(
+                path=DEFAULT_AGENT_BASE_DIR, bit=bitness, file_name=file_name)
+            for bitness in bits if bitness not in self._agent_chmod_bits
+            for file_name in _VTS_AGENT_FILE_NAMES
+        ]
+        if not file_paths:
+            return None
+        return 'chmod 755 %s' % ' '.join(file_paths)
+
+    def _CleanUpVtsAgent(self, bits):
+        """Kills the VTS processes and makes the agent binaries executable.
 
-        event_cleanup = tfi.Begin("start vts agent -- cleanup", tfi.categories.FRAMEWORK_SETUP)
+        The bitnesses are recorded in _agent_chmod_bits only if chmod
+        succeeds.
+
+        Args:
+            bits: list of strings, the bitnesses of the binaries.
+        """
         cleanup_commands = [
             "rm -f /data/local/tmp/vts_driver_*",
-            "rm -f /data/local/tmp/vts_agent_callback*"
+            "rm -f /data/local/tmp/vts_agent_callback*",
+            "rm -f %s" % VTS_AGENT_PORT_FILE
         ]
 
         kill_command = "pgrep 'vts_*' | xargs kill"
         cleanup_commands.append(kill_command)
-        try:
-            self.adb.shell("\"" + " ; ".join(cleanup_commands) + "\"")
-        except adb.AdbError as e:
+        chmod_command = self._GetAgentChmodCommand(bits)
+        if chmod_command:
+            cleanup_commands.append("%s && echo %s" % (
+                chmod_command, _VTS_AGENT_CHMOD_DONE))
+        res = self.adb.shell("\"" + " ; ".join(cleanup_commands) + "\"",
+                             no_except=True)
+        if chmod_command:
+            if _VTS_AGENT_CHMOD_DONE in str(res[const.STDOUT]).split():
+                self._agent_chmod_bits.update(bits)
+            else:
+                self.log.warning("Failed to make VTS agent executable: %s",
+                                 res[const.STDERR])
+        elif res[const.EXIT_CODE] != 0:
             self.log.warning(
                 "A command to setup the env to start the VTS Agent failed %s",
-                e)
+                res[const.STDERR])
+
+    def _ReuseVtsAgent(self):
+        """Reuses a VTS agent left running by a previous test module.
+
+        The drivers started by the previous module are killed. The agent is
+        reused only if it responds to a ping.
+
+        Returns:
+            bool, whether a running agent is reused.
+        """
+        cmd = ('"cat {port} && '
+               '((pidof vts_hal_agent64 > /dev/null && echo 64) || '
+               '(pidof vts_hal_agent32 > /dev/null && echo 32)) && '
+               '(rm -f {path}/vts_driver_* {path}/vts_agent_callback* ; '
+               'pgrep \'vts_(hal|shell)_driver\' | xargs kill ; true)"').format(
+                   port=VTS_AGENT_PORT_FILE, path=DEFAULT_AGENT_BASE_DIR)
+        res = self.adb.shell(cmd, no_except=True)
+        lines = str(res[const.STDOUT]).split()
+        if (res[const.EXIT_CODE] != 0 or len(lines) < 2 or
+                not lines[0].isdigit()):
+            return False
+        self.device_command_port = int(lines[0])
+        if not self._PingVtsAgent():
+            self.log.warning("Running VTS agent does not respond.")
+            return False
+        self._warm_vts_agent = lines[1]
+        self.log.info("Reusing running VTS agent")
+        return True
+
+    def _PingVtsAgent(self):
+        """Checks whether the VTS agent at device_command_port responds.
+
+        Returns:
+            bool, whether the agent responds to a ping.
+        """
+        client = vts_tcp_client.VtsTcpClient(
+            timeout=VTS_AGENT_START_TIMEOUT_SECS)
+        try:
+            self._forwardCommandPort()
+            client.Connect(command_port=self.host_command_port, retry=1)
+            return client.Ping()
+        except (adb.AdbError, errors.VtsError, socket.error) as e:
+            self.log.warning("Cannot ping VTS agent: %s", e)
+            return False
+        finally:
+            client.Disconnect()
+
+    def _PullVtsAgentLog(self):
+        """Copies the log of the agent kept running to the host log path."""
+        host_path = os.path.join(
+            self.log_path,
+            'vts_agent_%s_%s.log' % (self._warm_vts_agent, self.serial))
+        res = self.adb.pull(
+            '%s %s' % (_VTS_AGENT_DEVICE_LOG_PATH % self._warm_vts_agent,
+                       host_path),
+            no_except=True)
+        if res[const.EXIT_CODE] != 0:
+            self.log.warning("Cannot pull VTS agent log: %s",
+                             res[const.STDERR])
+
+    def _WaitForVtsAgentReady(self, process=None):
+        """Waits for the VTS agent to write its port file.
+
+        Args:
+            process: the standing subprocess which runs the agent. Waiting
+                     stops if it exits.
+
+        Returns:
+            bool, True if the agent is ready. device_command_port is set to
+            the port of the agent.
+        """
+        watcher = device_waiter.DeviceWatcher(
+            self.serial, "cat %s 2>/dev/null" % VTS_AGENT_PORT_FILE,
+            lambda line: line.isdigit(), interval=0.05)
+        abort = None
+        if process:
+            abort = lambda: process.poll() is not None
+        if not device_waiter.WaitAll([watcher], VTS_AGENT_START_TIMEOUT_SECS,
+                                     abort)[self.serial]:
+            return False
+        self.device_command_port = int(watcher.output)
+        return True
+
+    def startVtsAgent(self):
+        """Start HAL agent on the AndroidDevice.
+
+        This function starts the target side native agent and is persisted
+        throughout the test run. Readiness is detected by the port file the
+        agent writes.
+
+        If keep_vts_agent_running is set in the device config, the agent is
+        started in the background on the device, left running by
+        stopVtsAgent, and reused by the next test module in the session.
+        """
+        self.log.info("Starting VTS agent")
+        if self.vts_agent_process or self._warm_vts_agent:
+            raise AndroidDeviceError(
+                "HAL agent is already running on %s." % self.serial)
+
+        event = tfi.Begin("start vts agent", tfi.categories.FRAMEWORK_SETUP,
+                          track=self.serial)
+
+        self._StopLLKD()
+
+        keep_running = getattr(self, "keep_vts_agent_running", False)
+        if keep_running and self._ReuseVtsAgent():
+            event.End()
+            return
+
+        event_cleanup = tfi.Begin("start vts agent -- cleanup", tfi.categories.FRAMEWORK_SETUP,
+                                  track=self.serial)
+        bits = self._GetAgentBitnessList()
+        self._CleanUpVtsAgent(bits)
         event_cleanup.End()
 
         log_severity = getattr(self, keys.ConfigKeys.KEY_LOG_SEVERITY, "INFO")
-        bits = ['64', '32'] if self.is64Bit else ['32']
-        file_names = ['vts_hal_agent', 'vts_hal_driver', 'vts_shell_driver']
         for bitness in bits:
             vts_agent_log_path = os.path.join(
                 self.log_path, 'vts_agent_%s_%s.log' % (bitness, self.serial))
 
-            chmod_cmd = ' '.join(
-                map(lambda file_name: 'chmod 755 {path}/{bit}/{file_name}{bit};'.format(
-                        path=DEFAULT_AGENT_BASE_DIR,
-                        bit=bitness,
-                        file_name=file_name),
-                    file_names))
-
-            cmd = ('adb -s {s} shell "{chmod} LD_LIBRARY_PATH={path}/{bitness} '
-                   '{path}/{bitness}/vts_hal_agent{bitness} '
-                   '--hal_driver_path_32={path}/32/vts_hal_driver32 '
-                   '--hal_driver_path_64={path}/64/vts_hal_driver64 '
-                   '--spec_dir={path}/spec '
-                   '--shell_driver_path_32={path}/32/vts_shell_driver32 '
-                   '--shell_driver_path_64={path}/64/vts_shell_driver64 '
-                   '-l {severity}" >> {log} 2>&1').format(
-                       s=self.serial,
-                       chmod=chmod_cmd,
-                       bitness=bitness,
-                       path=DEFAULT_AGENT_BASE_DIR,
-                       log=vts_agent_log_path,
-                       severity=log_severity)
+            agent_cmd = ('LD_LIBRARY_PATH={path}/{bitness} '
+                         '{path}/{bitness}/vts_hal_agent{bitness} '
+                         '--hal_driver_path_32={path}/32/vts_hal_driver32 '
+                         '--hal_driver_path_64={path}/64/vts_hal_driver64 '
+                         '--spec_dir={path}/spec '
+                         '--shell_driver_path_32={path}/32/vts_shell_driver32 '
+                         '--shell_driver_path_64={path}/64/vts_shell_driver64 '
+                         '-l {severity}').format(
+                             bitness=bitness,
+                             path=DEFAULT_AGENT_BASE_DIR,
+                             severity=log_severity)
+            if keep_running:
+                # The agent survives the adb shell and logs on the device.
+                # The log is pulled by stopVtsAgent.
+                agent_cmd = 'nohup {cmd} > {log} 2>&1 &'.format(
+                    cmd=agent_cmd, log=_VTS_AGENT_DEVICE_LOG_PATH % bitness)
+            cmd = 'adb -s {s} shell "{cmd}" >> {log} 2>&1'.format(
+                s=self.serial, cmd=agent_cmd, log=vts_agent_log_path)
             try:
-                self.vts_agent_process = utils.start_standing_subprocess(
-                    cmd, check_health_delay=1)
+                process = utils.start_standing_subprocess(cmd)
+                if keep_running:
+                    process.wait()
+                    process = None
+                if not self._WaitForVtsAgentReady(process):
+                    if process:
+                        try:
+                            utils.stop_standing_subprocess(process)
+                        except utils.VTSUtilsError:
+                            pass
+                    raise utils.VTSUtilsError(
+                        "VTS agent (%s-bit) is not ready." % bitness)
+                if keep_running:
+                    self._warm_vts_agent = bitness
+                else:
+                    self.vts_agent_process = process
                 break
             except utils.VTSUtilsError as e:
                 logging.exception(e)
@@ -1307,14 +1643,25 @@ class AndroidDevice(object):
 
     def stopVtsAgent(self):
         """Stop the HAL agent running on the AndroidDevice.
+
+        An agent started with keep_vts_agent_running is left running for the
+        next test module. Its log on the device is copied to the log path.
         """
+        if self._warm_vts_agent:
+            self._PullVtsAgentLog()
+            self._warm_vts_agent = None
+            return
         if not self.vts_agent_process:
             return
+        event = tfi.Begin("stop vts agent",
+                          tfi.categories.FRAMEWORK_TEARDOWN,
+                          track=self.serial)
         try:
             utils.stop_standing_subprocess(self.vts_agent_process)
         except utils.VTSUtilsError as e:
             logging.error("Cannot stop VTS agent. %s", e)
         self.vts_agent_process = None
+        event.End()
 
     @property
     def product_type(self):
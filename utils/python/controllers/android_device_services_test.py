@@ -0,0 +1,191 @@
+#
+# Copyright (C) 2019 The Android Open Source Project
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+import mock
+import os
+import threading
+import unittest
+
+from vts.runners.host import const
+from vts.utils.python.controllers import android_device
+
+
+def _ShellResult(stdout="", stderr="", exit_code=0):
+    """Returns the result of an adb command which does not raise errors."""
+    return {
+        const.STDOUT: stdout,
+        const.STDERR: stderr,
+        const.EXIT_CODE: exit_code
+    }
+
+
+def _CreateMockDevice(serial, start_services=None):
+    """Creates a mock AndroidDevice for _startServicesOnAds.
+
+    Args:
+        serial: string, the serial number.
+        start_services: function which replaces startServices.
+    """
+    ad = mock.MagicMock(serial=serial)
+    ad.startServices.side_effect = start_services
+    return ad
+
+
+class AndroidDeviceServicesTest(unittest.TestCase):
+    """Unit tests for the services of AndroidDevice with mock adb."""
+
+    def setUp(self):
+        """Creates an AndroidDevice whose adb and fastboot are mocks."""
+        for target, attribute, value in (
+            (android_device.adb, "AdbProxy", mock.DEFAULT),
+            (android_device.adb, "get_available_host_port", mock.DEFAULT),
+            (android_device.fastboot, "FastbootProxy", mock.DEFAULT),
+            (android_device, "list_fastboot_devices", mock.DEFAULT),
+            (android_device.AndroidDevice, "cleanUp", mock.DEFAULT),
+        ):
+            patcher = mock.patch.object(target, attribute, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        android_device.list_fastboot_devices.return_value = []
+        android_device.adb.get_available_host_port.return_value = 5000
+        self._device = android_device.AndroidDevice(
+            "serial", device_callback_port=-1)
+        self._adb = self._device.adb
+
+    def _GetShellCommand(self):
+        """Returns the command of the last adb shell call."""
+        return self._adb.shell.call_args[0][0]
+
+    @mock.patch.object(android_device.vts_tcp_client, "VtsTcpClient")
+    def testReuseVtsAgent(self, mock_client_class):
+        """Tests that a running agent is reused if it responds to ping."""
+        mock_client_class.return_value.Ping.return_value = True
+        self._adb.shell.return_value = _ShellResult("5001\n32\n")
+        self.assertTrue(self._device._ReuseVtsAgent())
+        self.assertEqual(5001, self._device.device_command_port)
+        self.assertEqual("32", self._device._warm_vts_agent)
+        self._adb.tcp_forward.assert_called_with(5000, 5001)
+
+        self._adb.pull.return_value = _ShellResult()
+        self._device.stopVtsAgent()
+        self._adb.pull.assert_called_once_with(
+            "/data/local/tmp/vts_agent_32.log %s" % os.path.join(
+                self._device.log_path, "vts_agent_32_serial.log"),
+            no_except=True)
+        self.assertIsNone(self._device._warm_vts_agent)
+
+    @mock.patch.object(android_device.vts_tcp_client, "VtsTcpClient")
+    def testReuseVtsAgentNoResponse(self, mock_client_class):
+        """Tests that an agent which does not respond is not reused."""
+        mock_client_class.return_value.Ping.return_value = False
+        self._adb.shell.return_value = _ShellResult("5001\n64\n")
+        self.assertFalse(self._device._ReuseVtsAgent())
+        self.assertIsNone(self._device._warm_vts_agent)
+        mock_client_class.return_value.Disconnect.assert_called_once_with()
+
+        self._adb.shell.return_value = _ShellResult("", "", 1)
+        self.assertFalse(self._device._ReuseVtsAgent())
+
+    def testCleanUpVtsAgentChmod(self):
+        """Tests that chmod is recorded only if it succeeds."""
+        self._adb.shell.return_value = _ShellResult("", "Read-only", 1)
+        self._device._CleanUpVtsAgent(["64", "32"])
+        self.assertIn("chmod 755 ", self._GetShellCommand())
+        self.assertEqual(set(), self._device._agent_chmod_bits)
+
+        self._adb.shell.return_value = _ShellResult(
+            android_device._VTS_AGENT_CHMOD_DONE + "\n")
+        self._device._CleanUpVtsAgent(["64", "32"])
+        self.assertEqual(set(["64", "32"]), self._device._agent_chmod_bits)
+
+        self._device._CleanUpVtsAgent(["32"])
+        self.assertNotIn("chmod", self._GetShellCommand())
+
+    def testConstructInstances(self):
+        """Tests that devices are constructed in the order of the args."""
+        ads = android_device._constructInstances([("a", ), ("b", ), ("c", )])
+        self.assertEqual(["a", "b", "c"], [ad.serial for ad in ads])
+
+    def testConstructInstancesError(self):
+        """Tests that an exception of a constructor is raised."""
+        with mock.patch.object(android_device, "AndroidDevice",
+                               side_effect=[mock.Mock(), IOError("b")]):
+            with self.assertRaises(IOError):
+                android_device._constructInstances([("a", ), ("b", )])
+
+    def testTimeServicePhaseCancelled(self):
+        """Tests that a phase does not run after cancel is set."""
+        cancel = threading.Event()
+        func = mock.Mock()
+        self._device._timeServicePhase("a", func, cancel)
+        cancel.set()
+        with self.assertRaises(android_device.AndroidDeviceError):
+            self._device._timeServicePhase("b", func, cancel)
+        self.assertEqual(1, func.call_count)
+        self.assertEqual(["a"], list(self._device.service_start_timings))
+
+    def testStartServicesOnAdsFailure(self):
+        """Tests that all devices are cleaned up if one fails."""
+        ads = [
+            _CreateMockDevice("a"),
+            _CreateMockDevice("b", mock.Mock(side_effect=IOError("b"))),
+            _CreateMockDevice("c", mock.Mock(side_effect=IOError("c")))
+        ]
+        with self.assertRaises(android_device.AndroidDeviceError) as cm:
+            android_device._startServicesOnAds(ads)
+        self.assertEqual("Failed to start services on b (b), c (c).",
+                         str(cm.exception))
+        for ad in ads:
+            ad.cleanUp.assert_called_once_with()
+            ad.service_start_timings.items.assert_called_once_with()
+
+    def testStartServicesOnAdsTimeout(self):
+        """Tests that a timed-out device is cleaned up after it finishes."""
+        release = threading.Event()
+        cancels = []
+
+        def _StartServices(cancel):
+            cancels.append(cancel)
+            release.wait()
+
+        cleaned_up = threading.Event()
+        slow_ad = _CreateMockDevice("slow", _StartServices)
+        slow_ad.cleanUp.side_effect = cleaned_up.set
+        ads = [_CreateMockDevice("fast"), slow_ad]
+        with self.assertRaises(android_device.AndroidDeviceError) as cm:
+            android_device._startServicesOnAds(ads, timeout=0.1)
+        self.assertEqual("Failed to start services on slow (timed out).",
+                         str(cm.exception))
+        ads[0].cleanUp.assert_called_once_with()
+        self.assertFalse(slow_ad.cleanUp.called)
+        self.assertFalse(slow_ad.service_start_timings.items.called)
+        self.assertTrue(cancels[0].is_set())
+
+        release.set()
+        self.assertTrue(cleaned_up.wait(5))
+        slow_ad.cleanUp.assert_called_once_with()
+
+    def testStartServicesOnAdsSuccess(self):
+        """Tests that no device is cleaned up if all succeed."""
+        ads = [_CreateMockDevice("a"), _CreateMockDevice("b")]
+        android_device._startServicesOnAds(ads)
+        for ad in ads:
+            self.assertFalse(ad.startServices.call_args[0][0].is_set())
+            self.assertFalse(ad.cleanUp.called)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,183 @@
+#
+# Copyright (C) 2019 The Android Open Source Project
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+import logging
+import os
+import threading
+import time
+
+import concurrent.futures
+
+# Seconds after a bug report is requested in which the requests for the
+# same device are merged into it.
+DEFAULT_DEDUPE_WINDOW_SECS = 60
+# Maximum total bytes of the bug reports kept by one service.
+DEFAULT_MAX_TOTAL_SIZE = 1024 * 1024 * 1024
+# Maximum number of bug reports taken at the same time.
+DEFAULT_MAX_WORKERS = 8
+
+_default_service = None
+_default_service_lock = threading.Lock()
+
+
+class BugReportService(object):
+    """Takes bug reports in the background.
+
+    Requests return immediately. The reports of different devices are taken
+    concurrently, while the requests for one device which come close
+    together are merged into one report. The path of a merged request is
+    not written; it is mapped to the path of the report in aliases. The
+    oldest reports are deleted when the total size exceeds the limit.
+
+    Attributes:
+        dedupe_window: float, seconds in which the requests for one device
+                       are merged.
+        max_total_size: int, maximum total bytes of the reports. The latest
+                        report is kept even if it exceeds the limit.
+        aliases: dict, the path of each merged request to the path of the
+                 report it is merged into.
+        _executor: ThreadPoolExecutor which takes the reports.
+        _lock: threading.Lock, guards the following attributes.
+        _last_requests: dict, serial number to (time, path, Future) of the
+                        last report requested for the device.
+        _reports: list of strings, paths to the reports from the oldest.
+        _pending: set of Future objects which are not done.
+    """
+
+    def __init__(self, dedupe_window=DEFAULT_DEDUPE_WINDOW_SECS,
+                 max_total_size=DEFAULT_MAX_TOTAL_SIZE,
+                 max_workers=DEFAULT_MAX_WORKERS):
+        self.dedupe_window = dedupe_window
+        self.max_total_size = max_total_size
+        self._executor = concurrent.futures.ThreadPoolExecutor(
+            max_workers=max_workers)
+        self._lock = threading.Lock()
+        self.aliases = {}
+        self._last_requests = {}
+        self._reports = []
+        self._pending = set()
+
+    def Request(self, ad, path):
+        """Requests a bug report of a device.
+
+        Args:
+            ad: AndroidDevice object.
+            path: string, path to the zip file to write.
+
+        Returns:
+            Future object whose result is the path to the report, or None if
+            the report failed. If a report of the device is being taken or
+            was requested in the dedupe window, the future of that report,
+            and the path is not written.
+        """
+        now = time.time()
+        with self._lock:
+            last = self._last_requests.get(ad.serial)
+            if last and (not last[2].done() or
+                         now - last[0] < self.dedupe_window):
+                logging.info("Merged bug report %s of %s into %s requested "
+                             "%.1fs ago.", path, ad.serial, last[1],
+                             now - last[0])
+                self.aliases[path] = last[1]
+                return last[2]
+            future = self._executor.submit(self._Take, ad, path)
+            self._last_requests[ad.serial] = (now, path, future)
+            self._pending.add(future)
+        future.add_done_callback(self._OnDone)
+        return future
+
+    def _Take(self, ad, path):
+        """Takes a bug report and deletes the old ones over the limit.
+
+        Returns:
+            string, the path to the report. None if it failed.
+        """
+        logging.info("Taking bug report of %s to %s", ad.serial, path)
+        start = time.time()
+        try:
+            # On the devices which support bugreportz, adb writes the zipped
+            # bug report to the path.
+            ad.adb.bugreport(path)
+        except Exception as e:
+            logging.exception("Failed to take bug report of %s: %s",
+                              ad.serial, e)
+            return None
+        if not os.path.isfile(path):
+            logging.error("Bug report of %s is not found at %s", ad.serial,
+                          path)
+            return None
+        logging.info("Bug report of %s taken in %.1fs.", ad.serial,
+                     time.time() - start)
+        with self._lock:
+            self._reports.append(path)
+            self._Prune()
+        return path
+
+    def _Prune(self):
+        """Deletes the oldest reports over the size limit.
+
+        Must hold the lock.
+        """
+        sizes = []
+        for path in self._reports:
+            try:
+                sizes.append(os.path.getsize(path))
+            except OSError:
+                sizes.append(0)
+        total = sum(sizes)
+        while total > self.max_total_size and len(self._reports) > 1:
+            path = self._reports.pop(0)
+            total -= sizes.pop(0)
+            logging.info("Deleting bug report %s to keep the total size "
+                         "under %d bytes.", path, self.max_total_size)
+            try:
+                os.remove(path)
+            except OSError as e:
+                logging.warning("Cannot delete bug report: %s", e)
+
+    def _OnDone(self, future):
+        """Removes a finished future from the pending ones."""
+        with self._lock:
+            self._pending.discard(future)
+
+    def Wait(self, timeout=None):
+        """Waits for the pending bug reports.
+
+        Args:
+            timeout: float, seconds to wait. None to wait until all finish.
+
+        Returns:
+            bool, whether all reports finished in time.
+        """
+        with self._lock:
+            pending = list(self._pending)
+        if not pending:
+            return True
+        logging.info("Waiting for %d bug report(s).", len(pending))
+        _, not_done = concurrent.futures.wait(pending, timeout=timeout)
+        if not_done:
+            logging.error("%d bug report(s) did not finish in %ss.",
+                          len(not_done), timeout)
+        return not not_done
+
+
+def GetDefaultService():
+    """Returns the BugReportService shared in this process."""
+    global _default_service
+    with _default_service_lock:
+        if _default_service is None:
+            _default_service = BugReportService()
+        return _default_service
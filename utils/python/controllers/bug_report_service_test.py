@@ -0,0 +1,102 @@
+#!/usr/bin/env python
+#
+# Copyright (C) 2019 The Android Open Source Project
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+
+from vts.utils.python.controllers import bug_report_service
+
+
+class FakeAdb(object):
+    """Fake AdbProxy which writes bug reports of a fixed size.
+
+    Attributes:
+        size: int, the size of the reports.
+        release: threading.Event, set to let the reports finish.
+        paths: list of strings, the paths of the reports taken.
+    """
+
+    def __init__(self, size):
+        self.size = size
+        self.release = threading.Event()
+        self.release.set()
+        self.paths = []
+
+    def bugreport(self, path):
+        self.release.wait()
+        self.paths.append(path)
+        with open(path, "wb") as report_file:
+            report_file.write(b"0" * self.size)
+
+
+class FakeDevice(object):
+    """Fake AndroidDevice."""
+
+    def __init__(self, serial, size=10):
+        self.serial = serial
+        self.adb = FakeAdb(size)
+
+
+class BugReportServiceTest(unittest.TestCase):
+    """Unit tests for bug_report_service module."""
+
+    def setUp(self):
+        """Creates the report directory."""
+        self._tmp_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        """Removes the report directory."""
+        shutil.rmtree(self._tmp_dir)
+
+    def _GetPath(self, name):
+        """Returns the path to a report in the directory."""
+        return os.path.join(self._tmp_dir, name + ".zip")
+
+    def testDedupe(self):
+        """Tests that requests close together are merged per device."""
+        service = bug_report_service.BugReportService(dedupe_window=60)
+        device_a = FakeDevice("a")
+        device_b = FakeDevice("b")
+        device_a.adb.release.clear()
+        future_a = service.Request(device_a, self._GetPath("a1"))
+        future_b = service.Request(device_b, self._GetPath("b1"))
+        self.assertIs(service.Request(device_a, self._GetPath("a2")),
+                      future_a)
+        self.assertEqual(future_b.result(10), self._GetPath("b1"))
+        self.assertFalse(future_a.done())
+        device_a.adb.release.set()
+        self.assertTrue(service.Wait(10))
+        self.assertEqual(device_a.adb.paths, [self._GetPath("a1")])
+        self.assertEqual(service.aliases,
+                         {self._GetPath("a2"): self._GetPath("a1")})
+
+    def testPrune(self):
+        """Tests that the oldest reports are deleted over the size limit."""
+        service = bug_report_service.BugReportService(dedupe_window=0,
+                                                      max_total_size=25)
+        device = FakeDevice("a")
+        for name in ("r1", "r2", "r3"):
+            service.Request(device, self._GetPath(name)).result(10)
+        self.assertEqual(sorted(os.listdir(self._tmp_dir)),
+                         ["r2.zip", "r3.zip"])
+
+
+if __name__ == "__main__":
+    unittest.main()
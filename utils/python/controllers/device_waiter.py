@@ -0,0 +1,250 @@
+#
+# Copyright (C) 2019 The Android Open Source Project
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+import logging
+import os
+import select
+import subprocess
+import time
+
+# Seconds between two probes in the device-side loop.
+DEFAULT_INTERVAL_SECS = 0.2
+# Minimum seconds between two starts of the watcher of one device, e.g.,
+# when adb shell exits because the device reboots.
+_RESTART_INTERVAL_SECS = 1
+# Maximum seconds between two calls to the abort function of WaitAll.
+_ABORT_CHECK_INTERVAL_SECS = 0.2
+
+# Prints the boot completion properties, e.g., "1 1" when boot completed.
+BOOT_COMPLETION_PROBE = ("echo $(getprop sys.boot_completed) "
+                         "$(getprop dev.bootcomplete)")
+# Prints the boot completion properties and the number of system_server
+# processes.
+FRAMEWORK_PROBE = ("echo $(getprop sys.boot_completed) "
+                   "$(getprop dev.bootcomplete) "
+                   "$(ps -g system | grep -c system_server)")
+
+
+def IsBootCompleted(line):
+    """Checks a line printed by BOOT_COMPLETION_PROBE."""
+    return line.split() == ["1", "1"]
+
+
+def IsFrameworkRunning(line):
+    """Checks a line printed by FRAMEWORK_PROBE."""
+    tokens = line.split()
+    return (len(tokens) == 3 and tokens[:2] == ["1", "1"] and
+            tokens[2].isdigit() and int(tokens[2]) > 0)
+
+
+class DeviceWatcher(object):
+    """A device-side shell loop that prints a probe when its output changes.
+
+    The loop runs in one long-running adb shell, so the host is notified as
+    soon as the output changes, without an adb invocation per check.
+
+    Attributes:
+        serial: string, the serial number of the device.
+        probe: string, the shell command whose output is watched. Its output
+               must be one line.
+        predicate: function that takes the output of the probe and returns
+                   whether the condition is satisfied.
+        interval: float, seconds between two probes on the device.
+        satisfied: bool, whether the condition has been satisfied.
+        output: string, the last output of the probe. None if the probe has
+                not printed.
+        _process: subprocess.Popen object, the adb shell. None if it is not
+                  running.
+        _buffer: string, the output that does not end with new line yet.
+        _start_time: float, time when _process was started.
+    """
+
+    def __init__(self, serial, probe, predicate,
+                 interval=DEFAULT_INTERVAL_SECS):
+        self.serial = serial
+        self.probe = probe
+        self.predicate = predicate
+        self.interval = interval
+        self.satisfied = False
+        self.output = None
+        self._process = None
+        self._buffer = ""
+        self._start_time = 0
+
+    def _GetCommand(self):
+        """Returns the command which runs the loop on the device."""
+        script = ('last=; while true; do s="$(%s)"; '
+                  'if [ "$s" != "$last" ]; then echo "$s"; last="$s"; fi; '
+                  'sleep %s; done') % (self.probe, self.interval)
+        return ["adb", "-s", self.serial, "wait-for-device", "shell", script]
+
+    @property
+    def running(self):
+        """Whether the adb shell is running."""
+        return self._process is not None
+
+    def GetRestartDelay(self):
+        """Returns seconds to wait before the watcher can be started."""
+        return max(0, self._start_time + _RESTART_INTERVAL_SECS - time.time())
+
+    def Start(self):
+        """Starts the adb shell."""
+        self._buffer = ""
+        self._start_time = time.time()
+        with open(os.devnull, "w") as devnull:
+            self._process = subprocess.Popen(
+                self._GetCommand(),
+                stdout=subprocess.PIPE,
+                stderr=devnull,
+                close_fds=True)
+
+    def fileno(self):
+        """Returns the file descriptor of the output, for select."""
+        return self._process.stdout.fileno()
+
+    def OnReadable(self):
+        """Reads the output and updates satisfied.
+
+        The adb shell is stopped if it exits, e.g., when the device reboots,
+        or when the condition is satisfied.
+        """
+        data = os.read(self.fileno(), 4096)
+        if not data:
+            logging.debug("Watcher of %s exited.", self.serial)
+            self.Stop()
+            return
+        lines = (self._buffer + data.decode("utf-8", "replace")).split("\n")
+        self._buffer = lines.pop()
+        for line in lines:
+            logging.debug("Watcher of %s: %s", self.serial, line)
+            self.output = line.strip()
+            if self.predicate(self.output):
+                self.satisfied = True
+                self.Stop()
+                return
+
+    def Stop(self):
+        """Stops the adb shell if it is running."""
+        if self._process is None:
+            return
+        if self._process.poll() is None:
+            try:
+                self._process.kill()
+            except OSError:
+                pass
+        self._process.stdout.close()
+        self._process.wait()
+        self._process = None
+
+
+def WaitAll(watchers, timeout, abort=None):
+    """Waits until the conditions of all watchers are satisfied.
+
+    The watchers of all devices are served by one select loop. A watcher
+    whose adb shell exits is restarted.
+
+    Args:
+        watchers: list of DeviceWatcher objects.
+        timeout: float, seconds to wait.
+        abort: function that returns whether to stop waiting, e.g., when the
+               process being waited for has exited. Called at least every
+               0.2 second.
+
+    Returns:
+        dict, serial number to whether the condition was satisfied in time.
+    """
+    deadline = time.time() + timeout
+    try:
+        while True:
+            pending = [watcher for watcher in watchers
+                       if not watcher.satisfied]
+            remaining = deadline - time.time()
+            if not pending or remaining <= 0 or (abort and abort()):
+                break
+            wait_secs = remaining
+            if abort:
+                wait_secs = min(wait_secs, _ABORT_CHECK_INTERVAL_SECS)
+            for watcher in pending:
+                if not watcher.running:
+                    delay = watcher.GetRestartDelay()
+                    if delay:
+                        wait_secs = min(wait_secs, delay)
+                    else:
+                        watcher.Start()
+            running = [watcher for watcher in pending if watcher.running]
+            if running:
+                readable, _, _ = select.select(running, [], [], wait_secs)
+                for watcher in readable:
+                    watcher.OnReadable()
+            else:
+                time.sleep(wait_secs)
+    finally:
+        for watcher in watchers:
+            watcher.Stop()
+    return dict((watcher.serial, watcher.satisfied) for watcher in watchers)
+
+
+def WaitForBootCompletion(serials, timeout):
+    """Waits for devices to complete booting.
+
+    Args:
+        serials: list of strings, the serial numbers of the devices.
+        timeout: float, seconds to wait.
+
+    Returns:
+        dict, serial number to whether the device booted in time.
+    """
+    return WaitAll([
+        DeviceWatcher(serial, BOOT_COMPLETION_PROBE, IsBootCompleted)
+        for serial in serials
+    ], timeout)
+
+
+def WaitForFrameworkStart(serials, timeout):
+    """Waits for the Android framework of devices to start.
+
+    Args:
+        serials: list of strings, the serial numbers of the devices.
+        timeout: float, seconds to wait.
+
+    Returns:
+        dict, serial number to whether the framework started in time.
+    """
+    return WaitAll([
+        DeviceWatcher(serial, FRAMEWORK_PROBE, IsFrameworkRunning)
+        for serial in serials
+    ], timeout)
+
+
+def WaitForProcessStop(serials, process_names, timeout):
+    """Waits until no process of devices matches the given names.
+
+    Args:
+        serials: list of strings, the serial numbers of the devices.
+        process_names: list of strings, substrings of the output of ps -A.
+        timeout: float, seconds to wait.
+
+    Returns:
+        dict, serial number to whether the processes stopped in time.
+    """
+    if not process_names:
+        return dict((serial, True) for serial in serials)
+    probe = "ps -A | grep -c -F %s" % " ".join(
+        "-e '%s'" % name for name in process_names)
+    return WaitAll([
+        DeviceWatcher(serial, probe, lambda line: line == "0")
+        for serial in serials
+    ], timeout)
@@ -0,0 +1,96 @@
+#!/usr/bin/env python
+#
+# Copyright (C) 2019 The Android Open Source Project
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+import os
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+
+from vts.utils.python.controllers import device_waiter
+
+
+class LocalWatcher(device_waiter.DeviceWatcher):
+    """DeviceWatcher which runs the loop in a local shell."""
+
+    def _GetCommand(self):
+        command = super(LocalWatcher, self)._GetCommand()
+        return ["sh", "-c", command[-1]]
+
+
+class DeviceWaiterTest(unittest.TestCase):
+    """Unit tests for device_waiter module."""
+
+    def setUp(self):
+        """Creates the files read by the probes."""
+        self._tmp_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        """Removes the files."""
+        shutil.rmtree(self._tmp_dir)
+
+    def _WriteProp(self, serial, value):
+        """Writes the file read by the probe of a serial."""
+        with open(os.path.join(self._tmp_dir, serial), "w") as prop_file:
+            prop_file.write(value)
+
+    def _CreateWatcher(self, serial):
+        """Creates a watcher that waits for "1 1" in the file of a serial."""
+        probe = "cat %s" % os.path.join(self._tmp_dir, serial)
+        return LocalWatcher(serial, probe, device_waiter.IsBootCompleted,
+                            interval=0.05)
+
+    def testWaitAll(self):
+        """Tests waiting for conditions which change on many devices."""
+        self._WriteProp("a", "0 0")
+        self._WriteProp("b", "1 1")
+        timer = threading.Timer(0.3, self._WriteProp, ("a", "1 1"))
+        timer.start()
+        start = time.time()
+        results = device_waiter.WaitAll(
+            [self._CreateWatcher("a"), self._CreateWatcher("b")], 10)
+        timer.join()
+        self.assertEqual(results, {"a": True, "b": True})
+        self.assertLess(time.time() - start, 5)
+
+    def testTimeout(self):
+        """Tests that a condition which is not satisfied times out."""
+        self._WriteProp("a", "1 0")
+        watcher = self._CreateWatcher("a")
+        self.assertEqual(device_waiter.WaitAll([watcher], 0.3), {"a": False})
+        self.assertFalse(watcher.running)
+
+    def testAbort(self):
+        """Tests that waiting stops when the abort function returns True."""
+        self._WriteProp("a", "0 0")
+        start = time.time()
+        self.assertEqual(
+            device_waiter.WaitAll([self._CreateWatcher("a")], 10,
+                                  lambda: time.time() - start > 0.3),
+            {"a": False})
+        self.assertLess(time.time() - start, 5)
+
+    def testIsFrameworkRunning(self):
+        """Tests parsing the output of the framework probe."""
+        self.assertTrue(device_waiter.IsFrameworkRunning("1 1 1"))
+        self.assertFalse(device_waiter.IsFrameworkRunning("1 1 0"))
+        self.assertFalse(device_waiter.IsFrameworkRunning("1 1"))
+
+
+if __name__ == "__main__":
+    unittest.main()
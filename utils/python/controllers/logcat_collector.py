@@ -0,0 +1,300 @@
+#
+# Copyright (C) 2019 The Android Open Source Project
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+import bisect
+import gzip
+import logging
+import os
+import subprocess
+import threading
+import time
+import zlib
+
+# Uncompressed bytes in one segment before it is rotated.
+DEFAULT_SEGMENT_SIZE = 64 * 1024 * 1024
+# Seconds between two periodic entries of the index.
+DEFAULT_INDEX_INTERVAL_SECS = 1
+# The names of the files in the output directory.
+_SEGMENT_FILE_NAME = "%s.%04d.txt.gz"
+_INDEX_FILE_NAME = "%s.index.txt"
+# Bytes read from a segment file at a time.
+_READ_SIZE = 64 * 1024
+# Sorts after any segment number or offset in an index entry.
+_MAX = float("inf")
+
+
+class LogcatCollector(object):
+    """Reads adb logcat in-process and writes it to compressed segments.
+
+    The output is split into gzip files of bounded uncompressed size. An
+    index maps host time to positions in the segments, so that the logs of
+    a time range, e.g., one test case, are extracted by decompressing only
+    the segments in the range.
+
+    The index is also written to a text file, one entry per line:
+    "<time in seconds>\t<segment number>\t<uncompressed offset>".
+
+    Attributes:
+        serial: string, the serial number of the device.
+        directory: string, the directory of the output files.
+        prefix: string, the prefix of the output file names.
+        extra_params: string, the parameters appended to adb logcat.
+        segment_size: int, uncompressed bytes in one segment.
+        max_segments: int, the number of segments to keep. Older segments
+                      are deleted. None to keep all.
+        index_interval: float, seconds between two periodic index entries.
+        index_path: string, path to the index file.
+        process: subprocess.Popen object, the adb logcat process.
+        _lock: threading.Lock, guards the segment and the index.
+        _thread: threading.Thread, reads the output of process.
+        _segment: gzip.GzipFile object, the segment being written.
+        _segment_number: int, the number of the segment being written.
+        _offset: int, uncompressed bytes written to the segment.
+        _index: list of (time, segment number, offset) tuples.
+        _index_file: file object, the index file.
+        _first_segment: int, the number of the oldest segment kept.
+    """
+
+    def __init__(self, serial, directory, prefix, extra_params="",
+                 segment_size=DEFAULT_SEGMENT_SIZE, max_segments=None,
+                 index_interval=DEFAULT_INDEX_INTERVAL_SECS):
+        self.serial = serial
+        self.directory = directory
+        self.prefix = prefix
+        self.extra_params = extra_params
+        self.segment_size = segment_size
+        self.max_segments = max_segments
+        self.index_interval = index_interval
+        self.index_path = os.path.join(directory, _INDEX_FILE_NAME % prefix)
+        self.process = None
+        self._lock = threading.Lock()
+        self._thread = None
+        self._segment = None
+        self._segment_number = -1
+        self._offset = 0
+        self._index = []
+        self._index_file = None
+        self._first_segment = 0
+
+    def _GetCommand(self):
+        """Returns the command which prints the logcat."""
+        return (["adb", "-s", self.serial, "logcat", "-v", "threadtime"] +
+                self.extra_params.split())
+
+    def GetSegmentPath(self, segment_number):
+        """Returns the path to a segment file."""
+        return os.path.join(self.directory,
+                            _SEGMENT_FILE_NAME % (self.prefix, segment_number))
+
+    @property
+    def segment_paths(self):
+        """The paths to the segments kept, from the oldest."""
+        with self._lock:
+            return [self.GetSegmentPath(segment_number)
+                    for segment_number in range(self._first_segment,
+                                                self._segment_number + 1)]
+
+    @property
+    def running(self):
+        """Whether the logcat is being read."""
+        return self._thread is not None and self._thread.is_alive()
+
+    def Start(self):
+        """Starts adb logcat and the thread which reads it."""
+        self._index_file = open(self.index_path, "a")
+        with self._lock:
+            self._OpenSegment()
+        with open(os.devnull, "w") as devnull:
+            self.process = subprocess.Popen(
+                self._GetCommand(), stdout=subprocess.PIPE, stderr=devnull)
+        logging.debug("Start logcat collector: %s", self._GetCommand())
+        self._thread = threading.Thread(target=self._Read)
+        self._thread.daemon = True
+        self._thread.start()
+
+    def Stop(self):
+        """Stops adb logcat and closes the files."""
+        if self.process and self.process.poll() is None:
+            try:
+                self.process.kill()
+            except OSError:
+                pass
+        if self._thread:
+            self._thread.join()
+            self._thread = None
+        if self.process:
+            self.process.stdout.close()
+            self.process.wait()
+        with self._lock:
+            if self._segment:
+                self._segment.close()
+                self._segment = None
+            if self._index_file:
+                self._index_file.close()
+                self._index_file = None
+
+    def _Read(self):
+        """Writes the output of adb logcat until it exits."""
+        last_entry_time = 0
+        for line in iter(self.process.stdout.readline, b""):
+            now = time.time()
+            with self._lock:
+                if self._segment is None:
+                    break
+                if now - last_entry_time >= self.index_interval:
+                    self._AddIndexEntry(now)
+                    last_entry_time = now
+                self._segment.write(line)
+                self._offset += len(line)
+                if self._offset >= self.segment_size:
+                    self._segment.close()
+                    self._OpenSegment()
+        logging.debug("Logcat of %s exited.", self.serial)
+
+    def _OpenSegment(self):
+        """Starts a new segment and deletes the old ones."""
+        self._segment_number += 1
+        self._offset = 0
+        self._segment = gzip.GzipFile(
+            self.GetSegmentPath(self._segment_number), "wb")
+        if (self.max_segments and
+                self._segment_number - self._first_segment >= self.max_segments):
+            removed = self._segment_number - self.max_segments + 1
+            for segment_number in range(self._first_segment, removed):
+                try:
+                    os.remove(self.GetSegmentPath(segment_number))
+                except OSError as e:
+                    logging.warning("Cannot remove logcat segment: %s", e)
+            self._first_segment = removed
+            self._index = [entry for entry in self._index
+                           if entry[1] >= removed]
+
+    def _AddIndexEntry(self, timestamp):
+        """Maps a time to the current position. Must hold the lock."""
+        if self._index:
+            # Keeps the index sorted when a mark is older than the last entry.
+            timestamp = max(timestamp, self._index[-1][0])
+        entry = (timestamp, self._segment_number, self._offset)
+        self._index.append(entry)
+        self._index_file.write("%.3f\t%d\t%d\n" % entry)
+
+    def Mark(self, timestamp=None):
+        """Adds an index entry at the current position.
+
+        The logs received after this call are in the slices which begin at
+        or before the timestamp.
+
+        Args:
+            timestamp: float, the time in seconds. Current time if None.
+        """
+        with self._lock:
+            if self._segment is not None:
+                self._AddIndexEntry(
+                    time.time() if timestamp is None else timestamp)
+
+    def _Locate(self, begin_time, end_time):
+        """Returns the positions which enclose the logs of a time range.
+
+        Must hold the lock.
+
+        Returns:
+            The (segment number, offset) of the last index entry at or
+            before begin_time, or the oldest position if there is none, and
+            the position of the first entry after end_time, or the current
+            position if there is none.
+        """
+        begin_index = bisect.bisect_right(self._index, (begin_time, _MAX, _MAX))
+        if begin_index:
+            begin = self._index[begin_index - 1][1:]
+        else:
+            begin = (self._first_segment, 0)
+        end_index = len(self._index)
+        if end_time is not None:
+            end_index = bisect.bisect_right(self._index,
+                                            (end_time, _MAX, _MAX), begin_index)
+        if end_index < len(self._index):
+            end = self._index[end_index][1:]
+        else:
+            end = (self._segment_number, self._offset)
+        return begin, end
+
+    def WriteSlice(self, begin_time, end_time, path):
+        """Writes the logs received in a time range to a file.
+
+        The range is rounded outwards to the index entries, so the slice may
+        contain the logs of at most index_interval seconds before and after
+        it.
+
+        Args:
+            begin_time: float, the beginning of the range in seconds.
+            end_time: float, the end of the range in seconds. None to
+                      include all logs received so far.
+            path: string, path to the output file.
+
+        Returns:
+            int, the number of bytes written.
+        """
+        with self._lock:
+            begin, end = self._Locate(begin_time, end_time)
+            if self._segment is not None and end[0] == self._segment_number:
+                self._segment.flush()
+        size = 0
+        with open(path, "wb") as out_file:
+            for segment_number in range(begin[0], end[0] + 1):
+                start = begin[1] if segment_number == begin[0] else 0
+                stop = end[1] if segment_number == end[0] else None
+                size += _CopySegment(
+                    self.GetSegmentPath(segment_number), start, stop, out_file)
+        return size
+
+
+def _CopySegment(segment_path, start, stop, out_file):
+    """Copies a range of the uncompressed content of a segment.
+
+    The segment may still be written. Its content is readable up to the
+    last flush.
+
+    Args:
+        segment_path: string, path to the gzip file.
+        start: int, the uncompressed offset to start from.
+        stop: int, the uncompressed offset to stop at. None to copy all.
+        out_file: file object, the output.
+
+    Returns:
+        int, the number of bytes written.
+    """
+    decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+    offset = 0
+    size = 0
+    try:
+        segment_file = open(segment_path, "rb")
+    except IOError as e:
+        logging.warning("Cannot read logcat segment: %s", e)
+        return 0
+    with segment_file:
+        while stop is None or offset < stop:
+            compressed = segment_file.read(_READ_SIZE)
+            if not compressed:
+                break
+            data = decompressor.decompress(compressed)
+            data_begin = max(start - offset, 0)
+            data_end = len(data) if stop is None else min(stop - offset,
+                                                         len(data))
+            if data_begin < data_end:
+                out_file.write(data[data_begin:data_end])
+                size += data_end - data_begin
+            offset += len(data)
+    return size
@@ -0,0 +1,111 @@
+#!/usr/bin/env python
+#
+# Copyright (C) 2019 The Android Open Source Project
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+import os
+import shutil
+import tempfile
+import time
+import unittest
+
+from vts.utils.python.controllers import logcat_collector
+
+
+class LocalCollector(logcat_collector.LogcatCollector):
+    """LogcatCollector which reads the lines written to a fifo."""
+
+    def __init__(self, fifo_path, *args, **kwargs):
+        super(LocalCollector, self).__init__(*args, **kwargs)
+        self.fifo_path = fifo_path
+
+    def _GetCommand(self):
+        return ["cat", self.fifo_path]
+
+
+class LogcatCollectorTest(unittest.TestCase):
+    """Unit tests for logcat_collector module."""
+
+    def setUp(self):
+        """Creates the output directory."""
+        self._tmp_dir = tempfile.mkdtemp()
+        self._collector = None
+        self._fifo = None
+
+    def tearDown(self):
+        """Stops the collector and removes the directory."""
+        if self._fifo:
+            self._fifo.close()
+        if self._collector:
+            self._collector.Stop()
+        shutil.rmtree(self._tmp_dir)
+
+    def _StartCollector(self, **kwargs):
+        """Starts a collector which rotates segments every two lines."""
+        fifo_path = os.path.join(self._tmp_dir, "fifo")
+        os.mkfifo(fifo_path)
+        self._collector = LocalCollector(
+            fifo_path, "serial", self._tmp_dir, "adblog", segment_size=20,
+            index_interval=0.01, **kwargs)
+        self._collector.Start()
+        self._fifo = open(fifo_path, "w")
+
+    def _Write(self, *lines):
+        """Writes lines and waits until the collector reads them."""
+        for line in lines:
+            self._fifo.write(line + "\n")
+        self._fifo.flush()
+        time.sleep(0.1)
+
+    def _ReadSlice(self, begin_time, end_time):
+        """Returns the logs of a time range."""
+        path = os.path.join(self._tmp_dir, "slice.txt")
+        self._collector.WriteSlice(begin_time, end_time, path)
+        with open(path, "r") as slice_file:
+            return slice_file.read()
+
+    def testWriteSlice(self):
+        """Tests extracting the logs of time ranges across segments."""
+        self._StartCollector()
+        self._Write("before 0123456789", "before 0123456789")
+        begin_time = time.time()
+        self._collector.Mark(begin_time)
+        self._Write("test 0123456789", "test 0123456789")
+        end_time = time.time()
+        time.sleep(0.05)
+        self._Write("after 0123456789")
+
+        self.assertEqual(self._ReadSlice(begin_time, end_time),
+                         "test 0123456789\n" * 2)
+        self.assertEqual(self._ReadSlice(begin_time, None),
+                         "test 0123456789\n" * 2 + "after 0123456789\n")
+        self.assertTrue(os.path.isfile(self._collector.GetSegmentPath(2)))
+        self.assertFalse(os.path.isfile(self._collector.GetSegmentPath(3)))
+
+    def testMaxSegments(self):
+        """Tests that old segments are deleted."""
+        self._StartCollector(max_segments=2)
+        self._Write(*["line %d 0123456789" % i for i in range(6)])
+        self.assertFalse(os.path.isfile(self._collector.GetSegmentPath(1)))
+        self.assertEqual(self._ReadSlice(0, None),
+                         "line 4 0123456789\nline 5 0123456789\n")
+        self.assertEqual(
+            [self._collector.GetSegmentPath(2),
+             self._collector.GetSegmentPath(3)],
+            self._collector.segment_paths)
+
+
+if __name__ == "__main__":
+    unittest.main()
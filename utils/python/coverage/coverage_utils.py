@@ -59,6 +59,7 @@ _FLUSH_COMMAND = (
     "GCOV_PREFIX_OVERRIDE=true GCOV_PREFIX=/data/local/tmp/flusher "
     "/data/local/tmp/vts_coverage_configure flush")
 _SP_COVERAGE_PATH = "self"  # relative location where same-process coverage is dumped.
+_MAX_CONCURRENT_PULLS = 8  # number of gcda files pulled at a time.
 
 _CHECKSUM_GCNO_DICT = "checksum_gcno_dict"
 _COVERAGE_ZIP = "coverage_zip"
@@ -331,21 +332,34 @@ class CoverageFeature(feature_utils.Feature):
             if result:
                 gcda_files.update(result.split("\n"))
 
-        for gcda in gcda_files:
-            if gcda:
-                basename = os.path.basename(gcda.strip())
-                file_name = os.path.join(self.local_coverage_path, basename)
-                if dut is None:
-                    results = cmd_utils.ExecuteShellCommand(
-                        "adb -s %s pull %s %s " % (serial, gcda, file_name))
-                    if (results[cmd_utils.EXIT_CODE][0]):
+        gcda_files = [gcda for gcda in gcda_files if gcda]
+        file_names = [
+            os.path.join(self.local_coverage_path,
+                         os.path.basename(gcda.strip()))
+            for gcda in gcda_files
+        ]
+        if dut is None:
+            # The pulls wait for adb, so they run concurrently.
+            pull_cmds = [
+                "adb -s %s pull %s %s " % (serial, gcda, file_name)
+                for gcda, file_name in zip(gcda_files, file_names)
+            ]
+            if pull_cmds:
+                results = cmd_utils.ExecuteShellCommand(
+                    pull_cmds, max_concurrency=_MAX_CONCURRENT_PULLS)
+                for pull_cmd, exit_code, stderr in zip(
+                        pull_cmds, results[cmd_utils.EXIT_CODE],
+                        results[cmd_utils.STDERR]):
+                    if exit_code:
                         logging.error(
                             "Fail to execute command: %s. error: %s" %
-                            (cmd, str(results[cmd_utils.STDERR][0])))
-                else:
-                    dut.adb.pull("%s %s" % (gcda, file_name))
-                gcda_content = open(file_name, "rb").read()
-                gcda_dict[gcda.strip()] = gcda_content
+                            (pull_cmd, str(stderr)))
+        else:
+            for gcda, file_name in zip(gcda_files, file_names):
+                dut.adb.pull("%s %s" % (gcda, file_name))
+        for gcda, file_name in zip(gcda_files, file_names):
+            gcda_content = open(file_name, "rb").read()
+            gcda_dict[gcda.strip()] = gcda_content
         self._ClearTargetGcov(dut, serial)
         return gcda_dict
 
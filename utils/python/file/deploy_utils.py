@@ -0,0 +1,235 @@
+#
+# Copyright (C) 2019 The Android Open Source Project
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+import hashlib
+import logging
+import os
+import tarfile
+import tempfile
+
+from vts.runners.host import const
+from vts.utils.python.os import path_utils
+
+# Directory on the device where archives are unpacked from.
+DEVICE_TMP_DIR = "/data/local/tmp"
+
+# Maximum number of paths passed to one md5sum or chmod command.
+_MAX_PATHS_PER_COMMAND = 64
+
+_HASH_CHUNK_SIZE = 1024 * 1024
+
+
+class DeployManager(object):
+    """Pushes files to a device, skipping the ones already up to date.
+
+    Before pushing, the MD5 hashes of the destination files are read from the
+    device with a single md5sum command and recorded. Only the files whose
+    hashes differ from the host files are transferred. When several files
+    changed, they are packed into one tar archive, pushed with one adb
+    command, and unpacked on the device.
+
+    Attributes:
+        _adb: AdbProxy, the adb of the device.
+        _tmp_dir: string, device directory where archives are pushed.
+        _device_hashes: dict, device path to the recorded hex MD5 hash.
+        _host_hashes: dict, host path to (size, mtime, hex MD5 hash).
+    """
+
+    def __init__(self, adb, tmp_dir=DEVICE_TMP_DIR):
+        self._adb = adb
+        self._tmp_dir = tmp_dir
+        self._device_hashes = {}
+        self._host_hashes = {}
+
+    def Push(self, file_pairs):
+        """Pushes the files that differ from the ones on the device.
+
+        Args:
+            file_pairs: list of (host path, device path) tuples. If a host
+                        path is a directory, its contents are pushed into the
+                        device directory, like "adb push src/. dst".
+
+        Returns:
+            list of strings, the device paths that were transferred.
+
+        Raises:
+            AdbError if adb fails to push a file.
+        """
+        files = []
+        for src, dst in file_pairs:
+            files.extend(_ExpandFilePair(src, dst))
+
+        host_hashes = {}
+        for src, dst in files:
+            host_hashes[dst] = self._GetHostHash(src)
+        self._device_hashes.update(
+            self._QueryDeviceHashes(
+                [dst for dst in host_hashes if dst not in self._device_hashes]))
+
+        changed = [(src, dst) for src, dst in files
+                   if self._device_hashes.get(dst) != host_hashes[dst]]
+        logging.debug("%d of %d files to push are up to date on device.",
+                      len(files) - len(changed), len(files))
+        if not changed:
+            return []
+
+        if len(changed) == 1 or not self._PushArchive(changed):
+            for src, dst in changed:
+                logging.debug("Pushing from %s to %s.", src, dst)
+                self._adb.push(src, dst)
+
+        for src, dst in changed:
+            self._device_hashes[dst] = host_hashes[dst]
+        return [dst for src, dst in changed]
+
+    def Chmod(self, device_paths, mode="755"):
+        """Changes the permission of device files with as few commands as
+        possible.
+
+        Args:
+            device_paths: list of strings, the paths on device.
+            mode: string, the mode passed to chmod.
+
+        Returns:
+            True if all files are changed successfully, False otherwise.
+        """
+        success = True
+        for paths in _Chunk(sorted(set(device_paths))):
+            results = self._adb.shell(
+                "chmod %s %s" % (mode, " ".join(paths)), no_except=True)
+            if results[const.EXIT_CODE] != 0:
+                logging.error("Failed to chmod %s: %s", paths,
+                              results[const.STDERR])
+                success = False
+        return success
+
+    def _GetHostHash(self, host_path):
+        """Returns the hex MD5 hash of a host file, reusing earlier results.
+
+        Args:
+            host_path: string, path to the host file.
+
+        Returns:
+            string, the hex MD5 hash.
+        """
+        stat = os.stat(host_path)
+        cached = self._host_hashes.get(host_path)
+        if cached and cached[:2] == (stat.st_size, stat.st_mtime):
+            return cached[2]
+        md5 = hashlib.md5()
+        with open(host_path, "rb") as f:
+            for chunk in iter(lambda: f.read(_HASH_CHUNK_SIZE), b""):
+                md5.update(chunk)
+        content_hash = md5.hexdigest()
+        self._host_hashes[host_path] = (stat.st_size, stat.st_mtime,
+                                        content_hash)
+        return content_hash
+
+    def _QueryDeviceHashes(self, device_paths):
+        """Reads the MD5 hashes of device files.
+
+        Args:
+            device_paths: list of strings, the paths on device.
+
+        Returns:
+            dict, device path to hex MD5 hash. Missing files are absent.
+        """
+        hashes = {}
+        for paths in _Chunk(device_paths):
+            results = self._adb.shell(
+                "md5sum %s 2>/dev/null" % " ".join(paths), no_except=True)
+            # md5sum exits non-zero if any file is missing.
+            for line in (results[const.STDOUT] or "").splitlines():
+                tokens = line.split(None, 1)
+                if len(tokens) == 2:
+                    hashes[tokens[1].strip()] = tokens[0].lower()
+        return hashes
+
+    def _PushArchive(self, file_pairs):
+        """Packs files into a tar archive, pushes and unpacks it on device.
+
+        Args:
+            file_pairs: list of (host file path, device path) tuples.
+
+        Returns:
+            True if the archive is unpacked successfully, False otherwise.
+        """
+        fd, host_archive = tempfile.mkstemp(suffix=".tar")
+        os.close(fd)
+        device_archive = path_utils.JoinTargetPath(
+            self._tmp_dir, "vts_deploy_%d.tar" % os.getpid())
+        try:
+            archive = tarfile.open(host_archive, "w")
+            try:
+                for src, dst in file_pairs:
+                    archive.add(
+                        src, arcname=dst.lstrip("/"), filter=_ResetOwner)
+            finally:
+                archive.close()
+            logging.debug("Pushing %d files in %s.", len(file_pairs),
+                          device_archive)
+            self._adb.push(host_archive, device_archive)
+        finally:
+            os.remove(host_archive)
+
+        results = self._adb.shell(
+            "tar -xf %s -C /" % device_archive, no_except=True)
+        self._adb.shell("rm -f %s" % device_archive, no_except=True)
+        if results[const.EXIT_CODE] != 0:
+            logging.warning("Failed to unpack %s: %s. Pushing files one by "
+                            "one.", device_archive, results[const.STDERR])
+            return False
+        return True
+
+
+def _ExpandFilePair(src, dst):
+    """Expands a host directory to the files in it.
+
+    Args:
+        src: string, host path to a file or a directory.
+        dst: string, device path.
+
+    Returns:
+        list of (host file path, device file path) tuples.
+    """
+    if not os.path.isdir(src):
+        return [(src, dst)]
+    files = []
+    for dirpath, _, filenames in os.walk(src):
+        rel_dir = os.path.relpath(dirpath, src)
+        for filename in sorted(filenames):
+            if rel_dir == os.curdir:
+                target = path_utils.JoinTargetPath(dst, filename)
+            else:
+                target = path_utils.JoinTargetPath(
+                    dst, *(rel_dir.split(os.sep) + [filename]))
+            files.append((os.path.join(dirpath, filename), target))
+    return files
+
+
+def _Chunk(items):
+    """Splits a list into lists of at most _MAX_PATHS_PER_COMMAND items."""
+    return [
+        items[i:i + _MAX_PATHS_PER_COMMAND]
+        for i in range(0, len(items), _MAX_PATHS_PER_COMMAND)
+    ]
+
+
+def _ResetOwner(tarinfo):
+    """Makes the unpacked files owned by root like the ones adb pushes."""
+    tarinfo.uid = tarinfo.gid = 0
+    tarinfo.uname = tarinfo.gname = "root"
+    return tarinfo
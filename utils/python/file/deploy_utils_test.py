@@ -0,0 +1,159 @@
+#!/usr/bin/env python
+#
+# Copyright (C) 2019 The Android Open Source Project
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+import hashlib
+import os
+import shutil
+import tarfile
+import tempfile
+import unittest
+
+from vts.runners.host import const
+from vts.utils.python.file import deploy_utils
+
+
+class FakeAdb(object):
+    """Fake AdbProxy which keeps device files in a dict.
+
+    Attributes:
+        files: dict, device path to file content.
+        pushes: list of (host path, device path) tuples.
+        commands: list of strings, the shell commands.
+        tar_exit_code: int, the exit code of tar commands.
+    """
+
+    def __init__(self):
+        self.files = {}
+        self.pushes = []
+        self.commands = []
+        self.tar_exit_code = 0
+
+    def push(self, src, dst):
+        self.pushes.append((src, dst))
+        with open(src, "rb") as f:
+            self.files[dst] = f.read()
+
+    def shell(self, cmd, no_except=False):
+        self.commands.append(cmd)
+        tokens = cmd.split()
+        stdout = ""
+        exit_code = 0
+        if tokens[0] == "md5sum":
+            for path in tokens[1:-1]:
+                if path in self.files:
+                    stdout += "%s  %s\n" % (hashlib.md5(
+                        self.files[path]).hexdigest(), path)
+        elif tokens[0] == "tar":
+            exit_code = self.tar_exit_code
+            if not exit_code:
+                archive_path = tempfile.mktemp()
+                with open(archive_path, "wb") as f:
+                    f.write(self.files[tokens[2]])
+                archive = tarfile.open(archive_path)
+                for member in archive.getmembers():
+                    self.files["/" + member.name] = archive.extractfile(
+                        member).read()
+                archive.close()
+                os.remove(archive_path)
+        elif tokens[0] == "rm":
+            self.files.pop(tokens[2], None)
+        return {
+            const.STDOUT: stdout,
+            const.STDERR: "",
+            const.EXIT_CODE: exit_code
+        }
+
+
+class DeployUtilsTest(unittest.TestCase):
+    """Unit tests for deploy_utils module."""
+
+    def setUp(self):
+        """Creates host files and the fake device."""
+        self._tmp_dir = tempfile.mkdtemp()
+        self._src_dir = os.path.join(self._tmp_dir, "src")
+        os.makedirs(os.path.join(self._src_dir, "lib"))
+        self._WriteFile("bin", b"binary")
+        self._WriteFile("lib/a.so", b"library a")
+        self._WriteFile("lib/b.so", b"library b")
+        self._adb = FakeAdb()
+        self._manager = deploy_utils.DeployManager(self._adb)
+
+    def tearDown(self):
+        """Removes the host files."""
+        shutil.rmtree(self._tmp_dir)
+
+    def _WriteFile(self, rel_path, content):
+        """Writes a host file under the source directory."""
+        with open(os.path.join(self._src_dir, rel_path), "wb") as f:
+            f.write(content)
+
+    def testPushArchive(self):
+        """Tests that changed files are pushed in one archive."""
+        pushed = self._manager.Push([(self._src_dir, "/data/local/tmp/t")])
+        self.assertEqual(
+            sorted(pushed), [
+                "/data/local/tmp/t/bin", "/data/local/tmp/t/lib/a.so",
+                "/data/local/tmp/t/lib/b.so"
+            ])
+        self.assertEqual(len(self._adb.pushes), 1)
+        self.assertEqual(self._adb.files["/data/local/tmp/t/lib/b.so"],
+                         b"library b")
+        self.assertEqual(
+            sorted(self._adb.files), sorted(pushed),
+            "The archive should be removed from the device.")
+
+    def testPushSkipsUpToDateFiles(self):
+        """Tests that only files with different hashes are pushed."""
+        self._adb.files["/data/local/tmp/t/bin"] = b"binary"
+        self._adb.files["/data/local/tmp/t/lib/a.so"] = b"old library a"
+        pushed = self._manager.Push([(self._src_dir, "/data/local/tmp/t")])
+        self.assertEqual(
+            sorted(pushed),
+            ["/data/local/tmp/t/lib/a.so", "/data/local/tmp/t/lib/b.so"])
+
+        # Recorded hashes avoid querying the device again.
+        self._adb.commands = []
+        self._adb.pushes = []
+        self.assertEqual(
+            self._manager.Push([(self._src_dir, "/data/local/tmp/t")]), [])
+        self.assertEqual(self._adb.commands, [])
+        self.assertEqual(self._adb.pushes, [])
+
+    def testPushSingleFile(self):
+        """Tests that a single changed file is pushed without archive."""
+        src = os.path.join(self._src_dir, "bin")
+        self.assertEqual(
+            self._manager.Push([(src, "/data/local/tmp/bin")]),
+            ["/data/local/tmp/bin"])
+        self.assertEqual(self._adb.pushes, [(src, "/data/local/tmp/bin")])
+
+    def testPushArchiveFallback(self):
+        """Tests that files are pushed one by one if unpacking fails."""
+        self._adb.tar_exit_code = 1
+        pushed = self._manager.Push([(self._src_dir, "/data/local/tmp/t")])
+        self.assertEqual(len(pushed), 3)
+        self.assertEqual(len(self._adb.pushes), 4)
+        self.assertEqual(self._adb.files["/data/local/tmp/t/bin"], b"binary")
+
+    def testChmod(self):
+        """Tests that files are changed with one command."""
+        self.assertTrue(self._manager.Chmod(["/b", "/a", "/b"]))
+        self.assertEqual(self._adb.commands, ["chmod 755 /a /b"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -51,6 +51,34 @@ def Exists(filepath, shell):
     return _Test(shell, "-e", filepath)
 
 
+def FindExistingPaths(paths, shell):
+    """Determines which of the files or directories exist in one command.
+
+    Each path is tested by test -e as in Exists, so the paths are expanded
+    by the shell in the same way.
+
+    Args:
+        paths: list of strings, the paths to files or directories.
+        shell: an instance of the VTS shell.
+
+    Returns:
+        set of strings, the paths that exist.
+    """
+    if not paths:
+        return set()
+    cmd = "; ".join("if test -e %s; then echo %d; fi" % (path, index)
+                    for index, path in enumerate(paths))
+    results = shell.Execute(cmd)
+    logging.debug("Shell command '%s' results: %s", cmd, results)
+
+    if results[const.EXIT_CODE][0] != 0:
+        logging.error("Failed to check paths: %s", results[const.STDERR][0])
+
+    existing_indexes = str(results[const.STDOUT][0]).split()
+    return set(paths[int(index)] for index in existing_indexes
+               if index.isdigit() and int(index) < len(paths))
+
+
 def IsDirectory(path, shell):
     """Determines if a path is a directory.
 
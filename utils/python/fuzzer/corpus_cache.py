@@ -0,0 +1,183 @@
+#
+# Copyright (C) 2019 The Android Open Source Project
+#
+# Licensed under the Apache License, Version 2.0 (the 'License');
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an 'AS IS' BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+import base64
+import binascii
+import logging
+import os
+import shutil
+import threading
+
+from vts.utils.python.gcs import gcs_api_utils
+
+# Default size limit of the cache, in bytes.
+DEFAULT_MAX_SIZE = 10 * 1024 * 1024 * 1024
+
+
+class CorpusCache(object):
+    """Content-addressed local cache of corpus seeds.
+
+    Seeds are keyed by their MD5 hash as reported by GCS and stored in
+    {cache_dir}/{first two hex digits}/{hex digest}. They are hard-linked into
+    the work directory of a test, so a seed is only downloaded the first time
+    it is seen on this host. When the cache grows beyond its size limit, the
+    least recently used seeds are evicted. Work directories keep their links
+    to evicted seeds.
+
+    Attributes:
+        _cache_dir: string, path to the cache directory.
+        _max_size: int, size limit of the cache in bytes.
+        _lock: threading.Lock, serializes Materialize and Evict calls.
+    """
+
+    def __init__(self, cache_dir, max_size=DEFAULT_MAX_SIZE):
+        self._cache_dir = cache_dir
+        self._max_size = max_size
+        self._lock = threading.Lock()
+        if not os.path.exists(cache_dir):
+            os.makedirs(cache_dir)
+
+    def _GetCachePath(self, content_hash):
+        """Returns the path of a cached seed.
+
+        Args:
+            content_hash: string, base64 encoded MD5 hash of the seed.
+
+        Returns:
+            string, path to the seed in the cache.
+        """
+        hex_digest = binascii.hexlify(
+            base64.b64decode(content_hash)).decode('ascii')
+        return os.path.join(self._cache_dir, hex_digest[:2], hex_digest)
+
+    def Contains(self, content_hash):
+        """Checks whether a seed is cached.
+
+        Args:
+            content_hash: string, base64 encoded MD5 hash of the seed.
+
+        Returns:
+            True if the seed is in the cache, False otherwise.
+        """
+        return os.path.isfile(self._GetCachePath(content_hash))
+
+    def Materialize(self, seeds, dest_dir, fetch_func):
+        """Places seeds into a work directory, fetching only uncached ones.
+
+        Args:
+            seeds: dict, remote path of each seed to its base64 encoded MD5
+                   hash. Seeds without a hash are fetched into dest_dir
+                   without being cached.
+            dest_dir: string, path to the local work directory.
+            fetch_func: function that takes a list of (remote path, local
+                        path) tuples, fetches the seeds, and returns the list
+                        of remote paths that failed. E.g.
+                        GcsApiUtils.DownloadFiles.
+
+        Returns:
+            hits: int, number of seeds found in the cache.
+            misses: int, number of seeds fetched.
+        """
+        with self._lock:
+            hits = 0
+            to_fetch = []
+            uncacheable = []
+            for remote_path, content_hash in sorted(seeds.items()):
+                dest_path = os.path.join(dest_dir,
+                                         os.path.basename(remote_path))
+                if not content_hash:
+                    uncacheable.append((remote_path, dest_path))
+                    continue
+                cache_path = self._GetCachePath(content_hash)
+                if os.path.isfile(cache_path):
+                    hits += 1
+                    os.utime(cache_path, None)
+                    _LinkOrCopy(cache_path, dest_path)
+                    continue
+                cache_subdir = os.path.dirname(cache_path)
+                if not os.path.exists(cache_subdir):
+                    os.makedirs(cache_subdir)
+                to_fetch.append((remote_path, cache_path, content_hash,
+                                 dest_path))
+
+            failed = set(
+                fetch_func([(remote_path, cache_path)
+                            for remote_path, cache_path, _, _ in to_fetch]))
+            for remote_path, cache_path, content_hash, dest_path in to_fetch:
+                if remote_path in failed or not os.path.isfile(cache_path):
+                    continue
+                if gcs_api_utils.GetLocalMd5(cache_path) != content_hash:
+                    # The seed changed after it was listed; use it, but do
+                    # not keep it under the wrong key.
+                    logging.warning('Hash mismatch for seed %s.', remote_path)
+                    shutil.move(cache_path, dest_path)
+                    continue
+                _LinkOrCopy(cache_path, dest_path)
+            fetch_func(uncacheable)
+
+            misses = len(to_fetch) + len(uncacheable)
+            logging.info('Corpus cache: %d hits, %d misses.', hits, misses)
+            self._EvictLocked()
+            return hits, misses
+
+    def Evict(self):
+        """Evicts the least recently used seeds until under the size limit."""
+        with self._lock:
+            self._EvictLocked()
+
+    def _EvictLocked(self):
+        """Implements Evict; the caller must hold _lock."""
+        entries = []
+        total_size = 0
+        for dirpath, _, filenames in os.walk(self._cache_dir):
+            for filename in filenames:
+                path = os.path.join(dirpath, filename)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, path))
+                total_size += stat.st_size
+        if total_size <= self._max_size:
+            return
+        entries.sort()
+        num_evicted = 0
+        for _, size, path in entries:
+            if total_size <= self._max_size:
+                break
+            try:
+                os.remove(path)
+            except OSError as e:
+                logging.error('Failed to evict %s: %s', path, e)
+                continue
+            total_size -= size
+            num_evicted += 1
+        logging.info('Corpus cache: evicted %d seeds.', num_evicted)
+
+
+def _LinkOrCopy(src_path, dest_path):
+    """Hard-links a file, or copies it if linking is not possible.
+
+    Args:
+        src_path: string, path to the existing file.
+        dest_path: string, path to create.
+    """
+    if os.path.lexists(dest_path):
+        os.remove(dest_path)
+    try:
+        os.link(src_path, dest_path)
+    except OSError:
+        shutil.copy(src_path, dest_path)
@@ -0,0 +1,132 @@
+#!/usr/bin/env python
+#
+# Copyright (C) 2019 The Android Open Source Project
+#
+# Licensed under the Apache License, Version 2.0 (the 'License');
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an 'AS IS' BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+import base64
+import hashlib
+import os
+import shutil
+import tempfile
+import unittest
+
+from vts.utils.python.fuzzer import corpus_cache
+
+_REMOTE_SEEDS = {
+    'corpus/seed/a': b'seed a',
+    'corpus/seed/b': b'seed b',
+    'corpus/seed/c': b'seed c',
+}
+
+
+def _Md5(content):
+    """Returns the base64 encoded MD5 hash of content."""
+    return base64.b64encode(hashlib.md5(content).digest()).decode('ascii')
+
+
+class CorpusCacheTest(unittest.TestCase):
+    """Unit tests for corpus_cache module."""
+
+    def setUp(self):
+        """Creates the cache and work directories."""
+        self._tmp_dir = tempfile.mkdtemp()
+        self._cache_dir = os.path.join(self._tmp_dir, 'cache')
+        self._fetched = []
+
+    def tearDown(self):
+        """Removes the temporary directories."""
+        shutil.rmtree(self._tmp_dir)
+
+    def _Fetch(self, file_pairs):
+        """Fake fetch function writing the content of _REMOTE_SEEDS."""
+        for remote_path, local_path in file_pairs:
+            self._fetched.append(remote_path)
+            with open(local_path, 'wb') as f:
+                f.write(_REMOTE_SEEDS[remote_path])
+        return []
+
+    def _MakeWorkDir(self, name):
+        """Creates a work directory."""
+        work_dir = os.path.join(self._tmp_dir, name)
+        os.makedirs(work_dir)
+        return work_dir
+
+    def testMaterialize(self):
+        """Tests that only new seeds are fetched and others are linked."""
+        cache = corpus_cache.CorpusCache(self._cache_dir)
+        seeds = dict((path, _Md5(content))
+                     for path, content in _REMOTE_SEEDS.items())
+
+        work_dir = self._MakeWorkDir('run1')
+        self.assertEqual(
+            cache.Materialize(seeds, work_dir, self._Fetch), (0, 3))
+        self.assertEqual(sorted(self._fetched), sorted(_REMOTE_SEEDS))
+        for path, content in _REMOTE_SEEDS.items():
+            with open(os.path.join(work_dir, os.path.basename(path)),
+                      'rb') as f:
+                self.assertEqual(f.read(), content)
+            self.assertTrue(cache.Contains(_Md5(content)))
+
+        self._fetched = []
+        work_dir = self._MakeWorkDir('run2')
+        self.assertEqual(
+            cache.Materialize(seeds, work_dir, self._Fetch), (3, 0))
+        self.assertEqual(self._fetched, [])
+        seed_path = os.path.join(work_dir, 'a')
+        cache_path = cache._GetCachePath(_Md5(b'seed a'))
+        self.assertEqual(os.stat(seed_path).st_ino,
+                         os.stat(cache_path).st_ino)
+
+    def testMaterializeWithoutHash(self):
+        """Tests that seeds without a hash are fetched but not cached."""
+        cache = corpus_cache.CorpusCache(self._cache_dir)
+        work_dir = self._MakeWorkDir('run1')
+        self.assertEqual(
+            cache.Materialize({'corpus/seed/a': None}, work_dir,
+                              self._Fetch), (0, 1))
+        self.assertTrue(os.path.isfile(os.path.join(work_dir, 'a')))
+        self.assertEqual(os.listdir(self._cache_dir), [])
+
+    def testMaterializeHashMismatch(self):
+        """Tests that a seed changed after listing is not cached."""
+        cache = corpus_cache.CorpusCache(self._cache_dir)
+        work_dir = self._MakeWorkDir('run1')
+        cache.Materialize({'corpus/seed/a': _Md5(b'old content')}, work_dir,
+                          self._Fetch)
+        with open(os.path.join(work_dir, 'a'), 'rb') as f:
+            self.assertEqual(f.read(), b'seed a')
+        self.assertFalse(cache.Contains(_Md5(b'old content')))
+
+    def testEviction(self):
+        """Tests that the least recently used seeds are evicted."""
+        cache = corpus_cache.CorpusCache(self._cache_dir, max_size=12)
+        work_dir = self._MakeWorkDir('run1')
+        cache.Materialize({'corpus/seed/a': _Md5(b'seed a')}, work_dir,
+                          self._Fetch)
+        os.utime(cache._GetCachePath(_Md5(b'seed a')), (0, 0))
+        cache.Materialize({'corpus/seed/b': _Md5(b'seed b')}, work_dir,
+                          self._Fetch)
+        os.utime(cache._GetCachePath(_Md5(b'seed b')), (1, 1))
+        cache.Materialize({'corpus/seed/c': _Md5(b'seed c')}, work_dir,
+                          self._Fetch)
+        self.assertFalse(cache.Contains(_Md5(b'seed a')))
+        self.assertTrue(cache.Contains(_Md5(b'seed b')))
+        self.assertTrue(cache.Contains(_Md5(b'seed c')))
+        # The work directory keeps the evicted seed.
+        self.assertTrue(os.path.isfile(os.path.join(work_dir, 'a')))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -22,6 +22,7 @@ import time
 import uuid
 
 from vts.runners.host import keys
+from vts.utils.python.fuzzer import corpus_cache
 from vts.utils.python.gcs import gcs_api_utils
 from vts.utils.python.web import feature_utils
 """
@@ -76,6 +77,8 @@ class CorpusManager(feature_utils.Feature):
         _gcs_api_utils: GcsApiUtils object, used to communicate with GCS.
         _gcs_path: string, path to the upper most level corpus directory in GCS.
         _device_serial: string, serial number of the current target device.
+        _corpus_cache: CorpusCache object, the local seed cache. None if
+                       no cache directory is configured.
     """
 
     _TOGGLE_PARAM = keys.ConfigKeys.IKEY_ENABLE_LOG_UPLOADING
@@ -83,7 +86,10 @@ class CorpusManager(feature_utils.Feature):
         keys.ConfigKeys.IKEY_SERVICE_JSON_PATH,
         keys.ConfigKeys.IKEY_FUZZING_GCS_BUCKET_NAME
     ]
-    _OPTIONAL_PARAMS = []
+    _OPTIONAL_PARAMS = [
+        keys.ConfigKeys.IKEY_FUZZING_CORPUS_CACHE_DIR,
+        keys.ConfigKeys.IKEY_FUZZING_CORPUS_CACHE_SIZE_MB
+    ]
 
     def __init__(self, user_params, dut):
         """Initializes the gcs util provider.
@@ -105,6 +111,18 @@ class CorpusManager(feature_utils.Feature):
                 self._key_path, self._bucket_name)
             self.enabled = self._gcs_api_utils.Enabled
 
+        self._corpus_cache = None
+        cache_dir = getattr(self, keys.ConfigKeys.IKEY_FUZZING_CORPUS_CACHE_DIR,
+                            None)
+        if self.enabled and cache_dir:
+            cache_size_mb = getattr(
+                self, keys.ConfigKeys.IKEY_FUZZING_CORPUS_CACHE_SIZE_MB, None)
+            if cache_size_mb:
+                max_size = int(cache_size_mb) * 1024 * 1024
+            else:
+                max_size = corpus_cache.DEFAULT_MAX_SIZE
+            self._corpus_cache = corpus_cache.CorpusCache(cache_dir, max_size)
+
         branch = dut.build_alias.split('.')[0]
         model = dut.product_type
         self._gcs_path = os.path.join('corpus', branch, model)
@@ -221,6 +239,10 @@ class CorpusManager(feature_utils.Feature):
             None otherwise.
         """
         corpus_seed_dir = self._GetDirPaths('corpus_seed', test_name)
+        if self._corpus_cache:
+            return self._FetchCorpusSeedDirectoryCached(
+                corpus_seed_dir, local_temp_dir)
+
         seed_count = self._gcs_api_utils.CountFiles(corpus_seed_dir)
         if seed_count == 0:
             logging.info('No corpus available to fetch from %s.',
@@ -229,13 +251,38 @@ class CorpusManager(feature_utils.Feature):
 
         logging.info('Fetching %d corpus strings from %s', seed_count,
                      corpus_seed_dir)
+        self._gcs_api_utils.DownloadDir(corpus_seed_dir, local_temp_dir)
+        return corpus_seed_dir
+
+    def _FetchCorpusSeedDirectoryCached(self, corpus_seed_dir,
+                                        local_temp_dir):
+        """Fetches a corpus seed directory through the local corpus cache.
+
+        Only seeds not in the cache are downloaded; cached seeds are
+        hard-linked into {local_temp_dir}/{test_name}_corpus_seed.
+
+        Args:
+            corpus_seed_dir: string, GCS directory of the seed directory.
+            local_temp_dir: string, path to temporary directory for this test
+                            on the host machine.
+
+        Returns:
+            corpus_seed_dir, GCS directory of the seed directory for test case
+                             if fetch was successful.
+            None otherwise.
+        """
+        seeds = self._gcs_api_utils.ListFileHashes(corpus_seed_dir)
+        if not seeds:
+            logging.info('No corpus available to fetch from %s.',
+                         corpus_seed_dir)
+            return None
+
+        logging.info('Fetching %d corpus strings from %s', len(seeds),
+                     corpus_seed_dir)
         local_dest_folder = self._gcs_api_utils.PrepareDownloadDestination(
             corpus_seed_dir, local_temp_dir)
-        for target_seed in self._gcs_api_utils.ListFilesWithPrefix(
-                corpus_seed_dir):
-            dest_file_path = os.path.join(local_dest_folder,
-                                          os.path.basename(target_seed))
-            self._gcs_api_utils.DownloadFile(target_seed, dest_file_path)
+        self._corpus_cache.Materialize(seeds, local_dest_folder,
+                                       self._gcs_api_utils.DownloadFiles)
         return corpus_seed_dir
 
     def UploadCorpusOutDir(self, test_name, local_temp_dir):
@@ -340,25 +387,74 @@ class CorpusManager(feature_utils.Feature):
             logging.error('seed in use %s does not exist', inuse_seed)
             return False
 
-    def _CorpusIsDuplicate(self, test_name, incoming_seed):
-        """Checks if the newly generated corpus is a duplicate corpus.
+    def _BuildCorpusIndex(self, test_name):
+        """Indexes the corpus of a test in every state.
+
+        Each state directory is listed once, instead of checking every
+        incoming seed against every state.
 
         Args:
             test_name: string, name of the current test.
-            incoming_seed: string, path to the incoming seed in GCS.
 
         Returns:
-            True if the incoming corpus already exists in the GCS bucket.
-            False otherwise.
+            seed_names: set of strings, file names of the existing corpus.
+            content_hashes: set of strings, MD5 hashes of the existing corpus.
         """
+        seed_names = set()
+        content_hashes = set()
         for file_type in CORPUS_STATES:
-            remote_corpus = self._GetFilePaths(file_type, test_name,
-                                               incoming_seed)
-            logging.debug(remote_corpus)
-            if self._gcs_api_utils.FileExists(remote_corpus):
-                logging.info('Corpus %s already exists.', remote_corpus)
-                return True
-        return False
+            remote_corpus_dir = self._GetDirPaths(file_type, test_name)
+            for remote_corpus, md5_hash in self._gcs_api_utils.ListFileHashes(
+                    remote_corpus_dir).items():
+                seed_names.add(os.path.basename(remote_corpus))
+                if md5_hash:
+                    content_hashes.add(md5_hash)
+        return seed_names, content_hashes
+
+    def _ClassifyIncomingSeeds(self, test_name, local_temp_dir, destination):
+        """Moves the unique incoming corpus to a destination state.
+
+        A seed is a duplicate if a corpus with the same file name or the same
+        content already exists in any state, or appeared earlier in the same
+        batch. Duplicates are deleted. Moves and deletions are issued
+        concurrently.
+
+        Args:
+            test_name: string, name of the current test.
+            local_temp_dir: string, path to temporary directory for this
+                            test on the host machine.
+            destination: string, the corpus state to move unique seeds to.
+
+        Returns:
+            num_unique_corpus: integer, number of unique corpus generated.
+        """
+        seed_names, content_hashes = self._BuildCorpusIndex(test_name)
+        incoming_child_dir = self._GetDirPaths('incoming_child', test_name,
+                                               local_temp_dir)
+        moves = []
+        duplicates = []
+        for incoming_seed, md5_hash in sorted(
+                self._gcs_api_utils.ListFileHashes(incoming_child_dir).items()):
+            seed_name = os.path.basename(incoming_seed)
+            if seed_name in seed_names or (md5_hash
+                                           and md5_hash in content_hashes):
+                logging.info('Corpus %s already exists.', incoming_seed)
+                duplicates.append(incoming_seed)
+                continue
+            seed_names.add(seed_name)
+            if md5_hash:
+                content_hashes.add(md5_hash)
+            moves.append((incoming_seed,
+                          self._GetFilePaths(destination, test_name,
+                                             incoming_seed)))
+
+        if duplicates:
+            logging.info('Deleting %d duplicate corpus.', len(duplicates))
+            self._gcs_api_utils.DeleteFiles(duplicates)
+        logging.info('%d corpus strings were classified as %s.', len(moves),
+                     destination)
+        self._gcs_api_utils.MoveFiles(moves, True)
+        return len(moves)
 
     def _ClassifyPriority(self, test_name, local_temp_dir):
         """Calls the appropriate classification algorithm.
@@ -395,25 +491,8 @@ class CorpusManager(feature_utils.Feature):
         Returns:
             num_unique_corpus: integer, number of unique corpus generated.
         """
-        incoming_child_dir = self._GetDirPaths('incoming_child', test_name,
-                                               local_temp_dir)
-        num_unique_corpus = 0
-        for incoming_seed in self._gcs_api_utils.ListFilesWithPrefix(
-                incoming_child_dir):
-            if self._CorpusIsDuplicate(test_name, incoming_seed):
-                logging.info('Deleting duplicate corpus.')
-                self._gcs_api_utils.DeleteFile(incoming_seed)
-                continue
-            num_unique_corpus += 1
-            logging.info(
-                'Corpus string %s was classified as regular priority.',
-                incoming_seed)
-            corpus_destination = self._GetFilePaths('corpus_seed', test_name,
-                                                    incoming_seed)
-            self._gcs_api_utils.MoveFile(incoming_seed, corpus_destination,
-                                         True)
-
-        return num_unique_corpus
+        return self._ClassifyIncomingSeeds(test_name, local_temp_dir,
+                                           'corpus_seed')
 
     def _ClassifyPriority2(self, test_name, local_temp_dir):
         """Classifies each of newly genereated corpus into different priorities.
@@ -433,31 +512,12 @@ class CorpusManager(feature_utils.Feature):
             self._GetDirPaths('local_corpus_trigger', test_name,
                               local_temp_dir), 'crash_report')
         high_priority = os.path.exists(triggered_corpus)
-        incoming_child_dir = self._GetDirPaths('incoming_child', test_name,
-                                               local_temp_dir)
-        num_unique_corpus = 0
-        for incoming_seed in self._gcs_api_utils.ListFilesWithPrefix(
-                incoming_child_dir):
-            if self._CorpusIsDuplicate(test_name, incoming_seed):
-                logging.info('Deleting duplicate corpus.')
-                self._gcs_api_utils.DeleteFile(incoming_seed)
-                continue
-
-            num_unique_corpus += 1
-            if high_priority:
-                logging.info(
-                    'corpus string %s was classified as high priority.',
-                    incoming_seed)
-                corpus_destination = self._GetFilePaths(
-                    'corpus_seed_high', test_name, incoming_seed)
-            else:
-                logging.info(
-                    'corpus string %s was classified as regular priority.',
-                    incoming_seed)
-                corpus_destination = self._GetFilePaths(
-                    'corpus_seed', test_name, incoming_seed)
-            self._gcs_api_utils.MoveFile(incoming_seed, corpus_destination,
-                                         True)
+        if high_priority:
+            destination = 'corpus_seed_high'
+        else:
+            destination = 'corpus_seed'
+        num_unique_corpus = self._ClassifyIncomingSeeds(
+            test_name, local_temp_dir, destination)
 
         self._UploadTriggeredCorpus(test_name, local_temp_dir)
 
@@ -559,15 +619,14 @@ class CorpusManager(feature_utils.Feature):
         else:
             logging.info('Moving %s*  to %s', src_dir, dest_dir)
 
-        num_unique_corpus = 0
         src_corpus_dir = self._GetDirPaths(src_dir, test_name, local_temp_dir)
-        for src_corpus in self._gcs_api_utils.ListFilesWithPrefix(
-                src_corpus_dir, strict=strict):
-            dest_corpus = self._GetFilePaths(dest_dir, test_name, src_corpus)
-            self._gcs_api_utils.MoveFile(src_corpus, dest_corpus, True)
-            num_unique_corpus += 1
+        moves = [(src_corpus,
+                  self._GetFilePaths(dest_dir, test_name, src_corpus))
+                 for src_corpus in self._gcs_api_utils.ListFilesWithPrefix(
+                     src_corpus_dir, strict=strict)]
+        self._gcs_api_utils.MoveFiles(moves, True)
 
-        return num_unique_corpus
+        return len(moves)
 
     def add_lock(self, test_name, local_temp_dir):
         """Adds a locking mechanism to the GCS directory.
@@ -26,6 +26,14 @@ dut.product_type = 'Pixel3_XL'
 dut.serial = 'HT1178BBZWQ'
 
 
+def simple_ListFileHashes(dir_path):
+    """mock function created for ListFileHashes"""
+    if dir_path.endswith('incoming/tmpDir1/ILight_corpus_out'):
+        return dict(('%s/file%d' % (dir_path, i), 'hash%d' % i)
+                    for i in range(1, 6))
+    return {}
+
+
 class CorpusManagerTest(unittest.TestCase):
     """Unit tests for corpus_manager module."""
 
@@ -167,11 +175,27 @@ class CorpusManagerTest(unittest.TestCase):
         _corpus_manager.add_lock = mock.MagicMock()
         res = _corpus_manager.FetchCorpusSeed('ILight', '/tmp/tmpDir1')
         self.assertEquals(res, 'directory')
-        _corpus_manager._gcs_api_utils.PrepareDownloadDestination.assert_called(
-        )
-        _corpus_manager._gcs_api_utils.ListFilesWithPrefix.assert_called_with(
-            'corpus/Pie/Pixel3_XL/ILight/ILight_corpus_seed')
-        _corpus_manager._gcs_api_utils.DownloadFile.assert_called()
+        _corpus_manager._gcs_api_utils.DownloadDir.assert_called_with(
+            'corpus/Pie/Pixel3_XL/ILight/ILight_corpus_seed', '/tmp/tmpDir1')
+
+    def testFetchCorpusSeedDirectoryCached(self):
+        """Tests that the seed directory is fetched through the cache."""
+        _corpus_manager = corpus_manager.CorpusManager({}, dut)
+        _corpus_manager.enabled = True
+        _corpus_manager._gcs_api_utils = mock.MagicMock()
+        _corpus_manager._gcs_api_utils.ListFileHashes.return_value = {
+            'dir/file1': 'hash1'
+        }
+        _corpus_manager._gcs_api_utils.PrepareDownloadDestination.return_value = (
+            '/tmp/tmpDir1/ILight_corpus_seed')
+        _corpus_manager._corpus_cache = mock.MagicMock()
+        res = _corpus_manager._FetchCorpusSeedDirectory('ILight',
+                                                        '/tmp/tmpDir1')
+        self.assertEquals(res, 'corpus/Pie/Pixel3_XL/ILight/ILight_corpus_seed')
+        _corpus_manager._corpus_cache.Materialize.assert_called_with(
+            {'dir/file1': 'hash1'}, '/tmp/tmpDir1/ILight_corpus_seed',
+            _corpus_manager._gcs_api_utils.DownloadFiles)
+        _corpus_manager._gcs_api_utils.DownloadDir.assert_not_called()
 
     def testUploadCorpusOutDir(self):
         """Tests the UploadCorpusOutDir function of a CorpusManager object."""
@@ -227,16 +251,58 @@ class CorpusManagerTest(unittest.TestCase):
         _corpus_manager = corpus_manager.CorpusManager({}, dut)
         _corpus_manager.enabled = True
         _corpus_manager._gcs_api_utils = mock.MagicMock()
-        _corpus_manager._gcs_api_utils.ListFilesWithPrefix.return_value = [
-            'dir/file1', 'dir/file2', 'dir/file3', 'dir/file4', 'dir/file5'
-        ]
-        _corpus_manager._CorpusIsDuplicate = mock.MagicMock()
-        _corpus_manager._CorpusIsDuplicate.return_value = False
-        _corpus_manager._ClassifyPriority1('ILight', '/tmp/tmpDir1')
-        _corpus_manager._gcs_api_utils.ListFilesWithPrefix.assert_called_with(
+        _corpus_manager._gcs_api_utils.ListFileHashes.side_effect = (
+            simple_ListFileHashes)
+        num_unique_corpus = _corpus_manager._ClassifyPriority1(
+            'ILight', '/tmp/tmpDir1')
+        _corpus_manager._gcs_api_utils.ListFileHashes.assert_called_with(
             'corpus/Pie/Pixel3_XL/ILight/incoming/tmpDir1/ILight_corpus_out')
-        self.assertEquals(_corpus_manager._gcs_api_utils.MoveFile.call_count,
-                          5)
+        self.assertEquals(num_unique_corpus, 5)
+        moves = _corpus_manager._gcs_api_utils.MoveFiles.call_args[0][0]
+        self.assertEquals(len(moves), 5)
+        self.assertEquals(
+            moves[0],
+            ('corpus/Pie/Pixel3_XL/ILight/incoming/tmpDir1/ILight_corpus_out/file1',
+             'corpus/Pie/Pixel3_XL/ILight/ILight_corpus_seed/file1'))
+        _corpus_manager._gcs_api_utils.DeleteFiles.assert_not_called()
+
+    def test_ClassifyPriority1Duplicates(self):
+        """Tests that _ClassifyPriority1 deletes duplicate corpus."""
+        corpus_manager.SCHEDULING_ALGORITHM = 1
+        _corpus_manager = corpus_manager.CorpusManager({}, dut)
+        _corpus_manager.enabled = True
+        _corpus_manager._gcs_api_utils = mock.MagicMock()
+        incoming_dir = (
+            'corpus/Pie/Pixel3_XL/ILight/incoming/tmpDir1/ILight_corpus_out')
+        seed_dir = 'corpus/Pie/Pixel3_XL/ILight/ILight_corpus_seed'
+        remote_files = {
+            incoming_dir: {
+                incoming_dir + '/file1': 'hash1',
+                incoming_dir + '/file2': 'hash2',
+                incoming_dir + '/file3': 'hash3',
+                incoming_dir + '/file4': 'hash3',
+            },
+            seed_dir: {
+                seed_dir + '/file1': 'hash1',
+                seed_dir + '/renamed': 'hash2',
+            },
+        }
+        _corpus_manager._gcs_api_utils.ListFileHashes.side_effect = (
+            lambda dir_path: remote_files.get(dir_path, {}))
+        num_unique_corpus = _corpus_manager._ClassifyPriority1(
+            'ILight', '/tmp/tmpDir1')
+        self.assertEquals(num_unique_corpus, 1)
+        _corpus_manager._gcs_api_utils.DeleteFiles.assert_called_with([
+            incoming_dir + '/file1', incoming_dir + '/file2',
+            incoming_dir + '/file4'
+        ])
+        _corpus_manager._gcs_api_utils.MoveFiles.assert_called_with(
+            [(incoming_dir + '/file3', seed_dir + '/file3')], True)
+        # Each corpus state and the incoming directory are listed once.
+        self.assertEquals(
+            _corpus_manager._gcs_api_utils.ListFileHashes.call_count,
+            len(corpus_manager.CORPUS_STATES) + 1)
+        _corpus_manager._gcs_api_utils.FileExists.assert_not_called()
 
     def test_ClassifyPriority2(self):
         """Tests the _ClassifyPriority2 function of a CorpusManager object."""
@@ -246,16 +312,15 @@ class CorpusManagerTest(unittest.TestCase):
         _corpus_manager = corpus_manager.CorpusManager({}, dut)
         _corpus_manager.enabled = True
         _corpus_manager._gcs_api_utils = mock.MagicMock()
-        _corpus_manager._gcs_api_utils.ListFilesWithPrefix.return_value = [
-            'dir/file1', 'dir/file2', 'dir/file3', 'dir/file4', 'dir/file5'
-        ]
-        _corpus_manager._CorpusIsDuplicate = mock.MagicMock()
-        _corpus_manager._CorpusIsDuplicate.return_value = False
-        _corpus_manager._ClassifyPriority2('ILight', '/tmp/tmpDir1')
-        _corpus_manager._gcs_api_utils.ListFilesWithPrefix.assert_called_with(
+        _corpus_manager._gcs_api_utils.ListFileHashes.side_effect = (
+            simple_ListFileHashes)
+        num_unique_corpus = _corpus_manager._ClassifyPriority2(
+            'ILight', '/tmp/tmpDir1')
+        _corpus_manager._gcs_api_utils.ListFileHashes.assert_called_with(
             'corpus/Pie/Pixel3_XL/ILight/incoming/tmpDir1/ILight_corpus_out')
-        self.assertEquals(_corpus_manager._gcs_api_utils.MoveFile.call_count,
-                          5)
+        self.assertEquals(num_unique_corpus, 5)
+        moves = _corpus_manager._gcs_api_utils.MoveFiles.call_args[0][0]
+        self.assertEquals(len(moves), 5)
 
     def test_ClassifyPriority3(self):
         """Tests the _ClassifyPriority3 function of a CorpusManager object."""
@@ -284,12 +349,13 @@ class CorpusManagerTest(unittest.TestCase):
         _corpus_manager._gcs_api_utils.ListFilesWithPrefix.return_value = [
             'dir/file1', 'dir/file2', 'dir/file3', 'dir/file4', 'dir/file5'
         ]
-        _corpus_manager._MoveCorpusDirectory('ILight', '/tmp/tmpDir1',
-                                             'corpus_seed', 'corpus_complete')
+        num_unique_corpus = _corpus_manager._MoveCorpusDirectory(
+            'ILight', '/tmp/tmpDir1', 'corpus_seed', 'corpus_complete')
         _corpus_manager._gcs_api_utils.ListFilesWithPrefix.assert_called_with(
             'corpus/Pie/Pixel3_XL/ILight/ILight_corpus_seed', strict=True)
-        self.assertEquals(_corpus_manager._gcs_api_utils.MoveFile.call_count,
-                          5)
+        self.assertEquals(num_unique_corpus, 5)
+        moves = _corpus_manager._gcs_api_utils.MoveFiles.call_args[0][0]
+        self.assertEquals(len(moves), 5)
 
     def test_GetDirPaths(self):
         """Tests the _GetDirPaths function of a CorpusManager object."""
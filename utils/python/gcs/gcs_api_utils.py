@@ -14,10 +14,15 @@
 # limitations under the License.
 #
 
+import base64
+import concurrent.futures
 import google.auth
+import hashlib
 import logging
 import os
+import threading
 
+from google.auth import credentials as auth_credentials
 from google.cloud import exceptions
 from google.cloud import storage
 
@@ -25,6 +30,13 @@ from google.cloud import storage
 _GOOGLE_CRED_ENV_VAR = 'GOOGLE_APPLICATION_CREDENTIALS'
 # URL to the Google Cloud storage authentication.
 _READ_WRITE_SCOPE_URL = 'https://www.googleapis.com/auth/devstorage.read_write'
+# Default number of concurrent blob transfers in UploadDir and DownloadDir.
+DEFAULT_MAX_WORKERS = 16
+# Files larger than this are uploaded in chunks of this size, so that a
+# failed chunk is retried instead of the whole file.
+_RESUMABLE_CHUNK_SIZE = 8 * 1024 * 1024
+# Suffix of the temporary file a blob is downloaded to before it is renamed.
+_PARTIAL_DOWNLOAD_SUFFIX = '.part'
 
 
 class GcsApiUtils(object):
@@ -36,13 +48,41 @@ class GcsApiUtils(object):
         _credentials: credentials object for the service account.
         _project: string, Google Cloud project name of the service account.
         _enabled: boolean, whether this GcsApiUtils object is enabled.
+        _api_endpoint: string, URL of the GCS API endpoint. None means the
+                       default endpoint.
+        _max_workers: int, number of concurrent blob transfers.
+        _bucket: the storage.Bucket object shared by all calls.
+        _bucket_lock: threading.Lock, guards the creation of _bucket.
     """
 
-    def __init__(self, key_path, bucket_name):
+    def __init__(self,
+                 key_path,
+                 bucket_name,
+                 api_endpoint=None,
+                 max_workers=DEFAULT_MAX_WORKERS):
+        """Initializes the credentials.
+
+        Args:
+            key_path: string, path to the JSON key file of the service
+                      account. Ignored if api_endpoint is given.
+            bucket_name: string, Google Cloud Storage bucket name.
+            api_endpoint: string, URL of a GCS compatible endpoint, e.g. a
+                          local fake GCS server. Anonymous credentials are
+                          used with it.
+            max_workers: int, number of concurrent blob transfers.
+        """
         self._key_path = key_path
         self._bucket_name = bucket_name
-        os.environ[_GOOGLE_CRED_ENV_VAR] = key_path
+        self._api_endpoint = api_endpoint
+        self._max_workers = max_workers
+        self._bucket = None
+        self._bucket_lock = threading.Lock()
         self._enabled = True
+        if api_endpoint:
+            self._credentials = auth_credentials.AnonymousCredentials()
+            self._project = None
+            return
+        os.environ[_GOOGLE_CRED_ENV_VAR] = key_path
         try:
             self._credentials, self._project = google.auth.default()
             if self._credentials.requires_scopes:
@@ -66,6 +106,85 @@ class GcsApiUtils(object):
         """Sets private variable _enabled."""
         self._enabled = enabled
 
+    def _GetBucket(self):
+        """Returns the bucket object, creating the client on first use.
+
+        The client and bucket are shared by all calls and transfer threads
+        instead of being created for every file.
+
+        Returns:
+            storage.Bucket object.
+        """
+        with self._bucket_lock:
+            if self._bucket is None:
+                if self._api_endpoint:
+                    client = storage.Client(
+                        project=self._project,
+                        credentials=self._credentials,
+                        client_options={'api_endpoint': self._api_endpoint})
+                else:
+                    client = storage.Client(credentials=self._credentials)
+                self._bucket = client.get_bucket(self._bucket_name)
+            return self._bucket
+
+    def _ListBlobs(self, dir_path):
+        """Returns the blobs under a given GCS directory, keyed by name.
+
+        Args:
+            dir_path: string, path to the GCS directory of interest.
+
+        Returns:
+            dict, blob name to storage.Blob object.
+        """
+        if not dir_path.endswith('/'):
+            dir_path += '/'
+        return dict((blob.name, blob)
+                    for blob in self._GetBucket().list_blobs(prefix=dir_path))
+
+    def _MapConcurrently(self, func, items):
+        """Calls a function on each item on a thread pool.
+
+        Args:
+            func: function that takes one item.
+            items: list of the items.
+
+        Returns:
+            list of the return values, in the order of items.
+        """
+        if not items:
+            return []
+        with concurrent.futures.ThreadPoolExecutor(
+                max_workers=min(self._max_workers, len(items))) as executor:
+            return list(executor.map(func, items))
+
+    def _RunTransfers(self, transfer_func, file_pairs):
+        """Runs blob transfers concurrently.
+
+        Args:
+            transfer_func: function that takes a source and a destination
+                           path, e.g. UploadFile or DownloadFile.
+            file_pairs: list of (source path, destination path) tuples.
+
+        Returns:
+            list of the source paths whose transfer failed.
+        """
+        failed = []
+        if not file_pairs:
+            return failed
+        with concurrent.futures.ThreadPoolExecutor(
+                max_workers=self._max_workers) as executor:
+            future_to_src = dict(
+                (executor.submit(transfer_func, src, dest), src)
+                for src, dest in file_pairs)
+            for future in concurrent.futures.as_completed(future_to_src):
+                src = future_to_src[future]
+                try:
+                    future.result()
+                except Exception as e:
+                    logging.error('transfer failed for file %s: %s', src, e)
+                    failed.append(src)
+        return failed
+
     def ListFilesWithPrefix(self, dir_path, strict=True):
         """Returns a list of files under a given GCS prefix.
 
@@ -111,11 +230,32 @@ class GcsApiUtils(object):
 
         if strict and not dir_path.endswith('/'):
             dir_path += '/'
-        client = storage.Client(credentials=self._credentials)
-        bucket = client.get_bucket(self._bucket_name)
-        dir_list = list(bucket.list_blobs(prefix=dir_path))
+        dir_list = list(self._GetBucket().list_blobs(prefix=dir_path))
         return [file.name for file in dir_list]
 
+    def ListFileHashes(self, dir_path, strict=True):
+        """Returns the MD5 hashes of the files under a given GCS prefix.
+
+        Unlike calling FileExists per file, this makes one listing request
+        per page of files.
+
+        Args:
+            dir_path: path to the GCS directory of interest.
+            strict: boolean, whether to list only the files in dir_path.
+                    See ListFilesWithPrefix.
+
+        Returns:
+            dict, absolute path filename to its base64 encoded MD5 hash.
+        """
+        if not self._enabled:
+            logging.error('This GcsApiUtils object is not enabled.')
+            return {}
+
+        if strict and not dir_path.endswith('/'):
+            dir_path += '/'
+        return dict((blob.name, blob.md5_hash)
+                    for blob in self._GetBucket().list_blobs(prefix=dir_path))
+
     def CountFiles(self, dir_path):
         """Counts the number of files under a given GCS prefix.
 
@@ -161,9 +301,7 @@ class GcsApiUtils(object):
             logging.error('This GcsApiUtils object is not enabled.')
             return False
 
-        client = storage.Client(credentials=self._credentials)
-        bucket = client.get_bucket(self._bucket_name)
-        blob = bucket.blob(file_path)
+        blob = self._GetBucket().blob(file_path)
         return blob.exists()
 
     def DownloadFile(self, src_file_path, dest_file_path):
@@ -180,10 +318,16 @@ class GcsApiUtils(object):
             logging.error('This GcsApiUtils object is not enabled.')
             return
 
-        client = storage.Client(credentials=self._credentials)
-        bucket = client.get_bucket(self._bucket_name)
-        blob = bucket.blob(src_file_path)
-        blob.download_to_filename(dest_file_path)
+        blob = self._GetBucket().blob(src_file_path)
+        # Download to a temporary file so that an interrupted download never
+        # leaves a truncated file at the destination.
+        partial_file_path = dest_file_path + _PARTIAL_DOWNLOAD_SUFFIX
+        try:
+            blob.download_to_filename(partial_file_path)
+            os.rename(partial_file_path, dest_file_path)
+        finally:
+            if os.path.exists(partial_file_path):
+                os.remove(partial_file_path)
         logging.info('File %s downloaded to %s.', src_file_path,
                      dest_file_path)
 
@@ -209,6 +353,10 @@ class GcsApiUtils(object):
     def DownloadDir(self, src_dir, dest_dir):
         """Downloads a GCS src directory to a local dest dir.
 
+        Files are downloaded concurrently. A local file whose MD5 hash
+        matches the blob is kept, so a re-run of an interrupted download
+        only fetches the missing files.
+
         Args:
             src_dir: source directory, directory in GCS.
             dest_dir: destination directory, directory in local.
@@ -224,26 +372,47 @@ class GcsApiUtils(object):
             logging.error('This GcsApiUtils object is not enabled.')
             return False
 
-        if self.PrefixExists(src_dir):
+        blobs = self._ListBlobs(src_dir)
+        if blobs:
             logging.info('successfully found the GCS directory.')
             self.PrepareDownloadDestination(src_dir, dest_dir)
-            filelist = self.ListFilesWithPrefix(src_dir)
-            for src_file_path in filelist:
+            file_pairs = []
+            for src_file_path, blob in sorted(blobs.items()):
                 dest_file_path = os.path.join(
                     dest_dir,
                     os.path.join(
                         os.path.basename(src_dir),
                         os.path.basename(src_file_path)))
-                try:
-                    self.DownloadFile(src_file_path, dest_file_path)
-                except exceptions.NotFound as e:
-                    logging.error('download failed for file: %s',
-                                  src_file_path)
+                if (os.path.isfile(dest_file_path)
+                        and GetLocalMd5(dest_file_path) == blob.md5_hash):
+                    logging.debug('skipping up-to-date file: %s',
+                                  dest_file_path)
+                    continue
+                file_pairs.append((src_file_path, dest_file_path))
+            for src_file_path in self._RunTransfers(self.DownloadFile,
+                                                    file_pairs):
+                logging.error('download failed for file: %s', src_file_path)
             return True
         else:
             logging.error('requested GCS directory does not exist.')
             return False
 
+    def DownloadFiles(self, file_pairs):
+        """Downloads files concurrently.
+
+        Args:
+            file_pairs: list of (source path in GCS, destination path in
+                        local) tuples.
+
+        Returns:
+            list of the source paths whose download failed.
+        """
+        if not self._enabled:
+            logging.error('This GcsApiUtils object is not enabled.')
+            return [src for src, _ in file_pairs]
+
+        return self._RunTransfers(self.DownloadFile, file_pairs)
+
     def UploadFile(self, src_file_path, dest_file_path):
         """Uploads a file to a GCS bucket.
 
@@ -255,15 +424,19 @@ class GcsApiUtils(object):
             logging.error('This GcsApiUtils object is not enabled.')
             return
 
-        client = storage.Client(credentials=self._credentials)
-        bucket = client.get_bucket(self._bucket_name)
-        blob = bucket.blob(dest_file_path)
+        blob = self._GetBucket().blob(dest_file_path)
+        if os.path.getsize(src_file_path) > _RESUMABLE_CHUNK_SIZE:
+            blob.chunk_size = _RESUMABLE_CHUNK_SIZE
         blob.upload_from_filename(src_file_path)
         logging.info('File %s uploaded to %s.', src_file_path, dest_file_path)
 
     def UploadDir(self, src_dir, dest_dir):
         """Uploads a local src dir to a GCS dest dir.
 
+        Files are uploaded concurrently. A file whose MD5 hash matches the
+        existing blob is skipped, so a re-run of an interrupted upload only
+        sends the remaining files.
+
         Args:
            src_dir: source directory, directory in local.
            dest_dir: destination directory, directory in GCS.
@@ -279,13 +452,23 @@ class GcsApiUtils(object):
         if os.path.exists(src_dir):
             logging.info('successfully found the local directory.')
             src_basedir = os.path.basename(src_dir)
+            remote_blobs = self._ListBlobs(os.path.join(dest_dir, src_basedir))
+            file_pairs = []
             for dirpath, _, filenames in os.walk(src_dir):
                 for filename in filenames:
                     src_file_path = os.path.join(dirpath, filename)
                     dest_file_path = os.path.join(
                         dest_dir, src_file_path.replace(src_dir, src_basedir))
-                    self.UploadFile(src_file_path, dest_file_path)
-            return True
+                    blob = remote_blobs.get(dest_file_path)
+                    if blob and blob.md5_hash == GetLocalMd5(src_file_path):
+                        logging.debug('skipping up-to-date file: %s',
+                                      src_file_path)
+                        continue
+                    file_pairs.append((src_file_path, dest_file_path))
+            failed = self._RunTransfers(self.UploadFile, file_pairs)
+            for src_file_path in failed:
+                logging.error('upload failed for file: %s', src_file_path)
+            return not failed
         else:
             logging.error('requested local directory does not exist.')
             return False
@@ -304,8 +487,7 @@ class GcsApiUtils(object):
             logging.error('This GcsApiUtils object is not enabled.')
             return False
 
-        client = storage.Client(credentials=self._credentials)
-        bucket = client.get_bucket(self._bucket_name)
+        bucket = self._GetBucket()
         blob = bucket.blob(src_file_path)
         try:
             new_blob = bucket.rename_blob(blob, dest_file_path)
@@ -329,12 +511,61 @@ class GcsApiUtils(object):
             logging.error('This GcsApiUtils object is not enabled.')
             return False
 
-        client = storage.Client(credentials=self._credentials)
-        bucket = client.get_bucket(self._bucket_name)
-        blob = bucket.blob(file_path)
+        blob = self._GetBucket().blob(file_path)
         try:
             blob.delete()
         except exceptions.NotFound as e:
             logging.exception('file delete was unsuccessful with error %s.', e)
             return False
         return True
+
+    def MoveFiles(self, file_pairs, log_error=True):
+        """Renames blobs concurrently.
+
+        Args:
+            file_pairs: list of (source path, destination path) tuples in GCS.
+            log_error: boolean, whether to log failed moves.
+
+        Returns:
+            list of booleans, whether each move was successful, in the order
+            of file_pairs.
+        """
+        if not self._enabled:
+            logging.error('This GcsApiUtils object is not enabled.')
+            return [False] * len(file_pairs)
+
+        return self._MapConcurrently(
+            lambda pair: self.MoveFile(pair[0], pair[1], log_error),
+            file_pairs)
+
+    def DeleteFiles(self, file_paths):
+        """Deletes blobs concurrently.
+
+        Args:
+            file_paths: list of strings, paths to the files to remove.
+
+        Returns:
+            list of booleans, whether each deletion was successful, in the
+            order of file_paths.
+        """
+        if not self._enabled:
+            logging.error('This GcsApiUtils object is not enabled.')
+            return [False] * len(file_paths)
+
+        return self._MapConcurrently(self.DeleteFile, file_paths)
+
+
+def GetLocalMd5(file_path):
+    """Computes the MD5 hash of a local file in the format GCS reports it.
+
+    Args:
+        file_path: string, path to the local file.
+
+    Returns:
+        string, base64 encoded MD5 digest of the file.
+    """
+    md5 = hashlib.md5()
+    with open(file_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            md5.update(chunk)
+    return base64.b64encode(md5.digest()).decode('ascii')
@@ -16,6 +16,8 @@
 #
 
 import os
+import shutil
+import tempfile
 import unittest
 
 try:
@@ -38,21 +40,6 @@ def simple_ListFilesWithPrefix(dir_path):
     ]
 
 
-def simple_DownloadFile(src_file_path, dest_file_path):
-    return None
-
-
-def simple_UploadFile(src_file_path, dest_file_path):
-    return None
-
-
-def simple_PrefixExists(dir_path):
-    if dir_path is 'valid_source_dir':
-        return True
-    else:
-        return False
-
-
 def simple_os_path_exists(path):
     return True
 
@@ -61,10 +48,6 @@ def simple__init__(key_path, bucket_name):
     return None
 
 
-def simple_PrepareDownloadDestination(src_dir, dest_dir):
-    return os.path.join(dest_dir, os.path.basename(src_dir))
-
-
 class GcsApiUtilsTest(unittest.TestCase):
     """Unit tests for gcs_utils module."""
 
@@ -112,47 +95,128 @@ class GcsApiUtilsTest(unittest.TestCase):
             'corpus/ILight/ILight_corpus_seed', 'tmp/tmp4772')
         self.assertEqual(local_dest_folder, 'tmp/tmp4772/ILight_corpus_seed')
 
-    @mock.patch(
-        'vts.utils.python.gcs.gcs_api_utils.GcsApiUtils.DownloadFile',
-        side_effect=simple_DownloadFile)
-    @mock.patch(
-        'vts.utils.python.gcs.gcs_api_utils.GcsApiUtils.PrefixExists',
-        side_effect=simple_PrefixExists)
-    @mock.patch(
-        'vts.utils.python.gcs.gcs_api_utils.GcsApiUtils.ListFilesWithPrefix',
-        side_effect=simple_ListFilesWithPrefix)
-    @mock.patch(
-        'vts.utils.python.gcs.gcs_api_utils.GcsApiUtils.PrepareDownloadDestination',
-        side_effect=simple_PrepareDownloadDestination)
-    @mock.patch(
-        'vts.utils.python.gcs.gcs_api_utils.GcsApiUtils.__init__',
-        side_effect=simple__init__)
-    def testDownloadDir(self, simple__init__,
-                        simple_PrepareDownloadDestination,
-                        simple_ListFilesWithPrefix, simple_PrefixExists,
-                        simple_DownloadFile):
+    def _CreateFakeBlob(self, name, md5_hash=None):
+        """Creates a mock blob with the given name and MD5 hash."""
+        blob = mock.MagicMock()
+        blob.name = name
+        blob.md5_hash = md5_hash
+        return blob
+
+    def _CreateLocalDir(self, files):
+        """Creates a temporary local directory with the given files.
+
+        Args:
+            files: dict, file name to content.
+
+        Returns:
+            string, path to the created directory.
+        """
+        tmp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmp_dir)
+        src_dir = os.path.join(tmp_dir, 'src')
+        os.makedirs(src_dir)
+        for name, content in files.items():
+            with open(os.path.join(src_dir, name), 'wb') as f:
+                f.write(content)
+        return src_dir
+
+    @mock.patch('vts.utils.python.gcs.gcs_api_utils.GcsApiUtils.DownloadFile')
+    @mock.patch('vts.utils.python.gcs.gcs_api_utils.GcsApiUtils._ListBlobs')
+    def testDownloadDir(self, mock_ListBlobs, mock_DownloadFile):
         """Tests the DownloadDir function"""
-        _gcs_api_utils = gcs_api_utils.GcsApiUtils('key/path', 'vts-fuzz')
-        _gcs_api_utils.DownloadDir('valid_source_dir',
-                                   'local_destination/dest')
-        num_DownloadFile_called = simple_DownloadFile.call_count
-        self.assertEqual(num_DownloadFile_called, 4)
-        local_dest_folder = simple_PrepareDownloadDestination.return_value
-
-    @mock.patch(
-        'vts.utils.python.gcs.gcs_api_utils.GcsApiUtils.UploadFile',
-        side_effect=simple_UploadFile)
-    @mock.patch('os.path.exists', side_effect=simple_os_path_exists)
-    @mock.patch('os.listdir', side_effect=simple_ListFilesWithPrefix)
-    @mock.patch(
-        'vts.utils.python.gcs.gcs_api_utils.GcsApiUtils.__init__',
-        side_effect=simple__init__)
-    def testUploadDir(self, simple__init__, simple_ListFilesWithPrefix,
-                      simple_os_path_exists, simple_UploadFile):
-        _gcs_api_utils = gcs_api_utils.GcsApiUtils('key/path', 'vts-fuzz')
-        _gcs_api_utils.UploadDir('valid_source_dir', 'GCS_destination/dest')
-        num_UploadFile_called = simple_UploadFile.call_count
-        self.assertEqual(num_UploadFile_called, 4)
+        dest_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, dest_dir)
+        mock_ListBlobs.return_value = dict(
+            ('valid_source_dir/file%d' % i,
+             self._CreateFakeBlob('valid_source_dir/file%d' % i))
+            for i in range(4))
+        _gcs_api_utils = gcs_api_utils.GcsApiUtils(
+            None, 'vts-fuzz', api_endpoint='http://localhost:4443')
+        self.assertTrue(
+            _gcs_api_utils.DownloadDir('valid_source_dir', dest_dir))
+        self.assertEqual(mock_DownloadFile.call_count, 4)
+        mock_DownloadFile.assert_any_call(
+            'valid_source_dir/file0',
+            os.path.join(dest_dir, 'valid_source_dir', 'file0'))
+
+    @mock.patch('vts.utils.python.gcs.gcs_api_utils.GcsApiUtils.DownloadFile')
+    @mock.patch('vts.utils.python.gcs.gcs_api_utils.GcsApiUtils._ListBlobs')
+    def testDownloadDirResume(self, mock_ListBlobs, mock_DownloadFile):
+        """Tests that DownloadDir skips files already downloaded."""
+        src_dir = self._CreateLocalDir({'file0': b'seed0'})
+        dest_dir = os.path.dirname(src_dir)
+        mock_ListBlobs.return_value = {
+            'src/file0': self._CreateFakeBlob(
+                'src/file0',
+                gcs_api_utils.GetLocalMd5(os.path.join(src_dir, 'file0'))),
+            'src/file1': self._CreateFakeBlob('src/file1', 'md5'),
+        }
+        _gcs_api_utils = gcs_api_utils.GcsApiUtils(
+            None, 'vts-fuzz', api_endpoint='http://localhost:4443')
+        self.assertTrue(_gcs_api_utils.DownloadDir('src', dest_dir))
+        mock_DownloadFile.assert_called_once_with(
+            'src/file1', os.path.join(dest_dir, 'src', 'file1'))
+
+    @mock.patch('vts.utils.python.gcs.gcs_api_utils.GcsApiUtils.UploadFile')
+    @mock.patch('vts.utils.python.gcs.gcs_api_utils.GcsApiUtils._ListBlobs')
+    def testUploadDir(self, mock_ListBlobs, mock_UploadFile):
+        """Tests the UploadDir function."""
+        src_dir = self._CreateLocalDir(
+            dict(('file%d' % i, b'seed%d' % i) for i in range(4)))
+        mock_ListBlobs.return_value = {}
+        _gcs_api_utils = gcs_api_utils.GcsApiUtils(
+            None, 'vts-fuzz', api_endpoint='http://localhost:4443')
+        self.assertTrue(_gcs_api_utils.UploadDir(src_dir, 'GCS_destination'))
+        self.assertEqual(mock_UploadFile.call_count, 4)
+        mock_UploadFile.assert_any_call(
+            os.path.join(src_dir, 'file0'), 'GCS_destination/src/file0')
+
+    @mock.patch('vts.utils.python.gcs.gcs_api_utils.GcsApiUtils.UploadFile')
+    @mock.patch('vts.utils.python.gcs.gcs_api_utils.GcsApiUtils._ListBlobs')
+    def testUploadDirResume(self, mock_ListBlobs, mock_UploadFile):
+        """Tests that UploadDir skips files already uploaded."""
+        src_dir = self._CreateLocalDir({'file0': b'seed0', 'file1': b'seed1'})
+        mock_ListBlobs.return_value = {
+            'GCS_destination/src/file0': self._CreateFakeBlob(
+                'GCS_destination/src/file0',
+                gcs_api_utils.GetLocalMd5(os.path.join(src_dir, 'file0'))),
+        }
+        _gcs_api_utils = gcs_api_utils.GcsApiUtils(
+            None, 'vts-fuzz', api_endpoint='http://localhost:4443')
+        self.assertTrue(_gcs_api_utils.UploadDir(src_dir, 'GCS_destination'))
+        mock_UploadFile.assert_called_once_with(
+            os.path.join(src_dir, 'file1'), 'GCS_destination/src/file1')
+
+    @mock.patch('vts.utils.python.gcs.gcs_api_utils.storage.Client')
+    def testSharedClient(self, mock_Client):
+        """Tests that the client and bucket are created only once."""
+        _gcs_api_utils = gcs_api_utils.GcsApiUtils(
+            None, 'vts-fuzz', api_endpoint='http://localhost:4443')
+        _gcs_api_utils.FileExists('corpus/file1')
+        _gcs_api_utils.DeleteFile('corpus/file1')
+        _gcs_api_utils.MoveFile('corpus/file2', 'corpus/file3')
+        mock_Client.assert_called_once()
+        self.assertEqual(
+            mock_Client.call_args[1]['client_options'],
+            {'api_endpoint': 'http://localhost:4443'})
+        mock_Client.return_value.get_bucket.assert_called_once_with(
+            'vts-fuzz')
+
+    @mock.patch('vts.utils.python.gcs.gcs_api_utils.GcsApiUtils.DeleteFile')
+    @mock.patch('vts.utils.python.gcs.gcs_api_utils.GcsApiUtils.MoveFile')
+    def testMoveAndDeleteFiles(self, mock_MoveFile, mock_DeleteFile):
+        """Tests that batch results are returned in the order of the input."""
+        mock_MoveFile.side_effect = lambda src, dest, log_error: src != 'b'
+        mock_DeleteFile.side_effect = lambda path: path == 'b'
+        _gcs_api_utils = gcs_api_utils.GcsApiUtils(
+            None, 'vts-fuzz', api_endpoint='http://localhost:4443')
+        self.assertEqual(
+            _gcs_api_utils.MoveFiles([('a', 'x'), ('b', 'y'), ('c', 'z')]),
+            [True, False, True])
+        self.assertEqual(mock_MoveFile.call_count, 3)
+        self.assertEqual(
+            _gcs_api_utils.DeleteFiles(['a', 'b']), [False, True])
+        self.assertEqual(_gcs_api_utils.MoveFiles([]), [])
 
     @mock.patch(
         'vts.utils.python.gcs.gcs_api_utils.google.auth.default',
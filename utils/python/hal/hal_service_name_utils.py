@@ -19,11 +19,26 @@ import logging
 
 from vts.runners.host import asserts
 from vts.runners.host import const
+from vts.utils.python.precondition import precondition_cache
 
 VTS_TESTABILITY_CHECKER_32 = "/data/local/tmp/vts_testability_checker32"
 VTS_TESTABILITY_CHECKER_64 = "/data/local/tmp/vts_testability_checker64"
 
 
+def _GetTestabilityCacheKey(hal, bitness, run_as_compliance_test):
+    """Returns the key of a testability check in PreconditionCache."""
+    return "testability %s %s %s" % (hal, bitness, run_as_compliance_test)
+
+
+def _ToTestability(cached):
+    """Converts a cached [testable, instances] list to the returned tuple."""
+    testable, instances = cached
+    if testable:
+        return True, set(instances)
+    else:
+        return False, ()
+
+
 def GetHalServiceName(shell, hal, bitness="64", run_as_compliance_test=False):
     """Determine whether to run a VTS test against a HAL and get the service
     names of the given hal if determine to run.
@@ -39,27 +54,73 @@ def GetHalServiceName(shell, hal, bitness="64", run_as_compliance_test=False):
         a boolean whether to run the test against the given hal.
         a set containing all service names for the given HAL.
     """
+    return GetHalServiceNames(shell, [hal], bitness,
+                              run_as_compliance_test)[hal]
+
+
+def GetHalServiceNames(shell, hals, bitness="64", run_as_compliance_test=False):
+    """Determine whether to run VTS tests against HALs and get their service
+    names.
+
+    vts_testability_checker runs once per HAL per boot of the device. The
+    results are shared by the test modules through PreconditionCache. The
+    HALs which have not been checked are checked in one shell call.
+
+    Args:
+        shell: the ShellMirrorObject to execute command on the device.
+        hals: list of strings, the FQNames of HAL services.
+        bitness: string, the bitness of the test.
+        run_as_compliance_test: boolean, whether it is a compliance test.
+
+    Returns:
+        dict, HAL FQName to the tuple returned by GetHalServiceName.
+    """
+    cache = precondition_cache.GetCache(shell)
+    results = {}
+    unchecked_hals = []
+    for hal in hals:
+        cached = None
+        if cache:
+            cached = cache.Get(
+                _GetTestabilityCacheKey(hal, bitness, run_as_compliance_test))
+        if cached is not None:
+            results[hal] = _ToTestability(cached)
+        elif hal not in unchecked_hals:
+            unchecked_hals.append(hal)
+
+    if not unchecked_hals:
+        return results
 
     binary = VTS_TESTABILITY_CHECKER_64
     if bitness == "32":
         binary = VTS_TESTABILITY_CHECKER_32
     # Give permission to execute the binary.
-    shell.Execute("chmod 755 %s" % binary)
-    cmd = binary
-    if run_as_compliance_test:
-        cmd += " -c "
-    cmd += " -b " + bitness + " " + hal
-    cmd_results = shell.Execute(str(cmd))
-    asserts.assertFalse(
-        any(cmd_results[const.EXIT_CODE]),
-        "Failed to run vts_testability_checker. ErrorCode: %s\n STDOUT: %s\n STDERR: %s\n"
-        % (cmd_results[const.EXIT_CODE][0], cmd_results[const.STDOUT][0],
-           cmd_results[const.STDERR][0]))
-    result = json.loads(cmd_results[const.STDOUT][0])
-    if str(result['Testable']).lower() == "true":
-        return True, set(result['instances'])
-    else:
-        return False, ()
+    commands = ["chmod 755 %s" % binary]
+    for hal in unchecked_hals:
+        cmd = binary
+        if run_as_compliance_test:
+            cmd += " -c "
+        cmd += " -b " + bitness + " " + hal
+        commands.append(str(cmd))
+    cmd_results = shell.Execute(commands)
+    for index, hal in enumerate(unchecked_hals, 1):
+        asserts.assertFalse(
+            cmd_results[const.EXIT_CODE][index],
+            "Failed to run vts_testability_checker. ErrorCode: %s\n STDOUT: %s\n STDERR: %s\n"
+            % (cmd_results[const.EXIT_CODE][index],
+               cmd_results[const.STDOUT][index],
+               cmd_results[const.STDERR][index]))
+        result = json.loads(cmd_results[const.STDOUT][index])
+        if str(result['Testable']).lower() == "true":
+            cached = [True, sorted(result['instances'])]
+        else:
+            cached = [False, []]
+        if cache:
+            cache.Set(
+                _GetTestabilityCacheKey(hal, bitness, run_as_compliance_test),
+                cached)
+        results[hal] = _ToTestability(cached)
+    return results
 
 
 class CombMode(object):
@@ -14,9 +14,42 @@
 # limitations under the License.
 #
 
+import json
 import unittest
 
+from vts.runners.host import const
 from vts.utils.python.hal import hal_service_name_utils
+from vts.utils.python.precondition import precondition_cache
+
+
+class FakeShell(object):
+    """Fake ShellMirrorObject which runs vts_testability_checker.
+
+    Attributes:
+        commands: list of strings, the executed commands.
+    """
+
+    def __init__(self):
+        self.commands = []
+
+    def Execute(self, commands):
+        if not isinstance(commands, list):
+            commands = [commands]
+        self.commands.extend(commands)
+        stdout = []
+        for cmd in commands:
+            if cmd.startswith("cat "):
+                stdout.append("boot1\n")
+            elif "IFoo" in cmd:
+                stdout.append(
+                    json.dumps({"Testable": True, "instances": ["default"]}))
+            else:
+                stdout.append(json.dumps({"Testable": False, "instances": []}))
+        return {
+            const.STDOUT: stdout,
+            const.STDERR: [""] * len(commands),
+            const.EXIT_CODE: [0] * len(commands)
+        }
 
 
 class HalServiceNameUtilsUnitTest(unittest.TestCase):
@@ -101,6 +134,29 @@ class HalServiceNameUtilsUnitTest(unittest.TestCase):
                            "s2": ["n1", "n2"]}, mode)
         self.assertEqual([["s1/n1", "s2/n1"], ["s1/n2", "s2/n2"]], comb11)
 
+    def testGetHalServiceNames(self):
+        """Test that each HAL is checked once per boot"""
+        precondition_cache._caches = {
+            "boot1": precondition_cache.PreconditionCache("boot1", False)
+        }
+        try:
+            shell = FakeShell()
+            hals = ["android.hardware.foo@1.0::IFoo",
+                    "android.hardware.bar@1.0::IBar"]
+            results = hal_service_name_utils.GetHalServiceNames(shell, hals)
+            self.assertEqual(results[hals[0]], (True, set(["default"])))
+            self.assertEqual(results[hals[1]], (False, ()))
+            self.assertEqual(
+                len([cmd for cmd in shell.commands if " -b 64 " in cmd]), 2)
+
+            shell.commands = []
+            self.assertEqual(
+                hal_service_name_utils.GetHalServiceName(shell, hals[0]),
+                (True, set(["default"])))
+            self.assertEqual(shell.commands, [])
+        finally:
+            precondition_cache._caches = {}
+
 
 if __name__ == '__main__':
     unittest.main()
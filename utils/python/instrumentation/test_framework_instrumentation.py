@@ -15,13 +15,14 @@
 
 import datetime
 import logging
-import operator
 import os
 import time
 
 from vts.runners.host import logger
+from vts.utils.python.instrumentation import test_framework_instrumentation_buffer as tfib
 from vts.utils.python.instrumentation import test_framework_instrumentation_categories as tfic
 from vts.utils.python.instrumentation import test_framework_instrumentation_event as tfie
+from vts.utils.python.instrumentation import test_framework_instrumentation_trace as tfit
 
 
 # global category listing
@@ -31,9 +32,14 @@ counts = {}
 
 DEFAULT_CATEGORY = 'Misc'
 DEFAULT_FILE_NAME_TEXT_RESULT = 'instrumentation_data.txt'
+DEFAULT_FILE_NAME_CHROME_TRACE = 'instrumentation_trace.json'
 
+# ChromeTraceWriter which events are streamed to, or None.
+_trace_writer = None
 
-def Begin(name, category=DEFAULT_CATEGORY, enable_logging=None, disable_subevent_logging=False):
+
+def Begin(name, category=DEFAULT_CATEGORY, enable_logging=None, disable_subevent_logging=False,
+          track=None):
     """Marks the beginning of an event.
 
     Params:
@@ -46,15 +52,37 @@ def Begin(name, category=DEFAULT_CATEGORY, enable_logging=None, disable_subevent
         disable_subevent_logging: bool, whether to disable logging for events created after this
                                   event begins and before this event ends. This will overwrite
                                   subevent's logging setting if set to True.
+        track: string, the timeline of the event in exported traces, e.g., a device serial.
+               The name of the thread which ends the event is used if not specified.
 
     Returns:
         Event object representing the event
     """
-    event = tfie.TestFrameworkInstrumentationEvent(name, category)
+    event = tfie.TestFrameworkInstrumentationEvent(name, category, track)
     event.Begin(enable_logging=enable_logging, disable_subevent_logging=disable_subevent_logging)
     return event
 
 
+def BeginLowOverhead(name, category=DEFAULT_CATEGORY, track=None):
+    """Marks the beginning of an event that is only timed.
+
+    The event is recorded to the event buffer when its End method is called.
+    It is not logged, not pushed to the event stack and cannot be ended with
+    the End function of this module. Use this for hot paths, e.g., per RPC.
+
+    Params:
+        name: string, name of the event.
+        category: string, category of the event. Default category will be used if not specified.
+        track: string, the timeline of the event in exported traces, e.g., a device serial.
+               The name of the current thread is used if not specified.
+
+    Returns:
+        LowOverheadEvent object representing the event
+    """
+    return tfib.LowOverheadEvent(tfie.event_buffer,
+                                 tfie.event_buffer.Intern(name, category, track))
+
+
 def End(name, category=DEFAULT_CATEGORY):
     """Marks the end of an event.
 
@@ -125,65 +153,37 @@ def Count(name, category=DEFAULT_CATEGORY):
 def GenerateTextReport():
     """Compile instrumentation results into a simple text output format for visualization.
 
+    The report is built from the finished events in the event buffer.
+
     Returns:
         a string containing result text.
     """
-    class EventItem:
-        """Temporary data storage class for instrumentation text result generation.
-
-        Attributes:
-            name: string, event name
-            category: string, event category
-            time_cpu: float, CPU time of the event (can be begin or end)
-            time_wall: float, wall time of the event (can be begin or end)
-            type: string, begin or end
-        """
-        name = ''
-        category = ''
-        time_cpu = -1
-        time_wall = -1
-        type = ''
-        duration = -1
-
-    results = []
-
-    for event in tfie.event_data:
-        ei = EventItem()
-        ei.name = event.name
-        ei.category = event.category
-        ei.type = 'begin'
-        ei.time_cpu = event.timestamp_begin_cpu
-        ei.time_wall = event.timestamp_begin_wall
-        results.append(ei)
-
-    for event in tfie.event_data:
-        ei = EventItem()
-        ei.name = event.name
-        ei.category = event.category
-        ei.type = 'end'
-        ei.time_cpu = event.timestamp_end_cpu
-        ei.time_wall = event.timestamp_end_wall
-        ei.duration = event.timestamp_end_wall - event.timestamp_begin_wall
-        results.append(ei)
-
-    results.sort(key=operator.attrgetter('time_cpu'))
+    events = list(tfie.event_buffer.Events())
+    # (timestamp, 0 for begin or 1 for end, event index)
+    timeline = [(event[2], 0, index) for index, event in enumerate(events)]
+    timeline.extend((event[3], 1, index) for index, event in enumerate(events))
+    timeline.sort()
 
     result_text = []
+    if tfie.event_buffer.dropped:
+        result_text.append('%d earlier events were dropped.\n' %
+                           tfie.event_buffer.dropped)
 
     level = 0
-    for e in results:
-        if e.type == 'begin':
-            s = ('Begin [%s @ %s] ' % (e.name, e.category) +
-                 datetime.datetime.fromtimestamp(e.time_wall).strftime('%Y-%m-%d %H:%M:%S_%f'))
+    for timestamp, is_end, index in timeline:
+        name, category, time_begin, time_end, _ = events[index]
+        time_text = datetime.datetime.fromtimestamp(timestamp).strftime(
+            '%Y-%m-%d %H:%M:%S_%f')
+        if not is_end:
+            s = 'Begin [%s @ %s] ' % (name, category) + time_text
             result_text.append('    '*level + s)
             level += 1
         else:
-            s = ('End   [%s @ %s] ' % (e.name, e.category) +
-                 datetime.datetime.fromtimestamp(e.time_wall).strftime('%Y-%m-%d %H:%M:%S_%f'))
+            s = 'End   [%s @ %s] ' % (name, category) + time_text
             level -= 1
             result_text.append('    '*level + s)
             result_text.append('\n')
-            result_text.append('    '*level + "%.4f" % e.duration)
+            result_text.append('    '*level + "%.4f" % (time_end - time_begin))
         result_text.append('\n')
 
     return ''.join(result_text)
@@ -200,3 +200,39 @@ def CompileResults(directory=None, filename=DEFAULT_FILE_NAME_TEXT_RESULT):
         directory = logging.log_path
     with open(os.path.join(directory, filename), 'w') as f:
         f.write(GenerateTextReport())
+
+
+def StartTraceExport(directory=None, filename=DEFAULT_FILE_NAME_CHROME_TRACE):
+    """Starts streaming events to a Chrome trace file as they end.
+
+    The trace shows each track, e.g., a device or a thread, as a separate
+    timeline, so that concurrent events can be seen. Events that ended before
+    this call are not written. Does nothing if the export has started.
+
+    Args:
+        directory: string, parent path of the trace
+        filename: string, trace file name
+    """
+    global _trace_writer
+    if _trace_writer:
+        return
+    if not directory:
+        directory = logging.log_path
+    _trace_writer = tfit.ChromeTraceWriter(os.path.join(directory, filename))
+    tfie.event_buffer.AddListener(_trace_writer.WriteEvent)
+
+
+def StopTraceExport():
+    """Stops streaming events and closes the trace file.
+
+    Returns:
+        string, path to the trace file. None if the export has not started.
+    """
+    global _trace_writer
+    if not _trace_writer:
+        return None
+    tfie.event_buffer.RemoveListener(_trace_writer.WriteEvent)
+    _trace_writer.Close()
+    path = _trace_writer.path
+    _trace_writer = None
+    return path
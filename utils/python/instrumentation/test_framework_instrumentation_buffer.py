@@ -0,0 +1,214 @@
+#
+# Copyright (C) 2019 The Android Open Source Project
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import array
+import threading
+import time
+import timeit
+
+# Default number of finished events kept in an EventRingBuffer.
+DEFAULT_CAPACITY = 65536
+
+try:
+    PerfCounterNs = time.perf_counter_ns
+except AttributeError:
+    _perf_counter = getattr(time, 'perf_counter', timeit.default_timer)
+
+    def PerfCounterNs():
+        """Returns the value of a performance counter in nanoseconds.
+
+        Fallback for Python versions without time.perf_counter_ns.
+        """
+        return int(_perf_counter() * 1000000000)
+
+
+class EventRingBuffer(object):
+    """A fixed-size buffer of the most recent finished events.
+
+    Each event is stored as a name ID and begin and end timestamps in
+    preallocated arrays, so recording an event does not allocate objects.
+    Event names, categories and tracks are normalized and interned to IDs
+    once. When the buffer is full, the oldest events are overwritten.
+
+    A track is the timeline an event is drawn on when exported, e.g., a
+    device serial. It defaults to the name of the thread that interns the
+    event.
+
+    Timestamps are nanoseconds of PerfCounterNs, stored relative to the
+    creation of the buffer so that doubles keep them exact.
+
+    Attributes:
+        capacity: int, the maximum number of events kept.
+        _normalize: function that takes name and category and returns
+                    normalized (name, category), or None.
+        _ids: dict, (name, category, track) as given to Intern to name ID.
+        _names: list of (name, category, track) tuples, indexed by name ID.
+        _name_ids: array of name IDs of the events.
+        _begins: array of begin timestamps of the events.
+        _ends: array of end timestamps of the events.
+        _recorded: int, the number of events ever recorded.
+        _origin_ns: int, PerfCounterNs at the creation of the buffer.
+        _origin_wall: float, time.time at the creation of the buffer.
+        _listeners: list of functions called with (name, category, track,
+                    begin wall time, end wall time) of each recorded event.
+        _lock: threading.Lock, guards the new names and the events, which
+               are written from several threads, e.g., RPC threads.
+    """
+
+    def __init__(self, capacity=DEFAULT_CAPACITY, normalize=None):
+        self.capacity = capacity
+        self._normalize = normalize
+        self._ids = {}
+        self._names = []
+        self._name_ids = array.array('i', [0]) * capacity
+        self._begins = array.array('d', [0]) * capacity
+        self._ends = array.array('d', [0]) * capacity
+        self._listeners = []
+        self._lock = threading.Lock()
+        self.Clear()
+
+    def Clear(self):
+        """Removes all events and resets the time origin."""
+        self._recorded = 0
+        self._origin_ns = PerfCounterNs()
+        self._origin_wall = time.time()
+
+    def Intern(self, name, category, track=None):
+        """Returns the ID of an event name, category and track.
+
+        Args:
+            name: string, name of the event.
+            category: string, category of the event.
+            track: string, the timeline of the event. The current thread
+                   name is used if not specified.
+
+        Returns:
+            int, the name ID.
+        """
+        if track is None:
+            track = threading.current_thread().name
+        key = (name, category, track)
+        name_id = self._ids.get(key)
+        if name_id is None:
+            if self._normalize:
+                name, category = self._normalize(name, category)
+            with self._lock:
+                name_id = self._ids.get(key)
+                if name_id is None:
+                    name_id = len(self._names)
+                    self._names.append((name, category, track))
+                    self._ids[key] = name_id
+        return name_id
+
+    def AddListener(self, listener):
+        """Registers a function to be called when an event is recorded.
+
+        The listener is called in the thread which ends the event.
+
+        Args:
+            listener: function that takes name, category, track, begin wall
+                      time and end wall time of an event.
+        """
+        self._listeners.append(listener)
+
+    def RemoveListener(self, listener):
+        """Unregisters a function added by AddListener."""
+        if listener in self._listeners:
+            self._listeners.remove(listener)
+
+    def Record(self, name_id, begin_ns, end_ns):
+        """Records a finished event.
+
+        Args:
+            name_id: int, the ID returned by Intern.
+            begin_ns: int, PerfCounterNs when the event began.
+            end_ns: int, PerfCounterNs when the event ended.
+        """
+        begin = begin_ns - self._origin_ns
+        end = end_ns - self._origin_ns
+        with self._lock:
+            slot = self._recorded % self.capacity
+            self._name_ids[slot] = name_id
+            self._begins[slot] = begin
+            self._ends[slot] = end
+            self._recorded += 1
+        if self._listeners:
+            name, category, track = self._names[name_id]
+            for listener in self._listeners:
+                listener(name, category, track, self._ToWallTime(begin),
+                         self._ToWallTime(end))
+
+    @property
+    def dropped(self):
+        """The number of events overwritten by newer ones."""
+        return max(0, self._recorded - self.capacity)
+
+    def __len__(self):
+        return min(self._recorded, self.capacity)
+
+    def Events(self):
+        """Yields the events in the buffer from the oldest recorded.
+
+        Yields:
+            (name, category, begin wall time, end wall time, track) tuples.
+            The wall times are seconds since the epoch.
+        """
+        size = len(self)
+        start = self._recorded - size
+        for index in range(start, start + size):
+            slot = index % self.capacity
+            name, category, track = self._names[self._name_ids[slot]]
+            yield (name, category, self._ToWallTime(self._begins[slot]),
+                   self._ToWallTime(self._ends[slot]), track)
+
+    def _ToWallTime(self, timestamp):
+        """Converts a timestamp relative to the origin to seconds since epoch."""
+        return self._origin_wall + timestamp / 1e9
+
+
+class LowOverheadEvent(object):
+    """An event recorded only to an EventRingBuffer when it ends.
+
+    Unlike TestFrameworkInstrumentationEvent, it is not logged, not pushed to
+    the event stack and cannot be found by name.
+
+    Attributes:
+        _buffer: EventRingBuffer, where the event is recorded.
+        _name_id: int, the interned name ID.
+        _begin_ns: int, PerfCounterNs when the event began. None after the
+                   event has ended or been removed.
+    """
+
+    __slots__ = ('_buffer', '_name_id', '_begin_ns')
+
+    def __init__(self, event_buffer, name_id):
+        self._buffer = event_buffer
+        self._name_id = name_id
+        self._begin_ns = PerfCounterNs()
+
+    def End(self):
+        """Records the event. Does nothing if it has already ended."""
+        end_ns = PerfCounterNs()
+        if self._begin_ns is not None:
+            self._buffer.Record(self._name_id, self._begin_ns, end_ns)
+            self._begin_ns = None
+
+    def CheckEnded(self, remove_reason=''):
+        """Drops the event if it has not ended."""
+        self._begin_ns = None
+
+    def Remove(self, remove_reason=''):
+        """Drops the event without recording it."""
+        self._begin_ns = None
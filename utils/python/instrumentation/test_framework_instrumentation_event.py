@@ -17,6 +17,8 @@ import logging
 import time
 import re
 
+from vts.utils.python.instrumentation import test_framework_instrumentation_buffer as tfib
+
 
 # Log prefix to be parsed by performance analysis tools
 LOGGING_PREFIX = '[Instrumentation]'
@@ -30,9 +32,6 @@ ILLEGAL_CHARS = ':\t\r\n'
 
 # A list of events that have began but not ended.
 event_stack = []
-# A list of events that have finished
-# TODO(yuexima): use a new class to store data
-event_data = []
 
 
 def NormalizeNameCategory(name, category):
@@ -54,6 +53,10 @@ def NormalizeNameCategory(name, category):
     return name, category
 
 
+# The most recent finished events.
+event_buffer = tfib.EventRingBuffer(normalize=NormalizeNameCategory)
+
+
 class TestFrameworkInstrumentationEvent(object):
     """An object that represents an event.
 
@@ -66,13 +69,14 @@ class TestFrameworkInstrumentationEvent(object):
               reading. Final performance analysis will mostly focus on category
               granularity instead of name granularity.
         status: int, 0 for not started, 1 for started, 2 for ended, 3 for removed.
-        timestamp_begin_cpu: float, cpu time of event begin
+        track: string, the timeline of the event in exported traces, e.g., a
+               device serial. None for the thread which ends the event.
+        timestamp_begin_cpu: float, performance counter time of event begin
         timestamp_begin_wall: float, wall time of event begin
-        timestamp_end_cpu: float, cpu time of event end
-                           Note: on some operating system (such as windows), the difference
-                           between start and end cpu time may be measured using
-                           wall time.
+        timestamp_end_cpu: float, performance counter time of event end
         timestamp_end_wall: float, wall time of event end
+        _timestamp_begin_ns: int, performance counter nanoseconds of event
+                             begin, recorded to event_buffer at the end.
         _enable_logging: bool or None. Whether to put the event in logging.
                          Should be set to False when timing small pieces of code that could take
                          very short time to run.
@@ -84,6 +88,7 @@ class TestFrameworkInstrumentationEvent(object):
     """
     category = None
     name = None
+    track = None
     status = 0
     error = None
     _enable_logging = False
@@ -92,11 +97,13 @@ class TestFrameworkInstrumentationEvent(object):
 
     timestamp_begin_cpu = -1
     timestamp_begin_wall = -1
+    _timestamp_begin_ns = -1
     timestamp_end_cpu = -1
     timestamp_end_wall = -1
 
-    def __init__(self, name, category):
+    def __init__(self, name, category, track=None):
         self.name, self.category = NormalizeNameCategory(name, category)
+        self.track = track
 
         if (name, category) != (self.name, self.category):
             self.LogW('TestFrameworkInstrumentation: illegal character detected in '
@@ -120,7 +127,7 @@ class TestFrameworkInstrumentationEvent(object):
                                       event begins and before this event ends. This will overwrite
                                       subevent's logging setting if set to True.
         """
-        timestamp_begin_cpu = time.clock()
+        timestamp_begin_ns = tfib.PerfCounterNs()
         timestamp_begin_wall = time.time()
         global event_stack
         if event_stack and event_stack[-1]._disable_subevent_logging:
@@ -152,13 +159,14 @@ class TestFrameworkInstrumentationEvent(object):
                                           status='BEGIN'))
 
         self.status = 1
-        self.timestamp_begin_cpu = timestamp_begin_cpu
+        self._timestamp_begin_ns = timestamp_begin_ns
+        self.timestamp_begin_cpu = timestamp_begin_ns / 1e9
         self.timestamp_begin_wall = timestamp_begin_wall
         event_stack.append(self)
 
     def End(self):
         """Performs logging action for the end of this event."""
-        timestamp_end_cpu = time.clock()
+        timestamp_end_ns = tfib.PerfCounterNs()
         timestamp_end_wall = time.time()
         if self.status == 0:
             self.LogE('TestFrameworkInstrumentation: event %s has not yet began. '
@@ -181,10 +189,11 @@ class TestFrameworkInstrumentationEvent(object):
                                           status='END'))
 
         self.status = 2
-        self.timestamp_end_cpu = timestamp_end_cpu
+        self.timestamp_end_cpu = timestamp_end_ns / 1e9
         self.timestamp_end_wall = timestamp_end_wall
-        global event_data
-        event_data.append(self)
+        event_buffer.Record(
+            event_buffer.Intern(self.name, self.category, self.track),
+            self._timestamp_begin_ns, timestamp_end_ns)
         global event_stack
         event_stack.remove(self)
 
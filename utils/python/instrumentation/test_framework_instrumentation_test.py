@@ -15,9 +15,15 @@
 # limitations under the License.
 #
 
+import json
+import os
+import shutil
+import tempfile
+import threading
 import unittest
 
 from vts.utils.python.instrumentation import test_framework_instrumentation as tfi
+from vts.utils.python.instrumentation import test_framework_instrumentation_buffer as tfib
 from vts.utils.python.instrumentation import test_framework_instrumentation_event as tfie
 from vts.utils.python.instrumentation import test_framework_instrumentation_test_submodule as tfits
 
@@ -29,7 +35,7 @@ class TestFrameworkInstrumentationTest(unittest.TestCase):
         """Setup tasks"""
         self.category = 'category_default'
         self.name = 'name_default'
-        tfie.event_data = []
+        tfie.event_buffer.Clear()
         tfie.event_stack = []
         tfi.counts = {}
 
@@ -227,6 +233,86 @@ class TestFrameworkInstrumentationTest(unittest.TestCase):
         self.assertIn('cat1', res)
         self.assertIn('cat2', res)
 
+    def testLowOverheadEvent(self):
+        """Tests that low overhead events are recorded once when they end."""
+        event = tfi.BeginLowOverhead('name:1', self.category)
+        self.assertFalse(bool(tfie.event_stack))
+        event.End()
+        event.End()
+        removed = tfi.BeginLowOverhead('name:1', self.category)
+        removed.Remove()
+        removed.End()
+        events = list(tfie.event_buffer.Events())
+        self.assertEqual(len(events), 1)
+        name, category, time_begin, time_end, track = events[0]
+        self.assertEqual((name, category), ('name_1', self.category))
+        self.assertEqual(track, threading.current_thread().name)
+        self.assertLessEqual(time_begin, time_end)
+        self.assertIn('name_1', tfi.GenerateTextReport())
+
+    def testEventRingBuffer(self):
+        """Tests that the oldest events are overwritten when full."""
+        event_buffer = tfib.EventRingBuffer(capacity=3)
+        name_ids = [event_buffer.Intern(str(i), self.category) for i in range(5)]
+        self.assertEqual(event_buffer.Intern('0', self.category), name_ids[0])
+        for name_id in name_ids:
+            event_buffer.Record(name_id, 0, 1)
+        self.assertEqual(len(event_buffer), 3)
+        self.assertEqual(event_buffer.dropped, 2)
+        self.assertEqual([event[0] for event in event_buffer.Events()],
+                         ['2', '3', '4'])
+
+    def testEventRingBufferConcurrentRecord(self):
+        """Tests that no event is lost when several threads record."""
+        event_buffer = tfib.EventRingBuffer(capacity=1000)
+        name_id = event_buffer.Intern('name', self.category)
+
+        def _Record():
+            for _ in range(500):
+                event_buffer.Record(name_id, 0, 1)
+
+        threads = [threading.Thread(target=_Record) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(len(event_buffer), 1000)
+        self.assertEqual(event_buffer.dropped, 1000)
+        self.assertEqual(len(list(event_buffer.Events())), 1000)
+
+    def testTraceExport(self):
+        """Tests that events are streamed to a Chrome trace file."""
+        tmp_dir = tempfile.mkdtemp()
+        try:
+            tfi.Begin('before export', self.category).End()
+            tfi.StartTraceExport(tmp_dir)
+            tfi.Begin('device event', self.category, track='serial1').End()
+            tfi.BeginLowOverhead('rpc', self.category, track='serial1').End()
+            tfi.Begin('host event', self.category).End()
+            path = tfi.StopTraceExport()
+            self.assertEqual(path, os.path.join(
+                tmp_dir, tfi.DEFAULT_FILE_NAME_CHROME_TRACE))
+            self.assertIsNone(tfi.StopTraceExport())
+            tfi.Begin('after export', self.category).End()
+            with open(path) as trace_file:
+                trace = json.load(trace_file)
+        finally:
+            shutil.rmtree(tmp_dir)
+
+        events = [event for event in trace if event['ph'] == 'X']
+        self.assertEqual([event['name'] for event in events],
+                         ['device event', 'rpc', 'host event'])
+        self.assertEqual(events[0]['tid'], events[1]['tid'])
+        self.assertNotEqual(events[0]['tid'], events[2]['tid'])
+        self.assertLessEqual(events[0]['ts'] + events[0]['dur'],
+                             events[1]['ts'])
+        thread_names = dict((event['tid'], event['args']['name'])
+                            for event in trace
+                            if event['name'] == 'thread_name')
+        self.assertEqual(thread_names[events[0]['tid']], 'serial1')
+        self.assertEqual(thread_names[events[2]['tid']],
+                         threading.current_thread().name)
+
 
 if __name__ == "__main__":
     unittest.main()
\ No newline at end of file
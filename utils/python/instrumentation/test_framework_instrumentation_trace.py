@@ -0,0 +1,100 @@
+#
+# Copyright (C) 2019 The Android Open Source Project
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import json
+import os
+import threading
+
+# Name of the process in the exported trace.
+PROCESS_NAME = 'VTS host'
+
+
+class ChromeTraceWriter(object):
+    """Writes finished events to a file in Chrome trace event format.
+
+    The file can be opened in chrome://tracing or the Perfetto UI. Each event
+    is written as a complete ("X") event when it ends, and each track is
+    shown as a thread. The file is a JSON array which is closed by Close; the
+    viewers also accept the unterminated array left by an aborted run.
+
+    Attributes:
+        path: string, path to the trace file.
+        _file: file object, the trace file. None after Close.
+        _lock: threading.Lock, serializes writes from different threads.
+        _pid: int, the process ID in the trace.
+        _tids: dict, track name to thread ID in the trace.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._file = open(path, 'w')
+        self._lock = threading.Lock()
+        self._pid = os.getpid()
+        self._tids = {}
+        self._file.write('[\n')
+
+    def WriteEvent(self, name, category, track, begin, end):
+        """Writes a finished event.
+
+        Args:
+            name: string, name of the event.
+            category: string, category of the event.
+            track: string, the timeline of the event.
+            begin: float, wall time in seconds when the event began.
+            end: float, wall time in seconds when the event ended.
+        """
+        with self._lock:
+            if self._file is None:
+                return
+            tid = self._tids.get(track)
+            if tid is None:
+                tid = len(self._tids) + 1
+                self._tids[track] = tid
+                self._WriteRecord({
+                    'name': 'thread_name',
+                    'ph': 'M',
+                    'pid': self._pid,
+                    'tid': tid,
+                    'args': {'name': track},
+                })
+            self._WriteRecord({
+                'name': name,
+                'cat': category,
+                'ph': 'X',
+                'ts': begin * 1e6,
+                'dur': (end - begin) * 1e6,
+                'pid': self._pid,
+                'tid': tid,
+            })
+
+    def _WriteRecord(self, record):
+        """Writes one element of the JSON array."""
+        self._file.write(json.dumps(record))
+        self._file.write(',\n')
+
+    def Close(self):
+        """Terminates the JSON array and closes the file."""
+        with self._lock:
+            if self._file is None:
+                return
+            self._file.write(json.dumps({
+                'name': 'process_name',
+                'ph': 'M',
+                'pid': self._pid,
+                'args': {'name': PROCESS_NAME},
+            }))
+            self._file.write('\n]\n')
+            self._file.close()
+            self._file = None
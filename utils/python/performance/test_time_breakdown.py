@@ -0,0 +1,336 @@
+#
+# Copyright (C) 2019 The Android Open Source Project
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+import datetime
+import time
+
+# Results that end a "[Test Case]" log line of the Python runner.
+_TEST_CASE_RESULTS = ("PASS", "FAIL", "SKIP", "ERROR")
+
+
+class _TimestampParser(object):
+    """Converts "MM-DD" and "HH:MM:SS[.fff]" log tokens to epoch seconds.
+
+    time.mktime is called once per distinct date and hour; the minutes and
+    seconds are added to the cached value.
+
+    Attributes:
+        _year: int, the year of the log.
+        _cache: dict, (date token, hour) to epoch seconds of the hour.
+    """
+
+    def __init__(self, year):
+        self._year = year
+        self._cache = {}
+
+    def Parse(self, date_token, time_token):
+        """Returns the epoch seconds of a log timestamp, or -1 if malformed.
+
+        Args:
+            date_token: string, e.g., "05-12".
+            time_token: string, e.g., "07:51:32.916".
+        """
+        try:
+            hour = int(time_token[0:2])
+            key = (date_token, hour)
+            base = self._cache.get(key)
+            if base is None:
+                month, day = date_token.split("-")
+                base = time.mktime(
+                    datetime.datetime(self._year, int(month), int(day),
+                                      hour).timetuple())
+                self._cache[key] = base
+            return (base + int(time_token[3:5]) * 60 +
+                    float(time_token[6:]))
+        except ValueError:
+            return -1
+
+
+class ModuleTimeline(object):
+    """Timing of the test cases and phases of one Python test module.
+
+    Attributes:
+        test_cases: dict, test case name to the list of its durations in
+                    seconds. A name appears more than once if the test case
+                    runs again, e.g., in a retry.
+        setup_time: float, seconds from the first log line of the module to
+                    the beginning of its first test case, summed over logs.
+        teardown_time: float, seconds from the end of the last test case to
+                       the last log line of the module, summed over logs.
+        runs: int, number of logs in which the module ran.
+    """
+
+    def __init__(self):
+        self.test_cases = {}
+        self.setup_time = 0
+        self.teardown_time = 0
+        self.runs = 0
+
+    def AddTestCase(self, name, duration):
+        """Records one run of a test case."""
+        self.test_cases.setdefault(name, []).append(duration)
+
+    def Merge(self, other):
+        """Adds the timing of another ModuleTimeline to this one."""
+        for name, durations in other.test_cases.items():
+            self.test_cases.setdefault(name, []).extend(durations)
+        self.setup_time += other.setup_time
+        self.teardown_time += other.teardown_time
+        self.runs += other.runs
+
+    def ToDict(self):
+        """Returns a dict that can be serialized to json."""
+        return {
+            "test_cases": self.test_cases,
+            "setup_time": self.setup_time,
+            "teardown_time": self.teardown_time,
+            "runs": self.runs,
+        }
+
+    @classmethod
+    def FromDict(cls, data):
+        """Creates a ModuleTimeline from the return value of ToDict."""
+        timeline = cls()
+        timeline.test_cases = dict(
+            (name, list(durations))
+            for name, durations in data["test_cases"].items())
+        timeline.setup_time = data["setup_time"]
+        timeline.teardown_time = data["teardown_time"]
+        timeline.runs = data["runs"]
+        return timeline
+
+
+class TimeBreakdown(object):
+    """Index of the execution time of VTS runs.
+
+    A breakdown is built from logs with LogAnalyzer. Breakdowns of different
+    logs, e.g., shards of one run or runs of one night, can be merged.
+
+    Attributes:
+        phases: dict, Java harness module type (phase) to
+                {"sum": float, "count": int, "modules": {module name:
+                {"sum": float, "count": int}}}.
+        modules: dict, Python test module name to ModuleTimeline.
+    """
+
+    def __init__(self):
+        self.phases = {}
+        self.modules = {}
+
+    def AddPhase(self, module_type, module_name, duration):
+        """Records the duration of a Java harness phase."""
+        phase = self.phases.setdefault(module_type, {
+            "sum": 0,
+            "count": 0,
+            "modules": {}
+        })
+        phase["sum"] += duration
+        phase["count"] += 1
+        module = phase["modules"].setdefault(module_name, {
+            "sum": 0,
+            "count": 0
+        })
+        module["sum"] += duration
+        module["count"] += 1
+
+    def GetModule(self, module_name):
+        """Returns the ModuleTimeline of a module, creating it if needed."""
+        timeline = self.modules.get(module_name)
+        if timeline is None:
+            timeline = ModuleTimeline()
+            self.modules[module_name] = timeline
+        return timeline
+
+    def Merge(self, other):
+        """Adds the timing of another TimeBreakdown to this one."""
+        for module_type, other_phase in other.phases.items():
+            phase = self.phases.setdefault(module_type, {
+                "sum": 0,
+                "count": 0,
+                "modules": {}
+            })
+            phase["sum"] += other_phase["sum"]
+            phase["count"] += other_phase["count"]
+            for module_name, other_module in other_phase["modules"].items():
+                module = phase["modules"].setdefault(module_name, {
+                    "sum": 0,
+                    "count": 0
+                })
+                module["sum"] += other_module["sum"]
+                module["count"] += other_module["count"]
+        for module_name, timeline in other.modules.items():
+            self.GetModule(module_name).Merge(timeline)
+
+    def GetSlowTestCases(self, threshold):
+        """Lists the test case runs that took longer than a threshold.
+
+        Args:
+            threshold: float, the threshold in seconds.
+
+        Returns:
+            list of (duration, module name, test case name) tuples, sorted
+            by descending duration.
+        """
+        result = []
+        for module_name, timeline in self.modules.items():
+            for name, durations in timeline.test_cases.items():
+                for duration in durations:
+                    if duration > threshold:
+                        result.append((duration, module_name, name))
+        result.sort(reverse=True)
+        return result
+
+    def ToDict(self):
+        """Returns a dict that can be serialized to json."""
+        return {
+            "phases": self.phases,
+            "modules": dict((name, timeline.ToDict())
+                            for name, timeline in self.modules.items()),
+        }
+
+    @classmethod
+    def FromDict(cls, data):
+        """Creates a TimeBreakdown from the return value of ToDict."""
+        breakdown = cls()
+        for module_type, phase in data["phases"].items():
+            breakdown.phases[module_type] = {
+                "sum": phase["sum"],
+                "count": phase["count"],
+                "modules": dict((name, dict(module))
+                                for name, module in phase["modules"].items()),
+            }
+        for module_name, timeline in data["modules"].items():
+            breakdown.modules[module_name] = ModuleTimeline.FromDict(timeline)
+        return breakdown
+
+
+class LogAnalyzer(object):
+    """One-pass parser of VTS host logs.
+
+    Lines are fed in order with Feed. Each line is split once and checked for
+    the Java harness format, e.g.,
+        05-12 07:51:45 D/ModuleDef: <module type>: <module name> ...
+    and for the Python runner format, e.g.,
+        [<module>] 05-12 07:51:32.916 INFO [Test Case] 1/10 <name> [PASS]
+    Finish must be called after the last line.
+
+    Attributes:
+        breakdown: TimeBreakdown, the result.
+        _timestamps: _TimestampParser, the timestamp parser.
+        _last_timestamp: float, timestamp of the last timed line.
+        _phase: (module type, module name, begin timestamp) of the current
+                Java harness phase, or None.
+        _open_test_cases: dict, (module, test case) to begin timestamp.
+        _module_spans: dict, module name to [first line timestamp, first test
+                       case begin, last test case end, last line timestamp].
+    """
+
+    def __init__(self, year=None):
+        self.breakdown = TimeBreakdown()
+        self._timestamps = _TimestampParser(year or
+                                            datetime.datetime.now().year)
+        self._last_timestamp = 0
+        self._phase = None
+        self._open_test_cases = {}
+        self._module_spans = {}
+
+    def Feed(self, line):
+        """Processes one log line."""
+        tokens = line.split()
+        if len(tokens) < 4:
+            return
+        if tokens[2] == "D/ModuleDef:":
+            self._FeedJavaLine(tokens)
+        elif (len(tokens) >= 7 and len(tokens[0]) > 2 and
+              tokens[0][0] == "[" and tokens[0][-1] == "]"):
+            self._FeedPythonLine(tokens)
+
+    def _FeedJavaLine(self, tokens):
+        """Processes the tokens of a Java harness phase line."""
+        if len(tokens) < 5 or tokens[3][-1] != ":":
+            return
+        timestamp = self._timestamps.Parse(tokens[0], tokens[1])
+        self._last_timestamp = timestamp
+        if self._phase:
+            module_type, module_name, begin = self._phase
+            self.breakdown.AddPhase(module_type, module_name,
+                                    timestamp - begin)
+        self._phase = (tokens[3][:-1], tokens[4], timestamp)
+
+    def _FeedPythonLine(self, tokens):
+        """Processes the tokens of a Python runner line."""
+        module_name = tokens[0][1:-1]
+        timestamp = self._timestamps.Parse(tokens[1], tokens[2])
+        self._last_timestamp = timestamp
+        span = self._module_spans.get(module_name)
+        if span is None:
+            span = [timestamp, None, None, timestamp]
+            self._module_spans[module_name] = span
+        span[3] = timestamp
+
+        if tokens[4] != "[Test" or tokens[5] != "Case]" or len(tokens) < 8:
+            return
+        key = (module_name, tokens[7])
+        if len(tokens) == 8:
+            self._open_test_cases[key] = timestamp
+            if span[1] is None:
+                span[1] = timestamp
+        elif len(tokens) == 9 and tokens[8] in _TEST_CASE_RESULTS:
+            begin = self._open_test_cases.pop(key, None)
+            if begin is not None:
+                self.breakdown.GetModule(module_name).AddTestCase(
+                    tokens[7], timestamp - begin)
+            span[2] = timestamp
+
+    def Finish(self):
+        """Closes the open phase and computes module setup and teardown.
+
+        Returns:
+            TimeBreakdown, the result.
+        """
+        if self._phase:
+            module_type, module_name, begin = self._phase
+            self.breakdown.AddPhase(module_type, module_name,
+                                    self._last_timestamp - begin)
+            self._phase = None
+        for module_name, span in self._module_spans.items():
+            first_line, first_begin, last_end, last_line = span
+            timeline = self.breakdown.GetModule(module_name)
+            timeline.runs += 1
+            if first_begin is not None:
+                timeline.setup_time += first_begin - first_line
+            if last_end is not None:
+                timeline.teardown_time += last_line - last_end
+        self._module_spans = {}
+        self._open_test_cases = {}
+        return self.breakdown
+
+
+def AnalyzeLogFile(log_file_path, year=None):
+    """Analyzes a VTS host log file in one pass.
+
+    Args:
+        log_file_path: string, path to the log file.
+        year: int, the year of the log. The current year by default.
+
+    Returns:
+        TimeBreakdown of the log.
+    """
+    analyzer = LogAnalyzer(year)
+    with open(log_file_path, "r") as log_file:
+        for line in log_file:
+            analyzer.Feed(line)
+    return analyzer.Finish()
@@ -0,0 +1,92 @@
+#!/usr/bin/env python
+#
+# Copyright (C) 2019 The Android Open Source Project
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+import json
+import unittest
+
+from vts.utils.python.performance import test_time_breakdown
+
+_LOG = """\
+05-12 07:50:00 D/ModuleDef: Preparer: VtsFooTest setting up
+[VtsFooTest] 05-12 07:50:10.000 INFO Test module setup
+[VtsFooTest] 05-12 07:50:40.500 INFO [Test Case] 1/3 testA
+[VtsFooTest] 05-12 07:51:40.500 INFO [Test Case] 1/3 testA PASS
+[VtsFooTest] 05-12 07:51:41.000 INFO [Test Case] 2/3 testB
+[VtsFooTest] 05-12 07:51:42.000 INFO [Test Case] 2/3 testB FAIL
+[VtsFooTest] 05-12 07:51:43.000 INFO [Test Case] 3/3 testA
+[VtsFooTest] 05-12 07:51:53.000 INFO [Test Case] 3/3 testA PASS
+[VtsFooTest] 05-12 07:52:03.000 INFO Test module teardown
+05-12 07:53:00 D/ModuleDef: Test: VtsFooTest running
+05-12 07:55:00 D/ModuleDef: Preparer: VtsBarTest setting up
+[VtsBarTest] 05-12 07:59:30.000 INFO [Test Case] 1/1 testC
+[VtsBarTest] 05-12 08:00:30.000 INFO [Test Case] 1/1 testC PASS
+"""
+
+
+def _Analyze(log):
+    """Analyzes log lines and returns the TimeBreakdown."""
+    analyzer = test_time_breakdown.LogAnalyzer(2019)
+    for line in log.splitlines(True):
+        analyzer.Feed(line)
+    return analyzer.Finish()
+
+
+class TestTimeBreakdownTest(unittest.TestCase):
+    """Unit tests for test_time_breakdown module."""
+
+    def testPhases(self):
+        """Tests the durations of Java harness phases."""
+        phases = _Analyze(_LOG).phases
+        self.assertEqual(phases["Preparer"]["count"], 2)
+        self.assertEqual(phases["Preparer"]["sum"], 180 + 330)
+        self.assertEqual(phases["Preparer"]["modules"]["VtsFooTest"]["sum"],
+                         180)
+        self.assertEqual(phases["Test"]["sum"], 120)
+
+    def testTestCases(self):
+        """Tests that repeated test cases keep all of their durations."""
+        breakdown = _Analyze(_LOG)
+        foo = breakdown.modules["VtsFooTest"]
+        self.assertEqual(foo.test_cases, {"testA": [60, 10], "testB": [1]})
+        self.assertEqual(foo.setup_time, 30.5)
+        self.assertEqual(foo.teardown_time, 10)
+        self.assertEqual(foo.runs, 1)
+        # The timestamps cross an hour boundary.
+        self.assertEqual(breakdown.modules["VtsBarTest"].test_cases,
+                         {"testC": [60]})
+        self.assertEqual(
+            breakdown.GetSlowTestCases(30),
+            [(60, "VtsFooTest", "testA"), (60, "VtsBarTest", "testC")])
+
+    def testMerge(self):
+        """Tests merging breakdowns and their json serialization."""
+        merged = test_time_breakdown.TimeBreakdown()
+        merged.Merge(_Analyze(_LOG))
+        merged.Merge(
+            test_time_breakdown.TimeBreakdown.FromDict(
+                json.loads(json.dumps(_Analyze(_LOG).ToDict()))))
+        self.assertEqual(merged.phases["Preparer"]["count"], 4)
+        self.assertEqual(merged.phases["Test"]["modules"]["VtsFooTest"],
+                         {"sum": 240, "count": 2})
+        foo = merged.modules["VtsFooTest"]
+        self.assertEqual(foo.test_cases["testA"], [60, 10, 60, 10])
+        self.assertEqual(foo.setup_time, 61)
+        self.assertEqual(foo.runs, 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
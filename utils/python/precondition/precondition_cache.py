@@ -0,0 +1,220 @@
+#
+# Copyright (C) 2019 The Android Open Source Project
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+import errno
+import json
+import logging
+import os
+import re
+import tempfile
+import weakref
+
+from vts.runners.host import const
+
+# The file whose content is a random ID generated by the kernel at boot.
+BOOT_ID_PATH = "/proc/sys/kernel/random/boot_id"
+# The name of the file which keeps the results of one boot of a device in
+# one session. The format arguments are the session ID and the boot ID.
+_CACHE_FILE_NAME = "vts_precondition_cache_%d_%s.json"
+_CACHE_FILE_NAME_PATTERN = re.compile(
+    r"^vts_precondition_cache_(\d+)_.+\.json$")
+
+# boot ID to PreconditionCache.
+_caches = {}
+# ShellMirrorObject to the boot ID of its device.
+_boot_ids = weakref.WeakKeyDictionary()
+
+
+def GetSessionId():
+    """Returns the ID of the test session which runs this process.
+
+    The test harness starts the test modules of a session as its child
+    processes, so the session is identified by the parent process ID.
+    """
+    return os.getppid()
+
+
+def _IsProcessAlive(pid):
+    """Returns whether a process exists."""
+    try:
+        os.kill(pid, 0)
+    except OSError as e:
+        return e.errno != errno.ESRCH
+    return True
+
+
+def _RemoveStaleFiles(cache_dir):
+    """Deletes the cache files of the sessions that have finished.
+
+    Args:
+        cache_dir: string, the directory of the json files.
+    """
+    try:
+        file_names = os.listdir(cache_dir)
+    except OSError as e:
+        logging.warning("Cannot list precondition caches: %s", e)
+        return
+    for file_name in file_names:
+        match = _CACHE_FILE_NAME_PATTERN.match(file_name)
+        if not match or _IsProcessAlive(int(match.group(1))):
+            continue
+        try:
+            os.remove(os.path.join(cache_dir, file_name))
+        except OSError as e:
+            logging.warning("Cannot delete precondition cache %s: %s",
+                            file_name, e)
+
+
+class PreconditionCache(object):
+    """Results of precondition probes for one boot of one device.
+
+    The boot ID identifies both the device and its boot, so the results are
+    discarded when the device reboots. The results are also written to a
+    json file on the host, so that test modules which run in separate
+    processes in one session share them. The file is deleted by the next
+    session after this session finishes.
+
+    Attributes:
+        boot_id: string, the boot ID of the device.
+        session_id: int, the ID of the session which shares the results.
+        path: string, path to the json file. None to keep the results in
+              memory only.
+        _entries: dict, string key to json-serializable result.
+    """
+
+    def __init__(self, boot_id, cache_dir=None, session_id=None):
+        """Loads the results of the boot written by other processes.
+
+        Args:
+            boot_id: string, the boot ID of the device.
+            cache_dir: string, the directory of the json file. The system
+                       temporary directory if None. False to keep the
+                       results in memory only.
+            session_id: int, the session ID. GetSessionId() if None.
+        """
+        self.boot_id = boot_id
+        self.session_id = (GetSessionId()
+                           if session_id is None else session_id)
+        self.path = None
+        if cache_dir is not False:
+            self.path = os.path.join(
+                cache_dir or tempfile.gettempdir(),
+                _CACHE_FILE_NAME % (self.session_id, boot_id))
+        self._entries = {}
+        self._Load()
+
+    def Get(self, key):
+        """Returns a cached result, or None if the probe has not run.
+
+        The json file is read again on a miss to pick up the results of
+        other processes.
+
+        Args:
+            key: string, identifies the probe.
+        """
+        if key not in self._entries:
+            self._Load()
+        return self._entries.get(key)
+
+    def Set(self, key, value):
+        """Stores the result of a probe.
+
+        Args:
+            key: string, identifies the probe.
+            value: json-serializable result of the probe. Must not be None.
+        """
+        self._entries[key] = value
+        self._Save()
+
+    def _Load(self):
+        """Merges the results in the json file into this cache."""
+        if not self.path or not os.path.isfile(self.path):
+            return
+        try:
+            with open(self.path, "r") as cache_file:
+                entries = json.load(cache_file)
+        except (IOError, ValueError) as e:
+            logging.warning("Cannot read precondition cache %s: %s",
+                            self.path, e)
+            return
+        for key, value in entries.items():
+            self._entries.setdefault(key, value)
+
+    def _Save(self):
+        """Writes the results to the json file.
+
+        The results written by other processes since the last read are
+        merged first, so that they are not overwritten. The file is replaced
+        by rename, so that other processes never read a partially written
+        file.
+        """
+        if not self.path:
+            return
+        self._Load()
+        temp_path = "%s.%d" % (self.path, os.getpid())
+        try:
+            with open(temp_path, "w") as cache_file:
+                json.dump(self._entries, cache_file)
+            os.rename(temp_path, self.path)
+        except (IOError, OSError) as e:
+            logging.warning("Cannot write precondition cache %s: %s",
+                            self.path, e)
+
+
+def GetBootId(shell):
+    """Reads the boot ID of a device.
+
+    The ID is read once per shell. The shell terminals are invoked again
+    after the device reboots, so a shell does not outlive a boot.
+
+    Args:
+        shell: the ShellMirrorObject to execute command on the device.
+
+    Returns:
+        string, the boot ID. None if it cannot be read.
+    """
+    boot_id = _boot_ids.get(shell)
+    if boot_id:
+        return boot_id
+    results = shell.Execute("cat %s" % BOOT_ID_PATH)
+    if any(results[const.EXIT_CODE]):
+        logging.warning("Cannot read boot ID: %s", results[const.STDERR][0])
+        return None
+    boot_id = results[const.STDOUT][0].strip() or None
+    if boot_id:
+        _boot_ids[shell] = boot_id
+    return boot_id
+
+
+def GetCache(shell):
+    """Returns the PreconditionCache of the current boot of a device.
+
+    Args:
+        shell: the ShellMirrorObject to execute command on the device.
+
+    Returns:
+        PreconditionCache object. None if the boot ID cannot be read, in
+        which case the probes should not be cached.
+    """
+    boot_id = GetBootId(shell)
+    if not boot_id:
+        return None
+    cache = _caches.get(boot_id)
+    if cache is None:
+        _RemoveStaleFiles(tempfile.gettempdir())
+        cache = PreconditionCache(boot_id)
+        _caches[boot_id] = cache
+    return cache
@@ -0,0 +1,156 @@
+#!/usr/bin/env python
+#
+# Copyright (C) 2019 The Android Open Source Project
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+import os
+import re
+import shutil
+import tempfile
+import unittest
+
+from vts.runners.host import const
+from vts.utils.python.precondition import precondition_cache
+from vts.utils.python.precondition import precondition_utils
+
+
+class FakeShell(object):
+    """Fake ShellMirrorObject which answers cat and existence checks.
+
+    Attributes:
+        boot_id: string, content of the boot ID file.
+        files: set of strings, the paths that exist.
+        commands: list of strings, the executed commands.
+    """
+
+    def __init__(self, boot_id, files=()):
+        self.boot_id = boot_id
+        self.files = set(files)
+        self.commands = []
+
+    def Execute(self, command):
+        self.commands.append(command)
+        if command == "cat " + precondition_cache.BOOT_ID_PATH:
+            stdout = self.boot_id + "\n"
+        else:
+            stdout = "".join(
+                index + "\n" for path, index in re.findall(
+                    r"if test -e (\S+); then echo (\d+); fi", command)
+                if path in self.files)
+        return {
+            const.STDOUT: [stdout],
+            const.STDERR: [""],
+            const.EXIT_CODE: [0]
+        }
+
+
+class PreconditionCacheTest(unittest.TestCase):
+    """Unit tests for precondition_cache module."""
+
+    def setUp(self):
+        """Creates the cache directory."""
+        self._tmp_dir = tempfile.mkdtemp()
+        precondition_cache._caches = {}
+
+    def tearDown(self):
+        """Removes the cache directory."""
+        shutil.rmtree(self._tmp_dir)
+        precondition_cache._caches = {}
+
+    def testSharedByFile(self):
+        """Tests that results are shared through the file of a boot."""
+        cache = precondition_cache.PreconditionCache("boot1", self._tmp_dir)
+        self.assertIsNone(cache.Get("key"))
+        other = precondition_cache.PreconditionCache("boot1", self._tmp_dir)
+        cache.Set("key", [True, ["default"]])
+        self.assertEqual(other.Get("key"), [True, ["default"]])
+        rebooted = precondition_cache.PreconditionCache("boot2",
+                                                        self._tmp_dir)
+        self.assertIsNone(rebooted.Get("key"))
+        other_session = precondition_cache.PreconditionCache(
+            "boot1", self._tmp_dir, session_id=other.session_id + 1)
+        self.assertIsNone(other_session.Get("key"))
+
+    def testConcurrentWriters(self):
+        """Tests that writers sharing a file keep each other's results."""
+        cache = precondition_cache.PreconditionCache("boot1", self._tmp_dir)
+        other = precondition_cache.PreconditionCache("boot1", self._tmp_dir)
+        cache.Set("a", True)
+        other.Set("b", False)
+        cache.Set("c", True)
+        reader = precondition_cache.PreconditionCache("boot1", self._tmp_dir)
+        self.assertEqual([True, False, True],
+                         [reader.Get(key) for key in "abc"])
+
+    def testRemoveStaleFiles(self):
+        """Tests that the files of finished sessions are deleted."""
+        live = precondition_cache.PreconditionCache("boot1", self._tmp_dir)
+        live.Set("key", True)
+        # Process IDs do not exceed 2^22 on Linux.
+        stale = precondition_cache.PreconditionCache(
+            "boot1", self._tmp_dir, session_id=2**22 + 1)
+        stale.Set("key", True)
+        precondition_cache._RemoveStaleFiles(self._tmp_dir)
+        self.assertTrue(os.path.isfile(live.path))
+        self.assertFalse(os.path.isfile(stale.path))
+
+    def testGetBootIdOncePerShell(self):
+        """Tests that the boot ID is read once per shell."""
+        shell = FakeShell("boot1")
+        self.assertEqual("boot1", precondition_cache.GetBootId(shell))
+        self.assertEqual("boot1", precondition_cache.GetBootId(shell))
+        self.assertEqual(1, len(shell.commands))
+        self.assertEqual("boot2",
+                         precondition_cache.GetBootId(FakeShell("boot2")))
+
+    def testFindMissingPaths(self):
+        """Tests that paths are checked in one command once per boot."""
+        shell = FakeShell("boot1", ["/system/a", "/system/c"])
+        precondition_cache._caches["boot1"] = (
+            precondition_cache.PreconditionCache("boot1", self._tmp_dir))
+        self.assertEqual(
+            precondition_utils._FindMissingPaths(
+                ["/system/a", "/system/b", "/system/c"], shell),
+            ["/system/b"])
+        self.assertEqual(
+            [cmd for cmd in shell.commands if not cmd.startswith("cat ")],
+            ["if test -e /system/a; then echo 0; fi; "
+             "if test -e /system/b; then echo 1; fi; "
+             "if test -e /system/c; then echo 2; fi"])
+        shell.commands = []
+        self.assertEqual(
+            precondition_utils._FindMissingPaths(
+                ["/system/c", "/system/b"], shell), ["/system/b"])
+        self.assertEqual([], shell.commands)
+
+    def testFindMissingPathsWritable(self):
+        """Tests that missing paths on writable partitions are not cached."""
+        shell = FakeShell("boot1", ["/data/a"])
+        precondition_cache._caches["boot1"] = (
+            precondition_cache.PreconditionCache("boot1", self._tmp_dir))
+        self.assertEqual(
+            precondition_utils._FindMissingPaths(["/data/a", "/data/b"],
+                                                 shell), ["/data/b"])
+        shell.files.add("/data/b")
+        shell.commands = []
+        self.assertEqual(
+            precondition_utils._FindMissingPaths(["/data/a", "/data/b"],
+                                                 shell), [])
+        self.assertEqual(["if test -e /data/b; then echo 0; fi"],
+                         shell.commands)
+
+
+if __name__ == "__main__":
+    unittest.main()
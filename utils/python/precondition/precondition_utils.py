@@ -22,6 +22,45 @@ from vts.runners.host import errors
 from vts.runners.host import keys
 from vts.utils.python.file import target_file_utils
 from vts.utils.python.hal import hal_service_name_utils
+from vts.utils.python.precondition import precondition_cache
+
+# The partitions which are not modified while the device is running.
+_READ_ONLY_PATH_PREFIXES = ("/system/", "/vendor/", "/odm/", "/product/")
+
+
+def _FindMissingPaths(paths, shell):
+    """Finds the paths that do not exist on a device.
+
+    The existence of the paths is cached for the current boot of the device,
+    and the paths that have not been checked are checked in one command.
+    A path that does not exist is cached only if it is on a read-only
+    partition, as it may be created on the writable ones.
+
+    Args:
+        paths: list of strings, the paths to files or directories.
+        shell: the ShellMirrorObject to execute command on the device.
+
+    Returns:
+        list of strings, the paths that do not exist, in the given order.
+    """
+    cache = precondition_cache.GetCache(shell)
+    exists = {}
+    unchecked_paths = []
+    for path in paths:
+        cached = cache.Get("exists " + path) if cache else None
+        if cached is None:
+            unchecked_paths.append(path)
+        else:
+            exists[path] = cached
+    if unchecked_paths:
+        existing_paths = target_file_utils.FindExistingPaths(
+            unchecked_paths, shell)
+        for path in unchecked_paths:
+            exists[path] = path in existing_paths
+            if cache and (exists[path] or
+                          path.startswith(_READ_ONLY_PATH_PREFIXES)):
+                cache.Set("exists " + path, exists[path])
+    return [path for path in paths if not exists[path]]
 
 
 def CanRunHidlHalTest(test_instance,
@@ -76,13 +115,12 @@ def CanRunHidlHalTest(test_instance,
         logging.debug("Test bitness: %s", bitness)
         tag = "_" + bitness + "bit"
         if tag in file_path_prefix:
-            for path_prefix in file_path_prefix[tag]:
-                if not target_file_utils.Exists(path_prefix, shell):
-                    msg = (
-                        "The required file (prefix: {}) for {}-bit testcase "
-                        "not found.").format(path_prefix, bitness)
-                    logging.warn(msg)
-                    return False
+            for path_prefix in _FindMissingPaths(file_path_prefix[tag], shell):
+                msg = (
+                    "The required file (prefix: {}) for {}-bit testcase "
+                    "not found.").format(path_prefix, bitness)
+                logging.warn(msg)
+                return False
 
     hal = str(
         getattr(test_instance, keys.ConfigKeys.IKEY_PRECONDITION_LSHAL, ""))
@@ -13,8 +13,12 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import concurrent.futures
 import logging
+import math
 import os
+import shutil
+import threading
 
 from google.protobuf import text_format
 from vts.proto import ComponentSpecificationMessage_pb2 as CompSpecMsg
@@ -36,18 +40,127 @@ DEFAULT_HAL_ROOT = "android.hardware."
 _PROFILING_DATA = "profiling_data"
 _HOST_PROFILING_DATA = "host_profiling_data"
 
+# Maximum number of devices whose traces are collected at the same time.
+_MAX_TRACE_COLLECTION_JOBS = 4
+
+
+# Ratio between the bounds of consecutive LatencyStats histogram buckets.
+# 2^(1/8) bounds the relative error of a quantile estimate to about 4.5%.
+_HISTOGRAM_BUCKET_RATIO = 2**(1.0 / 8)
+# Quantiles reported for each API when raw latencies are not kept.
+_REPORTED_QUANTILES = (0.5, 0.9, 0.99)
+
+
+class LatencyStats(object):
+    """Running aggregate of the latencies of one API.
+
+    Keeps the count, min, max and sum, and a histogram with logarithmic
+    buckets from which quantiles are estimated. The memory usage does not
+    depend on the number of samples, and two LatencyStats can be merged.
+
+    Attributes:
+        count: int, number of samples.
+        min: int, the minimum sample. None if there is no sample.
+        max: int, the maximum sample. None if there is no sample.
+        total: int, sum of the samples.
+        buckets: dict, histogram bucket index to number of samples.
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.min = None
+        self.max = None
+        self.total = 0
+        self.buckets = {}
+
+    @staticmethod
+    def _GetBucketIndex(value):
+        """Returns the index of the histogram bucket of a sample."""
+        if value < 1:
+            return 0
+        return int(math.log(value, _HISTOGRAM_BUCKET_RATIO)) + 1
+
+    @staticmethod
+    def _GetBucketValue(index):
+        """Returns the representative value of a histogram bucket."""
+        if index == 0:
+            return 0
+        return _HISTOGRAM_BUCKET_RATIO**(index - 0.5)
+
+    @property
+    def mean(self):
+        """Returns the mean of the samples, or None if there is no sample."""
+        if not self.count:
+            return None
+        return float(self.total) / self.count
+
+    def Add(self, value):
+        """Adds a sample.
+
+        Args:
+            value: int, the latency.
+        """
+        self.count += 1
+        self.total += value
+        if self.min is None or value < self.min:
+            self.min = value
+        if self.max is None or value > self.max:
+            self.max = value
+        index = self._GetBucketIndex(value)
+        self.buckets[index] = self.buckets.get(index, 0) + 1
+
+    def Merge(self, other):
+        """Merges the samples of another LatencyStats into this one.
+
+        Args:
+            other: LatencyStats, the stats to merge.
+        """
+        if not other.count:
+            return
+        self.count += other.count
+        self.total += other.total
+        if self.min is None or other.min < self.min:
+            self.min = other.min
+        if self.max is None or other.max > self.max:
+            self.max = other.max
+        for index, count in other.buckets.items():
+            self.buckets[index] = self.buckets.get(index, 0) + count
+
+    def Quantile(self, quantile):
+        """Estimates a quantile of the samples.
+
+        Args:
+            quantile: float, between 0 and 1.
+
+        Returns:
+            float, the estimated quantile, or None if there is no sample.
+        """
+        if not self.count:
+            return None
+        rank = quantile * self.count
+        accumulated = 0
+        for index in sorted(self.buckets):
+            accumulated += self.buckets[index]
+            if accumulated >= rank:
+                value = self._GetBucketValue(index)
+                return min(max(value, self.min), self.max)
+        return float(self.max)
+
 
 class VTSProfilingData(object):
     """Class to store the VTS profiling data.
 
     Attributes:
         values: A dict that stores the profiling data. e.g. latencies of each api.
+                Empty if only the aggregates are kept.
+        stats: A dict from api name to LatencyStats.
         options: A set of strings where each string specifies an associated
                  option (which is the form of 'key=value').
     """
 
     def __init__(self):
         self.values = {}
+        self.stats = {}
         self.options = set()
 
 
@@ -96,6 +209,13 @@ class ProfilingFeature(feature_utils.Feature):
         data_file_path: Path to the data directory within vts package.
         api_coverage_data: A dictionary from full HAL interface name
         (e.g. android.hardware.foo@1.0::IFoo) to VtsApiCoverageData.
+        _trace_executor: ThreadPoolExecutor which collects trace files in the
+                         background. None until the first collection.
+        _pending_traces: list of futures of the background collections.
+        _trace_collection_count: int, number of collections started, used to
+                                 name the device directories of the traces.
+        _trace_lock: threading.Lock, guards the data updated by background
+                     collections.
     """
 
     _TOGGLE_PARAM = keys.ConfigKeys.IKEY_ENABLE_PROFILING
@@ -106,6 +226,7 @@ class ProfilingFeature(feature_utils.Feature):
         keys.ConfigKeys.IKEY_SAVE_TRACE_FILE_REMOTE,
         keys.ConfigKeys.IKEY_ABI_BITNESS,
         keys.ConfigKeys.IKEY_PROFILING_ARG_VALUE,
+        keys.ConfigKeys.IKEY_PROFILING_AGGREGATE_ONLY,
     ]
 
     def __init__(self, user_params, web=None):
@@ -126,6 +247,10 @@ class ProfilingFeature(feature_utils.Feature):
         self.data_file_path = getattr(self,
                                       keys.ConfigKeys.IKEY_DATA_FILE_PATH, None)
         self.api_coverage_data = {}
+        self._trace_executor = None
+        self._pending_traces = []
+        self._trace_collection_count = 0
+        self._trace_lock = threading.Lock()
 
     def _IsEventFromBinderizedHal(self, event_type):
         """Returns True if the event type is from a binderized HAL."""
@@ -233,6 +358,10 @@ class ProfilingFeature(feature_utils.Feature):
         """Parses the data stored in trace_file, calculates the avg/max/min
         latency for each API.
 
+        The output of trace_processor is consumed line by line as it is
+        produced. Unless only the aggregates are kept, the latencies are also
+        stored in the values of the returned VTSProfilingData.
+
         Args:
             trace_file: file that stores the trace data.
             measure_api_coverage: whether to measure the api coverage data.
@@ -242,67 +371,86 @@ class ProfilingFeature(feature_utils.Feature):
             latency for each API.
         """
         profiling_data = VTSProfilingData()
-        api_timestamps = {}
-        api_latencies = {}
+        keep_values = not getattr(
+            self, keys.ConfigKeys.IKEY_PROFILING_AGGREGATE_ONLY, False)
 
         trace_processor_binary = os.path.join(self.data_file_path, "host",
                                               "bin", "trace_processor")
         trace_processor_lib = os.path.join(self.data_file_path, "host",
                                            "lib64")
-        trace_processor_cmd = [
-            "chmod a+x %s" % trace_processor_binary,
-            "LD_LIBRARY_PATH=%s %s -m profiling_trace %s" %
-            (trace_processor_lib, trace_processor_binary, trace_file)
-        ]
-
-        results = cmd_utils.ExecuteShellCommand(trace_processor_cmd)
-        if any(results[cmd_utils.EXIT_CODE]):
-            logging.error("Fail to execute command: %s" % trace_processor_cmd)
-            logging.error("stdout: %s" % results[const.STDOUT])
-            logging.error("stderr: %s" % results[const.STDERR])
+        chmod_cmd = "chmod a+x %s" % trace_processor_binary
+        trace_processor_cmd = "LD_LIBRARY_PATH=%s %s -m profiling_trace %s" % (
+            trace_processor_lib, trace_processor_binary, trace_file)
+
+        _, stderr, exit_code = cmd_utils.ExecuteOneShellCommand(chmod_cmd)
+        if exit_code:
+            logging.error("Fail to execute command: %s" % chmod_cmd)
+            logging.error("stderr: %s" % stderr)
             return profiling_data
 
-        stdout_lines = results[const.STDOUT][1].split("\n")
-        first_line = True
-        for line in stdout_lines:
+        first_line = [True]
+
+        def ParseLine(line):
+            line = line.strip()
             if not line:
-                continue
-            if first_line:
+                return
+            if first_line[0]:
                 _, mode = line.split(":")
                 profiling_data.options.add("hidl_hal_mode=%s" % mode)
-                first_line = False
-            else:
-                full_api, latency = line.rsplit(":", 1)
-                full_interface, api_name = full_api.rsplit("::", 1)
+                first_line[0] = False
+                return
+            full_api, latency = line.rsplit(":", 1)
+            full_interface, api_name = full_api.rsplit("::", 1)
+            latency = long(latency)
+            if api_name not in profiling_data.stats:
+                profiling_data.stats[api_name] = LatencyStats()
+            profiling_data.stats[api_name].Add(latency)
+            if keep_values:
                 if profiling_data.values.get(api_name):
-                    profiling_data.values[api_name].append(long(latency))
+                    profiling_data.values[api_name].append(latency)
                 else:
-                    profiling_data.values[api_name] = [long(latency)]
-
-                if measure_api_coverage:
-                    package, interface_name = full_interface.split("::")
-                    package_name, version = package.split("@")
-
-                    if full_interface in self.api_coverage_data:
-                        self.api_coverage_data[
-                            full_interface].covered_apis.add(api_name)
-                    else:
-                        total_apis = self._GetTotalApis(
-                            package_name, version, interface_name)
-                        if total_apis:
-                            vts_api_coverage = VTSApiCoverageData(
-                                package_name, version, interface_name)
-                            vts_api_coverage.total_apis = total_apis
-                            if api_name in total_apis:
-                                vts_api_coverage.covered_apis.add(api_name)
-                            else:
-                                logging.warning("API %s is not supported by %s",
-                                                api_name, full_interface)
-                            self.api_coverage_data[
-                                full_interface] = vts_api_coverage
+                    profiling_data.values[api_name] = [latency]
+
+            if measure_api_coverage:
+                with self._trace_lock:
+                    self._UpdateApiCoverage(full_interface, api_name)
+
+        stderr, exit_code = cmd_utils.ExecuteOneShellCommandStreaming(
+            trace_processor_cmd, ParseLine)
+        if exit_code:
+            logging.error("Fail to execute command: %s" % trace_processor_cmd)
+            logging.error("stderr: %s" % stderr)
+            return VTSProfilingData()
 
         return profiling_data
 
+    def _UpdateApiCoverage(self, full_interface, api_name):
+        """Records that an API was called in api_coverage_data.
+
+        Args:
+            full_interface: string, full HAL interface name,
+                            e.g. android.hardware.foo@1.0::IFoo.
+            api_name: string, name of the called API.
+        """
+        package, interface_name = full_interface.split("::")
+        package_name, version = package.split("@")
+
+        if full_interface in self.api_coverage_data:
+            self.api_coverage_data[full_interface].covered_apis.add(api_name)
+        else:
+            total_apis = self._GetTotalApis(package_name, version,
+                                            interface_name)
+            if total_apis:
+                vts_api_coverage = VTSApiCoverageData(package_name, version,
+                                                      interface_name)
+                vts_api_coverage.total_apis = total_apis
+                if api_name in total_apis:
+                    vts_api_coverage.covered_apis.add(api_name)
+                else:
+                    logging.warning("API %s is not supported by %s", api_name,
+                                    full_interface)
+                self.api_coverage_data[full_interface] = vts_api_coverage
+
     def _GetTotalApis(self, package_name, version, interface_name):
         """Parse the specified vts spec and get all APIs defined in the spec.
 
@@ -393,31 +541,131 @@ class ProfilingFeature(feature_utils.Feature):
         Args:
             dut: the registered device.
         """
+        self.CollectTraceDataForTestCase([dut], measure_api_coverage)
+        self.WaitForTraceData()
+
+    def CollectTraceDataForTestCase(self, duts, measure_api_coverage=True):
+        """Starts collecting the trace files of a test case from devices.
+
+        The trace files are moved to a directory of their own on each device
+        before this method returns, so the next test case can enable
+        profiling right away. The directories are pulled and parsed in the
+        background, in parallel for all devices, and the results are stored
+        in _profiling_data. Call WaitForTraceData to wait for them.
+
+        Requires the feature to be enabled; no-op otherwise.
+
+        Args:
+            duts: list of the registered devices.
+            measure_api_coverage: whether to measure the api coverage data.
+        """
         if not self.enabled:
             return
 
         if not hasattr(self, _PROFILING_DATA):
             setattr(self, _PROFILING_DATA, [])
 
-        profiling_data = getattr(self, _PROFILING_DATA)
+        if self._trace_executor is None:
+            self._trace_executor = concurrent.futures.ThreadPoolExecutor(
+                max_workers=_MAX_TRACE_COLLECTION_JOBS)
 
-        trace_files = []
-        save_trace_remote = getattr(
-            self, keys.ConfigKeys.IKEY_SAVE_TRACE_FILE_REMOTE, False)
-        if save_trace_remote:
-            trace_files = self.GetTraceFiles(
-                dut,
-                getattr(self, keys.ConfigKeys.IKEY_PROFILING_TRACING_PATH,
-                        None),
-                getattr(self, keys.ConfigKeys.IKEY_TRACE_FILE_TOOL_NAME, None))
-        else:
-            trace_files = self.GetTraceFiles(dut)
+        target_trace_file = path_utils.JoinTargetPath(
+            TARGET_PROFILING_TRACE_PATH, "*.vts.trace")
+        for dut in duts:
+            self._trace_collection_count += 1
+            target_dir = path_utils.JoinTargetPath(
+                TARGET_PROFILING_TRACE_PATH,
+                "vts_trace_%d" % self._trace_collection_count)
+            results = dut.shell.Execute("mkdir -p %s && mv %s %s" %
+                                        (target_dir, target_trace_file,
+                                         target_dir))
+            if not results or results[const.EXIT_CODE][0]:
+                logging.error("failed to find trace file: %s", results)
+                dut.shell.Execute("rm -rf %s" % target_dir)
+                continue
+            self._pending_traces.append(
+                self._trace_executor.submit(self._CollectTraceDir, dut,
+                                            target_dir, measure_api_coverage))
+
+    def WaitForTraceData(self):
+        """Waits for the trace files being collected in the background."""
+        pending_traces, self._pending_traces = self._pending_traces, []
+        for future in pending_traces:
+            try:
+                future.result()
+            except Exception as e:
+                logging.exception("Failed to collect trace files: %s", e)
+
+    def _CollectTraceDir(self, dut, target_dir, measure_api_coverage):
+        """Pulls a directory of trace files from a device and parses them.
+
+        Runs in a background thread, so the device is accessed through adb
+        instead of the shell used by the test.
+
+        Args:
+            dut: the registered device.
+            target_dir: string, the directory of the trace files on device.
+            measure_api_coverage: whether to measure the api coverage data.
+        """
+        # Pull to a directory of the device so that files with the same name
+        # on different devices do not overwrite each other.
+        local_dir = os.path.join(LOCAL_PROFILING_TRACE_PATH, str(dut.serial))
+        if not os.path.exists(local_dir):
+            os.makedirs(local_dir)
+        local_trace_dir = os.path.join(local_dir,
+                                       path_utils.TargetBaseName(target_dir))
+        if os.path.exists(local_trace_dir):
+            shutil.rmtree(local_trace_dir)
+        try:
+            dut.adb.pull("%s %s" % (target_dir, local_dir))
+        finally:
+            dut.adb.shell("rm -rf %s" % target_dir, no_except=True)
+
+        host_profiling_trace_path = None
+        trace_file_tool = None
+        if getattr(self, keys.ConfigKeys.IKEY_SAVE_TRACE_FILE_REMOTE, False):
+            host_profiling_trace_path = getattr(
+                self, keys.ConfigKeys.IKEY_PROFILING_TRACING_PATH, None)
+            trace_file_tool = getattr(
+                self, keys.ConfigKeys.IKEY_TRACE_FILE_TOOL_NAME, None)
+
+        try:
+            self._ProcessTraceDir(local_trace_dir, measure_api_coverage,
+                                  host_profiling_trace_path, trace_file_tool)
+        finally:
+            shutil.rmtree(local_trace_dir, ignore_errors=True)
+
+    def _ProcessTraceDir(self, local_trace_dir, measure_api_coverage,
+                         host_profiling_trace_path, trace_file_tool):
+        """Parses the trace files in a host directory and saves them.
 
-        for file in trace_files:
-            logging.info("parsing trace file: %s.", file)
-            data = self._ParseTraceData(file, measure_api_coverage)
+        Args:
+            local_trace_dir: string, the directory of the trace files.
+            measure_api_coverage: whether to measure the api coverage data.
+            host_profiling_trace_path: string, directory to save the trace
+                                       files to. None to not save them.
+            trace_file_tool: string, tool that used to store the trace file.
+        """
+        for file_name in sorted(os.listdir(local_trace_dir)):
+            trace_file = os.path.join(local_trace_dir, file_name)
+            logging.info("parsing trace file: %s.", trace_file)
+            data = self._ParseTraceData(trace_file, measure_api_coverage)
             if data:
-                profiling_data.append(data)
+                with self._trace_lock:
+                    getattr(self, _PROFILING_DATA).append(data)
+
+            if host_profiling_trace_path:
+                trace_file_name = os.path.join(host_profiling_trace_path,
+                                               file_name)
+                logging.info("Saving profiling traces: %s" % trace_file_name)
+                file_cmd = ""
+                if trace_file_tool:
+                    file_cmd += trace_file_tool
+                file_cmd += " cp " + trace_file + " " + trace_file_name
+                results = cmd_utils.ExecuteShellCommand(file_cmd)
+                if results[const.EXIT_CODE][0] != 0:
+                    logging.error(results[const.STDERR][0])
+                    logging.error("Fail to execute command: %s" % file_cmd)
 
     def ProcessAndUploadTraceData(self, upload_api_coverage=True):
         """Process and upload profiling trace data.
@@ -434,6 +682,11 @@ class ProfilingFeature(feature_utils.Feature):
         if not self.enabled:
             return
 
+        self.WaitForTraceData()
+        if self._trace_executor:
+            self._trace_executor.shutdown()
+            self._trace_executor = None
+
         merged_profiling_data = VTSProfilingData()
         for data in getattr(self, _PROFILING_DATA, []):
             for item in data.options:
@@ -443,6 +696,30 @@ class ProfilingFeature(feature_utils.Feature):
                     merged_profiling_data.values[api].extend(latences)
                 else:
                     merged_profiling_data.values[api] = latences
+            for api, stats in data.stats.items():
+                if api not in merged_profiling_data.stats:
+                    merged_profiling_data.stats[api] = LatencyStats()
+                merged_profiling_data.stats[api].Merge(stats)
+
+        aggregate_only = getattr(
+            self, keys.ConfigKeys.IKEY_PROFILING_AGGREGATE_ONLY, False)
+        if aggregate_only:
+            for api, stats in merged_profiling_data.stats.items():
+                if not self.web or not self.web.enabled:
+                    continue
+
+                labels = ["count", "min", "max", "mean"]
+                values = [stats.count, stats.min, stats.max, stats.mean]
+                for quantile in _REPORTED_QUANTILES:
+                    labels.append("p%d" % int(quantile * 100))
+                    values.append(stats.Quantile(quantile))
+                self.web.AddProfilingDataLabeledVector(
+                    api,
+                    labels, [int(round(value)) for value in values],
+                    merged_profiling_data.options,
+                    x_axis_label="API processing latency (nano secs)",
+                    y_axis_label="Latency (nano secs)")
+
         for api, latencies in merged_profiling_data.values.items():
             if not self.web or not self.web.enabled:
                 continue
@@ -0,0 +1,205 @@
+#!/usr/bin/env python
+#
+# Copyright (C) 2019 The Android Open Source Project
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+import mock
+import os
+import shutil
+import tempfile
+import unittest
+
+from vts.runners.host import const
+from vts.runners.host import keys
+from vts.utils.python.profiling import profiling_utils
+
+_TRACE_PROCESSOR_OUTPUT = [
+    "hidl_hal_mode:passthrough\n",
+    "android.hardware.foo@1.0::IFoo::get:100\n",
+    "android.hardware.foo@1.0::IFoo::set:1000\n",
+    "android.hardware.foo@1.0::IFoo::get:300\n",
+]
+
+
+def simple_ExecuteOneShellCommandStreaming(cmd, stdout_line_callback):
+    """mock function created for ExecuteOneShellCommandStreaming"""
+    for line in _TRACE_PROCESSOR_OUTPUT:
+        stdout_line_callback(line)
+    return "", 0
+
+
+class LatencyStatsTest(unittest.TestCase):
+    """Unit tests for LatencyStats."""
+
+    def testAggregates(self):
+        """Tests count, min, max and mean."""
+        stats = profiling_utils.LatencyStats()
+        self.assertIsNone(stats.mean)
+        self.assertIsNone(stats.Quantile(0.5))
+        for value in (5, 1, 9):
+            stats.Add(value)
+        self.assertEqual(stats.count, 3)
+        self.assertEqual(stats.min, 1)
+        self.assertEqual(stats.max, 9)
+        self.assertEqual(stats.mean, 5.0)
+
+    def testQuantile(self):
+        """Tests that quantiles are within the bucket error."""
+        stats = profiling_utils.LatencyStats()
+        for value in range(1, 10001):
+            stats.Add(value)
+        for quantile in (0.5, 0.9, 0.99):
+            expected = quantile * 10000
+            self.assertLess(
+                abs(stats.Quantile(quantile) - expected) / expected, 0.05)
+        self.assertEqual(stats.Quantile(1), 10000)
+
+    def testMerge(self):
+        """Tests that merging equals adding all samples to one object."""
+        merged = profiling_utils.LatencyStats()
+        first = profiling_utils.LatencyStats()
+        second = profiling_utils.LatencyStats()
+        expected = profiling_utils.LatencyStats()
+        for value in range(0, 1000, 7):
+            first.Add(value)
+            expected.Add(value)
+        for value in range(3, 5000, 11):
+            second.Add(value)
+            expected.Add(value)
+        merged.Merge(first)
+        merged.Merge(second)
+        merged.Merge(profiling_utils.LatencyStats())
+        self.assertEqual(merged.count, expected.count)
+        self.assertEqual(merged.min, expected.min)
+        self.assertEqual(merged.max, expected.max)
+        self.assertEqual(merged.total, expected.total)
+        self.assertEqual(merged.buckets, expected.buckets)
+
+
+class ProfilingFeatureTest(unittest.TestCase):
+    """Unit tests for ProfilingFeature."""
+
+    def _CreateFeature(self, aggregate_only):
+        """Creates an enabled ProfilingFeature."""
+        user_params = {
+            keys.ConfigKeys.IKEY_ENABLE_PROFILING: True,
+            keys.ConfigKeys.IKEY_DATA_FILE_PATH: "/data",
+            keys.ConfigKeys.IKEY_PROFILING_AGGREGATE_ONLY: aggregate_only,
+        }
+        return profiling_utils.ProfilingFeature(user_params)
+
+    @mock.patch(
+        "vts.utils.python.common.cmd_utils.ExecuteOneShellCommandStreaming",
+        side_effect=simple_ExecuteOneShellCommandStreaming)
+    @mock.patch(
+        "vts.utils.python.common.cmd_utils.ExecuteOneShellCommand",
+        return_value=("", "", 0))
+    def testParseTraceData(self, mock_execute, mock_execute_streaming):
+        """Tests that latencies are parsed into values and stats."""
+        feature = self._CreateFeature(False)
+        data = feature._ParseTraceData("trace", False)
+        self.assertEqual(data.options, set(["hidl_hal_mode=passthrough"]))
+        self.assertEqual(data.values, {"get": [100, 300], "set": [1000]})
+        self.assertEqual(data.stats["get"].count, 2)
+        self.assertEqual(data.stats["get"].mean, 200.0)
+        self.assertEqual(data.stats["set"].max, 1000)
+
+    @mock.patch(
+        "vts.utils.python.common.cmd_utils.ExecuteOneShellCommandStreaming",
+        side_effect=simple_ExecuteOneShellCommandStreaming)
+    @mock.patch(
+        "vts.utils.python.common.cmd_utils.ExecuteOneShellCommand",
+        return_value=("", "", 0))
+    def testParseTraceDataAggregateOnly(self, mock_execute,
+                                        mock_execute_streaming):
+        """Tests that raw latencies are not kept in aggregate only mode."""
+        feature = self._CreateFeature(True)
+        data = feature._ParseTraceData("trace", False)
+        self.assertEqual(data.values, {})
+        self.assertEqual(data.stats["get"].count, 2)
+
+        feature.web = mock.MagicMock()
+        feature.profiling_data = [data]
+        feature.ProcessAndUploadTraceData(upload_api_coverage=False)
+        feature.web.AddProfilingDataUnlabeledVector.assert_not_called()
+        self.assertEqual(
+            feature.web.AddProfilingDataLabeledVector.call_count, 2)
+        args = [
+            call[0] for call in
+            feature.web.AddProfilingDataLabeledVector.call_args_list
+            if call[0][0] == "get"
+        ][0]
+        labels, values = args[1], args[2]
+        self.assertEqual(
+            dict(zip(labels, values))["count"], 2)
+        self.assertEqual(dict(zip(labels, values))["mean"], 200)
+
+    @mock.patch(
+        "vts.utils.python.common.cmd_utils.ExecuteOneShellCommandStreaming",
+        return_value=("error", 1))
+    @mock.patch(
+        "vts.utils.python.common.cmd_utils.ExecuteOneShellCommand",
+        return_value=("", "", 0))
+    def testParseTraceDataError(self, mock_execute, mock_execute_streaming):
+        """Tests that a failed trace_processor returns empty data."""
+        feature = self._CreateFeature(False)
+        data = feature._ParseTraceData("trace", False)
+        self.assertEqual(data.values, {})
+        self.assertEqual(data.stats, {})
+
+    @mock.patch(
+        "vts.utils.python.common.cmd_utils.ExecuteOneShellCommandStreaming",
+        side_effect=simple_ExecuteOneShellCommandStreaming)
+    @mock.patch(
+        "vts.utils.python.common.cmd_utils.ExecuteOneShellCommand",
+        return_value=("", "", 0))
+    def testCollectTraceData(self, mock_execute, mock_execute_streaming):
+        """Tests that traces of all devices are pulled and parsed."""
+        local_path = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, local_path)
+
+        def _Pull(args):
+            target_dir, local_dir = args.split()
+            trace_dir = os.path.join(local_dir, os.path.basename(target_dir))
+            os.makedirs(trace_dir)
+            for name in ("a.vts.trace", "b.vts.trace"):
+                open(os.path.join(trace_dir, name), "w").close()
+
+        duts = []
+        for serial in ("serial1", "serial2"):
+            dut = mock.MagicMock(serial=serial)
+            dut.shell.Execute.return_value = {const.EXIT_CODE: [0]}
+            dut.adb.pull.side_effect = _Pull
+            duts.append(dut)
+
+        feature = self._CreateFeature(False)
+        with mock.patch.object(profiling_utils, "LOCAL_PROFILING_TRACE_PATH",
+                               local_path):
+            feature.CollectTraceDataForTestCase(duts, False)
+            feature.WaitForTraceData()
+
+        self.assertEqual(len(feature.profiling_data), 4)
+        self.assertEqual(mock_execute_streaming.call_count, 4)
+        self.assertNotEqual(duts[0].adb.pull.call_args,
+                            duts[1].adb.pull.call_args)
+        for dut in duts:
+            dut.adb.shell.assert_called_once()
+        self.assertEqual(
+            sorted(os.listdir(local_path)), ["serial1", "serial2"])
+        self.assertEqual(os.listdir(os.path.join(local_path, "serial1")), [])
+
+
+if __name__ == "__main__":
+    unittest.main()
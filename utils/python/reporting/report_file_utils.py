@@ -19,6 +19,8 @@ import os
 import shutil
 import tempfile
 
+import concurrent.futures
+
 from vts.utils.python.common import cmd_utils
 from vts.utils.python.gcs import gcs_api_utils
 
@@ -246,6 +248,7 @@ class ReportFileUtil(object):
 
         try:
             urls = []
+            gcs_uploads = []
 
             for (dirpath, dirnames, filenames) in os.walk(
                     source_dir, followlinks=False):
@@ -262,11 +265,23 @@ class ReportFileUtil(object):
                     #TODO(yuexima): handle duplicated destination file names
                     if not dryrun:
                         if self._use_gcs:
-                            self._PushReportFileGcs(src_path, dest_path)
+                            gcs_uploads.append((src_path, dest_path))
                         else:
                             self._PushReportFile(src_path, dest_path)
                     urls.append(url)
 
+            if gcs_uploads:
+                with concurrent.futures.ThreadPoolExecutor(
+                        max_workers=gcs_api_utils.DEFAULT_MAX_WORKERS
+                ) as executor:
+                    futures = [
+                        executor.submit(self._PushReportFileGcs, src_path,
+                                        dest_path)
+                        for src_path, dest_path in gcs_uploads
+                    ]
+                    for future in futures:
+                        future.result()
+
             return urls
         except IOError as e:
             logging.exception(e)
@@ -16,11 +16,14 @@
 
 import base64
 import getpass
+import io
 import logging
 import os
 import socket
 import time
 
+from google.protobuf.internal import encoder
+from google.protobuf.internal import wire_format
 from vts.proto import VtsReportMessage_pb2 as ReportMsg
 from vts.runners.host import keys
 from vts.utils.python.web import dashboard_rest_client
@@ -28,6 +31,21 @@ from vts.utils.python.web import feature_utils
 
 _PROFILING_POINTS = "profiling_points"
 
+# File name of the test case report log in incremental reporting mode.
+_REPORT_LOG_FILE_NAME = "report_test_cases.log"
+
+# Bytes copied from the test case report log at a time.
+_READ_SIZE = 64 * 1024
+
+# Field tags of DashboardPostMessage.test_report and
+# TestReportMessage.test_case in the protobuf wire format.
+_TEST_REPORT_TAG = encoder.TagBytes(
+    ReportMsg.DashboardPostMessage.TEST_REPORT_FIELD_NUMBER,
+    wire_format.WIRETYPE_LENGTH_DELIMITED)
+_TEST_CASE_TAG = encoder.TagBytes(
+    ReportMsg.TestReportMessage.TEST_CASE_FIELD_NUMBER,
+    wire_format.WIRETYPE_LENGTH_DELIMITED)
+
 
 class WebFeature(feature_utils.Feature):
     """Feature object for web functionality.
@@ -37,6 +55,9 @@ class WebFeature(feature_utils.Feature):
         report_msg: TestReportMessage, Proto summarizing the test run
         current_test_report_msg: TestCaseReportMessage, Proto summarizing the current test case
         rest_client: DashboardRestClient, client to which data will be posted
+        _report_log_path: string, path to the log of finished test case
+                          reports in incremental mode; None otherwise.
+        _report_log_count: int, number of test case reports in the log.
     """
 
     _TOGGLE_PARAM = keys.ConfigKeys.IKEY_ENABLE_WEB
@@ -50,6 +71,7 @@ class WebFeature(feature_utils.Feature):
     _OPTIONAL_PARAMS = [
         keys.ConfigKeys.RUN_AS_VTS_SELFTEST,
         keys.ConfigKeys.IKEY_ENABLE_PROFILING,
+        keys.ConfigKeys.IKEY_WEB_INCREMENTAL_REPORT,
     ]
 
     def __init__(self, user_params):
@@ -65,9 +87,17 @@ class WebFeature(feature_utils.Feature):
             required_param_names=self._REQUIRED_PARAMS,
             optional_param_names=self._OPTIONAL_PARAMS,
             user_params=user_params)
+        self.current_test_report_msg = None
+        self._report_log_path = None
+        self._report_log_count = 0
         if not self.enabled:
             return
 
+        if getattr(self, keys.ConfigKeys.IKEY_WEB_INCREMENTAL_REPORT, False):
+            self._report_log_path = os.path.join(logging.log_path,
+                                                 _REPORT_LOG_FILE_NAME)
+            open(self._report_log_path, "wb").close()
+
         # Initialize the dashboard client
         post_cmd = getattr(self, keys.ConfigKeys.IKEY_DASHBOARD_POST_COMMAND)
         service_json_path = str(
@@ -142,11 +172,70 @@ class WebFeature(feature_utils.Feature):
         """
         if not self.enabled:
             return
+        self._FlushTestReport()
         self.current_test_report_msg = self.report_msg.test_case.add()
         self.current_test_report_msg.name = test_name
         self.current_test_report_msg.start_timestamp = feature_utils.GetTimestamp(
         )
 
+    def _FlushTestReport(self):
+        """Moves the finished test case report to the on-disk log.
+
+        No-op unless in incremental reporting mode.
+        """
+        if not self._report_log_path or self.current_test_report_msg is None:
+            return
+        self._AppendTestReports([self.current_test_report_msg])
+        self.report_msg.test_case.remove(self.current_test_report_msg)
+        self.current_test_report_msg = None
+
+    def _AppendTestReports(self, test_case_msgs):
+        """Appends test case reports to the on-disk log.
+
+        Each report is written as a test_case field of TestReportMessage in
+        the protobuf wire format, i.e., the field tag, the varint length and
+        the serialized TestCaseReportMessage. The log is therefore a valid
+        serialized TestReportMessage which contains only test cases.
+
+        Args:
+            test_case_msgs: list of TestCaseReportMessage.
+        """
+        with open(self._report_log_path, "ab") as f:
+            for msg in test_case_msgs:
+                data = msg.SerializeToString()
+                f.write(_TEST_CASE_TAG)
+                f.write(encoder._VarintBytes(len(data)))
+                f.write(data)
+        self._report_log_count += len(test_case_msgs)
+
+    def _IterReportMessageChunks(self):
+        """Yields the serialized DashboardPostMessage in chunks.
+
+        In incremental reporting mode, the report without test cases is
+        serialized and followed by the on-disk log, which is copied in
+        chunks. Otherwise, the whole message is yielded at once.
+
+        Yields:
+            bytes, the consecutive parts of the serialized message.
+        """
+        post_msg = ReportMsg.DashboardPostMessage()
+        if not self._report_log_path:
+            post_msg.test_report.extend([self.report_msg])
+            self.rest_client.AddAuthToken(post_msg)
+            yield post_msg.SerializeToString()
+            return
+
+        self.rest_client.AddAuthToken(post_msg)
+        yield post_msg.SerializeToString()
+        report_b = self.report_msg.SerializeToString()
+        log_size = os.path.getsize(self._report_log_path)
+        yield _TEST_REPORT_TAG + encoder._VarintBytes(
+            len(report_b) + log_size)
+        yield report_b
+        with open(self._report_log_path, "rb") as log_file:
+            for data in iter(lambda: log_file.read(_READ_SIZE), b""):
+                yield data
+
     def AddApiCoverageReport(self, api_coverage_data_vec, isGlobal=True):
         """Adds an API coverage report to the VtsReportMessage.
 
@@ -413,7 +502,7 @@ class WebFeature(feature_utils.Feature):
         """
         return self.report_msg.test, self.report_msg.start_timestamp
 
-    def GenerateReportMessage(self, requested, executed):
+    def GenerateReportMessage(self, requested, executed, streamed_count=0):
         """Uploads the result to the web service.
 
         Requires the feature to be enabled; no-op otherwise.
@@ -421,6 +510,9 @@ class WebFeature(feature_utils.Feature):
         Args:
             requested: list, A list of test case records requested to run
             executed: list, A list of test case records that were executed
+            streamed_count: int, the number of executed test cases whose
+                            records were streamed out of the executed list
+                            but whose requests are in the requested list
 
         Returns:
             binary string, serialized report message.
@@ -429,12 +521,47 @@ class WebFeature(feature_utils.Feature):
         if not self.enabled:
             return None
 
-        for test in requested[len(executed):]:
-            msg = self.report_msg.test_case.add()
+        message = io.BytesIO()
+        self.WriteReportMessage(message, requested, executed, streamed_count)
+        return message.getvalue()
+
+    def WriteReportMessage(self, f, requested, executed, streamed_count=0):
+        """Writes the serialized report message to a file.
+
+        Requires the feature to be enabled; no-op otherwise.
+
+        In incremental reporting mode, the test case reports are copied from
+        the on-disk log in chunks, so the serialized report is never held in
+        memory as a whole.
+
+        Args:
+            f: file object to write the base64-encoded message to.
+            requested: list, A list of test case records requested to run
+            executed: list, A list of test case records that were executed
+            streamed_count: int, the number of executed test cases whose
+                            records were streamed out of the executed list
+                            but whose requests are in the requested list
+
+        Returns:
+            int, the number of bytes written.
+        """
+        if not self.enabled:
+            return 0
+
+        self._FlushTestReport()
+        not_executed = []
+        for test in requested[len(executed) + streamed_count:]:
+            if self._report_log_path:
+                msg = ReportMsg.TestCaseReportMessage()
+                not_executed.append(msg)
+            else:
+                msg = self.report_msg.test_case.add()
             msg.name = test.test_name
             msg.start_timestamp = feature_utils.GetTimestamp()
             msg.end_timestamp = msg.start_timestamp
             msg.test_result = ReportMsg.TEST_CASE_RESULT_FAIL
+        if not_executed:
+            self._AppendTestReports(not_executed)
 
         self.report_msg.end_timestamp = feature_utils.GetTimestamp()
 
@@ -446,21 +573,40 @@ class WebFeature(feature_utils.Feature):
         logging.debug("_tearDownClass hook: start (username: %s)",
                       getpass.getuser())
 
-        if len(self.report_msg.test_case) == 0:
+        if len(self.report_msg.test_case) == 0 and not self._report_log_count:
             logging.warn("_tearDownClass hook: skip uploading (no test case)")
-            return ''
+            return 0
 
-        post_msg = ReportMsg.DashboardPostMessage()
-        post_msg.test_report.extend([self.report_msg])
-
-        self.rest_client.AddAuthToken(post_msg)
+        size = _WriteBase64(f, self._IterReportMessageChunks())
 
-        message_b = base64.b64encode(post_msg.SerializeToString())
-
-        logging.debug('Result proto message generated. size: %s',
-                      len(message_b))
+        logging.debug('Result proto message generated. size: %s', size)
 
         logging.debug("_tearDownClass hook: status upload time stamp %s",
                       str(self.report_msg.start_timestamp))
 
-        return message_b
\ No newline at end of file
+        return size
+
+
+def _WriteBase64(f, chunks):
+    """Writes the base64 encoding of the concatenated chunks to a file.
+
+    Args:
+        f: file object to write to.
+        chunks: iterable of bytes.
+
+    Returns:
+        int, the number of bytes written.
+    """
+    size = 0
+    remainder = b""
+    for chunk in chunks:
+        data = remainder + chunk
+        # Encodes whole 3-byte groups so that the outputs can be concatenated.
+        end = len(data) - len(data) % 3
+        encoded = base64.b64encode(data[:end])
+        f.write(encoded)
+        size += len(encoded)
+        remainder = data[end:]
+    encoded = base64.b64encode(remainder)
+    f.write(encoded)
+    return size + len(encoded)
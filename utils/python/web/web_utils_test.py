@@ -0,0 +1,145 @@
+#
+# Copyright (C) 2019 The Android Open Source Project
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+import base64
+import io
+import logging
+import mock
+import shutil
+import tempfile
+import unittest
+
+from vts.proto import VtsReportMessage_pb2 as ReportMsg
+from vts.runners.host import keys
+from vts.runners.host import records
+from vts.utils.python.web import web_utils
+
+
+def _CreateUserParams(**extra_params):
+    """Returns the user params which enable the web feature."""
+    user_params = {
+        keys.ConfigKeys.IKEY_ENABLE_WEB: True,
+        keys.ConfigKeys.IKEY_DASHBOARD_POST_COMMAND: "post",
+        keys.ConfigKeys.IKEY_SERVICE_JSON_PATH: "service.json",
+        keys.ConfigKeys.KEY_TESTBED_NAME: "Module",
+        keys.ConfigKeys.IKEY_BUILD: {},
+        keys.ConfigKeys.IKEY_ANDROID_DEVICE: [],
+        keys.ConfigKeys.IKEY_ABI_NAME: "arm64-v8a",
+        keys.ConfigKeys.IKEY_ABI_BITNESS: "64",
+    }
+    user_params.update(extra_params)
+    return user_params
+
+
+class WebFeatureTest(unittest.TestCase):
+    """Unit tests for WebFeature."""
+
+    def setUp(self):
+        """Creates a log directory and mocks the dashboard client."""
+        self._log_path = tempfile.mkdtemp()
+        self._original_log_path = getattr(logging, "log_path", None)
+        logging.log_path = self._log_path
+        patcher = mock.patch.object(web_utils.dashboard_rest_client,
+                                    "DashboardRestClient")
+        self._rest_client = patcher.start().return_value
+        self._rest_client.Initialize.return_value = True
+        self._rest_client.PostData.return_value = True
+        self.addCleanup(patcher.stop)
+
+    def tearDown(self):
+        """Deletes the log directory."""
+        logging.log_path = self._original_log_path
+        shutil.rmtree(self._log_path)
+
+    def _RunTests(self, web, names):
+        """Adds a passed report of each test name."""
+        for name in names:
+            web.AddTestReport(name)
+            web.SetTestResult(ReportMsg.TEST_CASE_RESULT_PASS)
+
+    def testGenerateReportMessageStreamed(self):
+        """Tests that streamed records count as executed."""
+        web = web_utils.WebFeature(_CreateUserParams())
+        self._RunTests(web, ["a", "b"])
+        requested = [records.TestResultRecord(name) for name in "abc"]
+        executed = requested[1:2]
+        message_b = web.GenerateReportMessage(
+            requested, executed, streamed_count=1)
+
+        post_msg = ReportMsg.DashboardPostMessage()
+        post_msg.ParseFromString(base64.b64decode(message_b))
+        test_cases = post_msg.test_report[0].test_case
+        self.assertEqual(["a", "b", "c"], [msg.name for msg in test_cases])
+        self.assertEqual(ReportMsg.TEST_CASE_RESULT_FAIL,
+                         test_cases[2].test_result)
+        self.assertFalse(self._rest_client.PostData.called)
+
+    def _ParseReportMessage(self, message_b):
+        """Returns the TestReportMessage in a base64 DashboardPostMessage."""
+        post_msg = ReportMsg.DashboardPostMessage()
+        post_msg.ParseFromString(base64.b64decode(message_b))
+        self.assertEqual(1, len(post_msg.test_report))
+        return post_msg.test_report[0]
+
+    def testIncrementalReport(self):
+        """Tests that the logged test cases are in the report message."""
+        web = web_utils.WebFeature(
+            _CreateUserParams(**{
+                keys.ConfigKeys.IKEY_WEB_INCREMENTAL_REPORT: True
+            }))
+        web.AddCoverageReport([1, 0], "a.cpp", "project", "", "rev", 1, 2)
+        self._RunTests(web, ["a", "b"])
+        web.AddTestReport("c")
+        web.SetTestResult(ReportMsg.TEST_CASE_RESULT_FAIL)
+        self.assertEqual(2, web._report_log_count)
+        self.assertEqual(1, len(web.report_msg.test_case))
+
+        requested = [records.TestResultRecord(name) for name in "abcd"]
+        message_b = web.GenerateReportMessage(requested, requested[:3])
+        self.assertEqual(0, len(web.report_msg.test_case))
+        self.assertEqual(4, web._report_log_count)
+
+        report = self._ParseReportMessage(message_b)
+        self.assertEqual("Module", report.test)
+        self.assertEqual(["a", "b", "c", "d"],
+                         [msg.name for msg in report.test_case])
+        self.assertEqual([
+            ReportMsg.TEST_CASE_RESULT_PASS, ReportMsg.TEST_CASE_RESULT_PASS,
+            ReportMsg.TEST_CASE_RESULT_FAIL, ReportMsg.TEST_CASE_RESULT_FAIL
+        ], [msg.test_result for msg in report.test_case])
+        self.assertEqual(1, len(report.coverage))
+        self.assertFalse(self._rest_client.PostData.called)
+
+    def testIncrementalReportNoTestCase(self):
+        """Tests that nothing is written without test cases."""
+        web = web_utils.WebFeature(
+            _CreateUserParams(**{
+                keys.ConfigKeys.IKEY_WEB_INCREMENTAL_REPORT: True
+            }))
+        self.assertEqual("", web.GenerateReportMessage([], []))
+
+    def testWriteBase64(self):
+        """Tests that chunks are encoded as the concatenated bytes."""
+        chunks = [b"a", b"bcde", b"", b"fg", b"hijklmn", b"o"]
+        output = io.BytesIO()
+        size = web_utils._WriteBase64(output, chunks)
+        self.assertEqual(base64.b64encode(b"".join(chunks)),
+                         output.getvalue())
+        self.assertEqual(len(output.getvalue()), size)
+
+
+if __name__ == "__main__":
+    unittest.main()